@@ -5,17 +5,49 @@ Minecraft 皮肤包合并工具 (交互式版本)
 纯命令行交互式界面，无需参数或GUI
 """
 
+import argparse
+import contextlib
+import cProfile
+import gc
+import io
 import os
+import pickle
+import pstats
+import hashlib
+import hmac
 import json
+import math
+import mmap
+import multiprocessing
+import random
 import re
+import secrets
 import shutil
 import zipfile
+import struct
 import sys
+import threading
+import time
+import tracemalloc
+import uuid
+import zlib
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Set
-from collections import defaultdict
+from typing import List, Dict, Any, Tuple, Set, Optional, Iterator
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import logging
 
+try:
+    import orjson  # 可选依赖，解析速度更快
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np  # 可选依赖，几何模型分析时向量化计算
+except ImportError:
+    np = None
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -32,41 +64,274 @@ def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
 
+class StageTimer:
+    """轻量的分阶段计时器
+    
+    可以在工作进程中使用，结果为普通字典，随解析结果一起返回给主进程。
+    """
+    
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+    
+    @contextlib.contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+    
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+    
+    def as_dict(self) -> Dict:
+        return {'seconds': dict(self.seconds), 'counters': dict(self.counters)}
+
+
+class Metrics:
+    """阶段耗时和计数统计
+    
+    输出模式：
+    - quiet: 只收集数据，不输出
+    - human: 输出可读的汇总表
+    - jsonl: 每个事件输出一行JSON，便于长期记录和绘图
+    """
+    
+    MODES = ('quiet', 'human', 'jsonl')
+    # human 模式下逐条输出的重命名数量上限，超过后只计数
+    RENAME_PRINT_LIMIT = 20
+    SLOWEST_PACK_LIMIT = 10
+    _KIND_NAMES = {'skins': '皮肤', 'geometries': '几何模型', 'textures': '纹理'}
+    
+    def __init__(self, mode: str = 'human', stream=None, labels: Optional[Dict] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的统计输出模式: {mode}")
+        self.mode = mode
+        self.stream = stream
+        self.labels = labels or {}
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.stages: Dict[str, Dict[str, float]] = {}
+            self.counters: Dict[str, int] = defaultdict(int)
+            self.pack_seconds: Dict[str, float] = {}
+    
+    def _write(self, text: str):
+        print(text, file=self.stream or sys.stdout, flush=self.mode == 'jsonl')
+    
+    def event(self, event: str, **fields):
+        """jsonl 模式下输出一条事件"""
+        if self.mode == 'jsonl':
+            record = {'event': event, 'time': round(time.time(), 3), **self.labels, **fields}
+            self._write(json.dumps(record, ensure_ascii=False))
+    
+    def add_time(self, stage: str, seconds: float, emit: bool = True, **fields):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0})
+            entry['seconds'] += seconds
+            entry['count'] += 1
+        if emit:
+            self.event('stage', stage=stage, seconds=round(seconds, 6), **fields)
+    
+    @contextlib.contextmanager
+    def stage(self, stage: str, **fields):
+        """统计一个阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, **fields)
+    
+    def count(self, name: str, value: int = 1):
+        if value:
+            with self._lock:
+                self.counters[name] += value
+    
+    def record_pack(self, pack_name: str, load_metrics: Dict):
+        """记录单个皮肤包的加载耗时（来自 StageTimer.as_dict()）"""
+        seconds = load_metrics.get('seconds', {})
+        for stage, value in seconds.items():
+            self.add_time(stage, value, emit=False)
+        for name, value in load_metrics.get('counters', {}).items():
+            self.count(name, value)
+        with self._lock:
+            self.pack_seconds[pack_name] = self.pack_seconds.get(pack_name, 0.0) + sum(seconds.values())
+        self.event('pack', pack=pack_name, **{key: round(value, 6) for key, value in seconds.items()},
+                   **load_metrics.get('counters', {}))
+    
+    def rename(self, kind: str, old_name: str, new_name: str):
+        """记录一次重命名；human 模式只逐条输出前若干条"""
+        with self._lock:
+            self.counters[f'renamed_{kind}'] += 1
+            count = self.counters[f'renamed_{kind}']
+        if self.mode == 'human' and count <= self.RENAME_PRINT_LIMIT:
+            print(f"   🔀 重命名{self._KIND_NAMES.get(kind, kind)}: {old_name} -> {new_name}")
+    
+    def snapshot(self) -> Dict:
+        """返回当前统计数据"""
+        with self._lock:
+            slowest = sorted(self.pack_seconds.items(), key=lambda item: item[1], reverse=True)
+            return {
+                'stages': {stage: {'seconds': round(entry['seconds'], 6), 'count': entry['count']}
+                           for stage, entry in self.stages.items()},
+                'counters': dict(self.counters),
+                'slowest_packs': [{'pack': name, 'seconds': round(seconds, 6)}
+                                  for name, seconds in slowest[:self.SLOWEST_PACK_LIMIT]]
+            }
+    
+    def report(self):
+        """按输出模式输出汇总"""
+        if self.mode == 'quiet':
+            return
+        data = self.snapshot()
+        if self.mode == 'jsonl':
+            self.event('summary', **data)
+            return
+        
+        self._write("\n⏱️  阶段耗时:")
+        for stage, entry in data['stages'].items():
+            self._write(f"   {stage:<18} {entry['seconds'] * 1000:>10.1f} ms  ({entry['count']} 次)")
+        if data['counters']:
+            self._write("🔢 计数:")
+            for name, value in sorted(data['counters'].items()):
+                self._write(f"   {name:<18} {value:>10}")
+        if data['slowest_packs']:
+            self._write("🐢 最慢的皮肤包:")
+            for item in data['slowest_packs'][:5]:
+                self._write(f"   {item['pack']:<30} {item['seconds'] * 1000:>10.1f} ms")
+    
+    @contextlib.contextmanager
+    def profile(self, cprofile: bool = False, trace_memory: bool = False, top: int = 25):
+        """可选的 cProfile / tracemalloc 分析，结束时输出报告"""
+        profiler = None
+        if cprofile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                output = io.StringIO()
+                pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(top)
+                if self.mode == 'jsonl':
+                    self.event('profile', report=output.getvalue())
+                else:
+                    print(output.getvalue(), file=sys.stderr)
+            if trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                top_stats = tracemalloc.take_snapshot().statistics('lineno')[:10]
+                tracemalloc.stop()
+                if self.mode == 'jsonl':
+                    self.event('memory', current_bytes=current, peak_bytes=peak,
+                               top=[str(stat) for stat in top_stats])
+                else:
+                    print(f"🧠 内存: 当前 {current / (1024 * 1024):.1f} MB | 峰值 {peak / (1024 * 1024):.1f} MB",
+                          file=sys.stderr)
+                    for stat in top_stats:
+                        print(f"   {stat}", file=sys.stderr)
+
+
 class SkinPackInfo:
-    """皮肤包信息类"""
+    """皮肤包信息类
+    
+    常驻内存的只有摘要信息（名称、数量和皮肤/几何模型索引）、文件位置和指纹。完整的 skins.json 和几何模型数据
+    可以通过 release() 释放，合并时由 SkinPackMerger 按需重新读取一份（优先读取缓存），不会恢复到原对象上。
+    """
+    __slots__ = ('folder_name', 'source_path', 'fingerprint', 'texture_files', 'other_files', 'lang_files',
+                 'texture_hashes', 'load_metrics', 'serialize_name', 'localization_name',
+                 'skin_count', 'geometry_count', 'skin_index', 'skin_bytes', 'geometry_index',
+                 'skin_data', 'geometry_data', 'geometry_entries')
+    
     def __init__(self, folder_name: str, skin_data: Dict, geometry_data: List, 
-                 texture_files: List[Path], other_files: List[Path]):
+                 texture_files: List[Path], other_files: List[Path],
+                 source_path: Optional[Path] = None, fingerprint: Optional[str] = None,
+                 lang_files: Optional[List] = None):
         self.folder_name = folder_name
-        self.skin_data = skin_data
-        self.geometry_data = geometry_data
+        self.skin_data: Optional[Dict] = skin_data
+        self.geometry_data: Optional[List] = geometry_data
         self.texture_files = texture_files
         self.other_files = other_files
-        self.info = self._analyze_pack()
-    
-    def _analyze_pack(self) -> Dict:
-        """分析皮肤包信息"""
-        info = {
-            'serialize_name': self.skin_data.get('serialize_name', '未知'),
-            'localization_name': self.skin_data.get('localization_name', '未知'),
-            'skin_count': len(self.skin_data.get('skins', [])),
-            'geometry_count': len(self.geometry_data),
+        # texts/*.lang 本地化文件（磁盘路径或 ArchiveMember）
+        self.lang_files = lang_files or []
+        self.source_path = source_path
+        self.fingerprint = fingerprint
+        # 纹理文件名 -> 内容哈希
+        self.texture_hashes: Dict[str, str] = {}
+        # 转换后的几何模型及其结构哈希，首次使用时计算
+        self.geometry_entries: Optional[List[Tuple[Dict, str]]] = None
+        # 释放完整数据后仍保留的几何模型摘要 [(identifier, 结构哈希, 紧凑JSON字节数)]
+        self.geometry_index: Optional[List[Tuple[str, str, int]]] = None
+        # 加载阶段的耗时和读取字节数（StageTimer.as_dict()）
+        self.load_metrics: Dict = {}
+        self._summarize()
+    
+    def _summarize(self):
+        """从完整数据中提取摘要信息"""
+        self.serialize_name = self.skin_data.get('serialize_name', '未知')
+        self.localization_name = self.skin_data.get('localization_name', '未知')
+        skins = self.skin_data.get('skins', [])
+        self.skin_count = len(skins)
+        self.geometry_count = len(self.geometry_data)
+        # 预演合并（MergePlanner）使用的皮肤摘要 [(localization_name, texture, geometry)] 和紧凑JSON字节数
+        self.skin_index = [(skin.get('localization_name', 'unknown'), skin.get('texture'), skin.get('geometry'))
+                           for skin in skins]
+        self.skin_bytes = len(json.dumps(skins, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    
+    @property
+    def loaded(self) -> bool:
+        """完整数据是否在内存中"""
+        return self.skin_data is not None
+    
+    @property
+    def info(self) -> Dict:
+        """摘要信息，不需要完整数据"""
+        return {
+            'serialize_name': self.serialize_name,
+            'localization_name': self.localization_name,
+            'skin_count': self.skin_count,
+            'geometry_count': self.geometry_count,
             'texture_count': len(self.texture_files),
             'other_count': len(self.other_files),
-            'geometries': set(),
-            'textures': set()
         }
-        
-        # 收集几何模型和纹理引用
-        for skin in self.skin_data.get('skins', []):
-            if skin.get('geometry'):
-                info['geometries'].add(skin['geometry'])
-            if skin.get('texture'):
-                info['textures'].add(skin['texture'])
-        
-        info['geometries'] = list(info['geometries'])
-        info['textures'] = list(info['textures'])
-        
-        return info
+    
+    def skins(self) -> List[Dict]:
+        """返回皮肤列表，数据已释放时抛出 ValueError"""
+        if self.skin_data is None:
+            raise ValueError(f"皮肤包数据已释放: {self.folder_name}")
+        return self.skin_data.get('skins', [])
+    
+    def converted_geometries(self) -> List[Tuple[Dict, str]]:
+        """返回转换为新格式的几何模型列表 [(geometry, structural_hash)]"""
+        if self.geometry_entries is None:
+            if self.geometry_data is None:
+                raise ValueError(f"皮肤包数据已释放: {self.folder_name}")
+            entries = []
+            index = []
+            for geo_file in self.geometry_data:
+                converted = GeometryConverter.convert_to_new_format(geo_file['data'])
+                if converted and 'minecraft:geometry' in converted:
+                    for geometry in converted['minecraft:geometry']:
+                        digest, size = GeometryConverter.structural_digest(geometry)
+                        entries.append((geometry, digest))
+                        index.append((geometry['description']['identifier'], digest, size))
+            self.geometry_entries = entries
+            self.geometry_index = index
+        return self.geometry_entries
+    
+    def release(self):
+        """释放完整的皮肤和几何模型数据，只保留摘要、文件位置和纹理哈希"""
+        if self.geometry_index is None and self.geometry_data is not None:
+            self.converted_geometries()
+        self.skin_data = None
+        self.geometry_data = None
+        self.geometry_entries = None
+    
 
 
 class GeometryConverter:
@@ -105,274 +370,4802 @@ class GeometryConverter:
             'format_version': '1.12.0',
             'minecraft:geometry': new_geometries
         }
-
-
-class JSONCleaner:
-    """JSON清理器，用于处理带注释的JSON文件"""
     
     @staticmethod
-    def clean_json_comments(json_string: str) -> str:
-        """清理JSON中的注释"""
-        # 移除单行注释
-        cleaned = re.sub(r'//.*$', '', json_string, flags=re.MULTILINE)
-        # 移除多行注释
-        cleaned = re.sub(r'/\*[\s\S]*?\*/', '', cleaned)
-        # 移除多余的逗号
-        cleaned = re.sub(r',(\s*[}\]])', r'\1', cleaned)
-        return cleaned
+    def structural_hash(geometry: Dict) -> str:
+        """计算几何模型的结构哈希（不含identifier），用于识别内容相同的模型"""
+        return GeometryConverter.structural_digest(geometry)[0]
     
     @staticmethod
-    def load_json_file(file_path: Path) -> Dict:
-        """加载JSON文件，支持注释"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return json.loads(content)
-        except json.JSONDecodeError:
-            print(f"⚠️  清理JSON注释: {file_path.name}")
-            cleaned_content = JSONCleaner.clean_json_comments(content)
-            return json.loads(cleaned_content)
+    def structural_digest(geometry: Dict) -> Tuple[str, int]:
+        """返回 (结构哈希, 紧凑JSON字节数)，字节数用于估算输出大小
+        
+        identifier 中 ":" 之前的名称不参与哈希，继承写法的父模型ID参与（父模型不同则结构不同）。
+        """
+        description = {key: value for key, value in geometry.get('description', {}).items()
+                       if key != 'identifier'}
+        _, sep, parent_id = geometry.get('description', {}).get('identifier', '').partition(':')
+        if sep:
+            description['parent'] = parent_id
+        normalized = dict(geometry, description=description)
+        canonical = json.dumps(normalized, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(canonical).hexdigest(), len(canonical)
+    
+    @staticmethod
+    def parents_first(identifiers: List[str]) -> List[int]:
+        """返回按继承关系排好的下标：同一皮肤包内的父模型排在子模型之前，其余保持原顺序"""
+        position = {}
+        for i, identifier in enumerate(identifiers):
+            position.setdefault(identifier.split(':', 1)[0], i)
+        order = []
+        placed = set()
+        for start in range(len(identifiers)):
+            chain = []
+            i = start
+            while i is not None and i not in placed:
+                placed.add(i)
+                chain.append(i)
+                i = position.get(identifiers[i].partition(':')[2])
+            order.extend(reversed(chain))
+        return order
+    
+    @staticmethod
+    def remap_parent(identifier: str, digest: str, geometry_map: Dict[str, str]) -> Tuple[str, str]:
+        """把继承写法中的父模型ID换成本包父模型合并后的ID，返回 (新ID, 结构哈希)
+        
+        父模型被重命名或与其他同结构的模型合并时，子模型的结构哈希也随之改变，
+        避免与其他皮肤包中继承同名（但不同）父模型的子模型合并。
+        """
+        base_id, sep, parent_id = identifier.partition(':')
+        merged_parent = geometry_map.get(parent_id, parent_id)
+        if not sep or merged_parent == parent_id:
+            return identifier, digest
+        digest = hashlib.sha256(f"{digest}\0{merged_parent}".encode('utf-8')).hexdigest()
+        return f"{base_id}:{merged_parent}", digest
+    
+    @staticmethod
+    def add_reference_mapping(geometry_map: Dict[str, str], original_id: str, merged_id: str):
+        """记录几何模型ID映射；继承写法同时记录不含父模型的ID，皮肤引用的是前半部分"""
+        geometry_map.setdefault(original_id, merged_id)
+        if ':' in original_id:
+            geometry_map.setdefault(original_id.split(':', 1)[0], merged_id.split(':', 1)[0])
 
 
-class SkinPackMerger:
-    """皮肤包合并器"""
+class GeometryAnalyzer:
+    """几何模型批量分析：可见范围、UV越界和退化方块
     
-    def __init__(self, package_name: str = "MergedSkinPack", display_name: str = "合并皮肤包"):
-        self.package_name = package_name
-        self.display_name = display_name
-        self.loaded_packs: List[SkinPackInfo] = []
+    合并结果中所有几何模型的方块先展开成按列存放的表（原点、尺寸、膨胀、旋转中心、UV），
+    再对整张表统一计算；安装了 numpy 时向量化计算，否则逐行计算，两者结果相同。
+    带旋转的方块（包括所在骨骼或其父骨骼带旋转）按绕旋转中心的外接球估算范围，
+    结果可能偏大，但不会漏掉旋转后伸出去的部分。
+    """
     
-    def load_skin_pack_folder(self, folder_path: Path) -> bool:
-        """加载单个皮肤包文件夹"""
+    # 比较UV和可见范围时允许的误差
+    EPSILON = 1e-6
+    
+    @staticmethod
+    def _vector(value, length: int = 3) -> Optional[Tuple[float, ...]]:
+        """转换为浮点元组，格式不对或含 NaN/inf 时返回 None"""
+        if not isinstance(value, (list, tuple)) or len(value) != length:
+            return None
         try:
-            print(f"📁 处理文件夹: {folder_path.name}")
-            
-            # 查找skins.json文件
-            skins_json = folder_path / 'skins.json'
-            if not skins_json.exists():
-                print(f"❌ 未找到skins.json: {folder_path}")
-                return False
-            
-            # 加载皮肤数据
-            skin_data = JSONCleaner.load_json_file(skins_json)
-            
-            # 查找几何模型文件
-            geometry_data = []
-            for geo_file in folder_path.glob('*.json'):
-                if geo_file.name.lower() in ['skins.json']:
+            result = tuple(map(float, value))
+        except (TypeError, ValueError):
+            return None
+        # 任一分量为 NaN/inf 时和也不是有限值
+        return result if math.isfinite(sum(result)) else None
+    
+    @staticmethod
+    def _bone_pivots(bones: List[Dict]) -> Dict[str, List[Tuple[float, ...]]]:
+        """每个骨骼自身及父骨骼中带旋转者的旋转中心，由内到外排列"""
+        by_name = {bone.get('name'): bone for bone in bones if isinstance(bone, dict)}
+        chains = {}
+        for name in by_name:
+            chain = []
+            seen = set()
+            current = by_name.get(name)
+            while current is not None and current.get('name') not in seen:
+                seen.add(current.get('name'))
+                rotation = GeometryAnalyzer._vector(current.get('rotation'))
+                if rotation is not None and any(rotation):
+                    chain.append(GeometryAnalyzer._vector(current.get('pivot')) or (0.0, 0.0, 0.0))
+                current = by_name.get(current.get('parent'))
+            chains[name] = chain
+        return chains
+    
+    @staticmethod
+    def flatten(geometries: List[Dict]) -> Dict:
+        """把所有几何模型的方块展开成按列存放的表
+        
+        每个方块一行：geometry 为几何模型序号（非递减），inflate 为膨胀值，where 为
+        (几何模型序号, 骨骼名, 方块序号)。数值列都是扁平的浮点列表，便于直接转换为数组：
+        origin/size 每行3个值；levels[k] 为 (行号列表, 旋转中心扁平列表)，表示第 k 层需要
+        按外接球扩展的方块；uv_boxes 为盒状UV，每项 (行号, u, v)；uv_faces 为逐面UV，
+        每项 (行号, u0, v0, u1, v1)。格式错误的方块记录在 malformed 中。
+        """
+        table = {'geometry': [], 'origin': [], 'size': [], 'inflate': [], 'where': [],
+                 'levels': [], 'uv_boxes': [], 'uv_faces': [], 'malformed': []}
+        vector = GeometryAnalyzer._vector
+        geometry_column, origin_column, size_column = table['geometry'], table['origin'], table['size']
+        inflate_column, where_column, levels = table['inflate'], table['where'], table['levels']
+        for geometry_index, geometry in enumerate(geometries):
+            bones = geometry.get('bones') or []
+            chains = GeometryAnalyzer._bone_pivots(bones)
+            for bone in bones:
+                if not isinstance(bone, dict):
                     continue
-                if 'geometry' in geo_file.name.lower() or 'model' in geo_file.name.lower():
+                bone_name = bone.get('name')
+                bone_pivot = vector(bone.get('pivot')) or (0.0, 0.0, 0.0)
+                bone_inflate = bone.get('inflate', 0)
+                chain = chains.get(bone_name, ())
+                for cube_index, cube in enumerate(bone.get('cubes') or []):
+                    where = (geometry_index, bone_name, cube_index)
+                    origin = vector(cube.get('origin')) if isinstance(cube, dict) else None
+                    size = vector(cube.get('size')) if origin is not None else None
+                    if size is None:
+                        table['malformed'].append(where)
+                        continue
                     try:
-                        geo_data = JSONCleaner.load_json_file(geo_file)
-                        geometry_data.append({
-                            'file_name': geo_file.name,
-                            'data': geo_data
-                        })
-                    except Exception as e:
-                        print(f"⚠️  几何模型读取失败: {geo_file.name} - {e}")
-            
-            # 收集纹理文件
-            texture_extensions = {'.png', '.jpg', '.jpeg'}
-            texture_files = [f for f in folder_path.iterdir() 
-                           if f.is_file() and f.suffix.lower() in texture_extensions]
-            
-            # 收集其他文件
-            other_files = [f for f in folder_path.iterdir() 
-                          if f.is_file() and f.suffix.lower() not in texture_extensions 
-                          and f.suffix == '.json' and f not in [skins_json] + [Path(folder_path / g['file_name']) for g in geometry_data]]
-            
-            # 创建皮肤包信息
-            pack_info = SkinPackInfo(
-                folder_path.name,
-                skin_data,
-                geometry_data,
-                texture_files,
-                other_files
-            )
-            
-            self.loaded_packs.append(pack_info)
-            print(f"✅ 成功加载: {folder_path.name} ({pack_info.info['skin_count']} 皮肤)")
-            return True
-            
-        except Exception as e:
-            print(f"❌ 加载失败: {folder_path.name} - {e}")
-            return False
+                        inflate = float(cube.get('inflate', bone_inflate))
+                    except (TypeError, ValueError):
+                        inflate = 0.0
+                    
+                    row = len(geometry_column)
+                    geometry_column.append(geometry_index)
+                    origin_column.extend(origin)
+                    size_column.extend(size)
+                    inflate_column.append(inflate if math.isfinite(inflate) else 0.0)
+                    where_column.append(where)
+                    
+                    rotation = cube.get('rotation')
+                    if rotation is not None:
+                        rotation = vector(rotation)
+                    pivots = chain
+                    if rotation is not None and any(rotation):
+                        pivots = [vector(cube.get('pivot')) or bone_pivot, *chain]
+                    for level, pivot in enumerate(pivots):
+                        if level == len(levels):
+                            levels.append(([], []))
+                        levels[level][0].append(row)
+                        levels[level][1].extend(pivot)
+                    
+                    uv = cube.get('uv')
+                    if isinstance(uv, dict):
+                        for face in uv.values():
+                            if not isinstance(face, dict):
+                                continue
+                            start = vector(face.get('uv'), 2)
+                            extent = vector(face.get('uv_size', [0, 0]), 2)
+                            if start is None or extent is None:
+                                continue
+                            u0, u1 = sorted((start[0], start[0] + extent[0]))
+                            v0, v1 = sorted((start[1], start[1] + extent[1]))
+                            table['uv_faces'].extend((row, u0, v0, u1, v1))
+                    else:
+                        start = vector(uv, 2)
+                        if start is not None:
+                            table['uv_boxes'].extend((row, start[0], start[1]))
+        return table
     
-    def merge_skin_packs(self) -> Dict:
-        """合并所有加载的皮肤包"""
-        if not self.loaded_packs:
-            raise ValueError("没有加载任何皮肤包")
+    @staticmethod
+    def _texture_sizes(geometries: List[Dict]) -> List[Tuple[float, float]]:
+        """各几何模型的UV空间尺寸，无效时不检查UV（视为无穷大）"""
+        sizes = []
+        for geometry in geometries:
+            description = geometry.get('description', {})
+            size = []
+            for key in ('texture_width', 'texture_height'):
+                value = description.get(key, 16)
+                size.append(float(value) if isinstance(value, (int, float)) and value > 0 else math.inf)
+            sizes.append(tuple(size))
+        return sizes
+    
+    @staticmethod
+    def _compute_numpy(table: Dict, texture_sizes: List[Tuple[float, float]]):
+        """向量化计算，返回 (几何模型序号 -> (下界, 上界), 退化方块行号, UV越界方块行号)"""
+        geometry_index = np.array(table['geometry'], dtype=np.int64)
+        origin = np.array(table['origin'], dtype=np.float64).reshape(-1, 3)
+        size = np.array(table['size'], dtype=np.float64).reshape(-1, 3)
+        inflate = np.array(table['inflate'], dtype=np.float64)[:, None]
+        lower = np.minimum(origin, origin + size) - inflate
+        upper = np.maximum(origin, origin + size) + inflate
+        for rows, pivots in table['levels']:
+            rows = np.array(rows, dtype=np.int64)
+            pivots = np.array(pivots, dtype=np.float64).reshape(-1, 3)
+            reach = np.maximum(np.abs(lower[rows] - pivots), np.abs(upper[rows] - pivots))
+            radius = np.sqrt((reach * reach).sum(axis=1))[:, None]
+            lower[rows] = pivots - radius
+            upper[rows] = pivots + radius
         
-        print("\n🔄 开始合并皮肤包...")
+        bounds = {}
+        if len(geometry_index):
+            starts = np.flatnonzero(np.r_[True, geometry_index[1:] != geometry_index[:-1]])
+            lows = np.minimum.reduceat(lower, starts, axis=0)
+            highs = np.maximum.reduceat(upper, starts, axis=0)
+            for index, low, high in zip(geometry_index[starts].tolist(), lows.tolist(), highs.tolist()):
+                bounds[index] = (tuple(low), tuple(high))
         
-        # 初始化合并结果
-        merged_skins = {
-            'skins': [],
-            'serialize_name': self.package_name,
-            'localization_name': self.display_name
-        }
+        degenerate = np.flatnonzero((size < 0).any(axis=1) | ((size > 0).sum(axis=1) < 2))
         
-        merged_geometry = {
-            'format_version': '1.12.0',
-            'minecraft:geometry': []
+        rects = [np.empty((0, 5))]
+        if table['uv_boxes']:
+            boxes = np.array(table['uv_boxes'], dtype=np.float64).reshape(-1, 3)
+            box_size = np.abs(size[boxes[:, 0].astype(np.int64)])
+            rects.append(np.column_stack([
+                boxes[:, 0], boxes[:, 1], boxes[:, 2],
+                boxes[:, 1] + 2 * (box_size[:, 0] + box_size[:, 2]),
+                boxes[:, 2] + box_size[:, 2] + box_size[:, 1]]))
+        if table['uv_faces']:
+            rects.append(np.array(table['uv_faces'], dtype=np.float64).reshape(-1, 5))
+        rects = np.concatenate(rects)
+        rows = rects[:, 0].astype(np.int64)
+        limits = np.array(texture_sizes, dtype=np.float64).reshape(-1, 2)[geometry_index[rows]]
+        eps = GeometryAnalyzer.EPSILON
+        outside = ((rects[:, 1] < -eps) | (rects[:, 2] < -eps) |
+                   (rects[:, 3] > limits[:, 0] + eps) | (rects[:, 4] > limits[:, 1] + eps))
+        return bounds, degenerate.tolist(), np.unique(rows[outside]).tolist()
+    
+    @staticmethod
+    def _compute_python(table: Dict, texture_sizes: List[Tuple[float, float]]):
+        """与 _compute_numpy 相同的计算，未安装 numpy 时使用"""
+        origin, size = table['origin'], table['size']
+        lower, upper = [], []
+        for row, inflate in enumerate(table['inflate']):
+            for axis in range(row * 3, row * 3 + 3):
+                start, end = origin[axis], origin[axis] + size[axis]
+                if end < start:
+                    start, end = end, start
+                lower.append(start - inflate)
+                upper.append(end + inflate)
+        for rows, pivots in table['levels']:
+            for i, row in enumerate(rows):
+                pivot = pivots[i * 3:i * 3 + 3]
+                radius = math.sqrt(sum(max(abs(lower[row * 3 + axis] - pivot[axis]),
+                                           abs(upper[row * 3 + axis] - pivot[axis])) ** 2
+                                       for axis in range(3)))
+                lower[row * 3:row * 3 + 3] = [p - radius for p in pivot]
+                upper[row * 3:row * 3 + 3] = [p + radius for p in pivot]
+        
+        bounds = {}
+        for row, index in enumerate(table['geometry']):
+            low, high = lower[row * 3:row * 3 + 3], upper[row * 3:row * 3 + 3]
+            current = bounds.get(index)
+            if current is None:
+                bounds[index] = (tuple(low), tuple(high))
+            else:
+                bounds[index] = (tuple(map(min, current[0], low)), tuple(map(max, current[1], high)))
+        
+        degenerate = []
+        for row in range(len(table['geometry'])):
+            dims = size[row * 3:row * 3 + 3]
+            if min(dims) < 0 or sum(1 for s in dims if s > 0) < 2:
+                degenerate.append(row)
+        
+        eps = GeometryAnalyzer.EPSILON
+        boxes, faces = table['uv_boxes'], table['uv_faces']
+        rects = []
+        for i in range(0, len(boxes), 3):
+            row, u, v = int(boxes[i]), boxes[i + 1], boxes[i + 2]
+            width, height, depth = (abs(s) for s in size[row * 3:row * 3 + 3])
+            rects.append((row, u, v, u + 2 * (width + depth), v + depth + height))
+        rects.extend((int(faces[i]), *faces[i + 1:i + 5]) for i in range(0, len(faces), 5))
+        outside = set()
+        for row, u0, v0, u1, v1 in rects:
+            width, height = texture_sizes[table['geometry'][row]]
+            if u0 < -eps or v0 < -eps or u1 > width + eps or v1 > height + eps:
+                outside.add(row)
+        return bounds, degenerate, sorted(outside)
+    
+    @staticmethod
+    def visible_bounds(lower: Tuple[float, ...], upper: Tuple[float, ...]) -> Dict:
+        """由模型范围（像素）计算可见范围（方块），水平方向以原点为中心
+        
+        模型空间的X轴与世界坐标方向相反，水平方向取关于原点对称的范围可以避免方向问题。
+        垂直中心取整到半像素，宽高向上取整到 1/16 方块。
+        """
+        horizontal = max(abs(lower[0]), abs(upper[0]), abs(lower[2]), abs(upper[2]))
+        center = round(lower[1] + upper[1]) / 2
+        vertical = max(upper[1] - center, center - lower[1])
+        return {
+            'visible_bounds_width': math.ceil(horizontal * 2 - GeometryAnalyzer.EPSILON) / 16,
+            'visible_bounds_height': math.ceil(vertical * 2 - GeometryAnalyzer.EPSILON) / 16,
+            'visible_bounds_offset': [0, center / 16, 0],
         }
+    
+    @staticmethod
+    def covers(description: Dict, lower: Tuple[float, ...], upper: Tuple[float, ...]) -> bool:
+        """已声明的可见范围是否包含模型范围（X轴两种方向都要包含）"""
+        width = description.get('visible_bounds_width')
+        height = description.get('visible_bounds_height')
+        offset = GeometryAnalyzer._vector(description.get('visible_bounds_offset', [0, 0, 0]))
+        if not isinstance(width, (int, float)) or not isinstance(height, (int, float)) or offset is None:
+            return False
+        eps = GeometryAnalyzer.EPSILON
+        half_width, half_height = width * 8, height * 8
+        center = [value * 16 for value in offset]
+        x_ranges = ((lower[0], upper[0]), (-upper[0], -lower[0]))
+        return (all(center[0] - half_width - eps <= low and high <= center[0] + half_width + eps
+                    for low, high in x_ranges) and
+                center[2] - half_width - eps <= lower[2] and upper[2] <= center[2] + half_width + eps and
+                center[1] - half_height - eps <= lower[1] and upper[1] <= center[1] + half_height + eps)
+    
+    @staticmethod
+    def _memo_key(geometry: Dict) -> Optional[Tuple[int, str]]:
+        """分析结果的缓存键：骨骼列表对象本身加上 description 的内容"""
+        bones = geometry.get('bones')
+        if not isinstance(bones, list):
+            return None
+        return id(bones), json.dumps(geometry.get('description', {}), sort_keys=True, ensure_ascii=False)
+    
+    @staticmethod
+    def analyze(geometries: List[Dict], fix_bounds: bool = True, memo: Optional[Dict] = None) -> Dict:
+        """分析几何模型列表；fix_bounds 时把可见范围不足（或缺失）的模型替换为带正确范围的副本
         
-        texture_files = {}
-        other_files = {}
+        已声明且足够大的可见范围保持不变（可能为动画预留了空间）。继承写法（"a:父模型"）的模型
+        只包含覆盖的骨骼，可见范围沿用父模型，不检查也不修改。列表中被替换的元素是浅拷贝，
+        源数据不会被修改。
+        memo 为跨多次调用保留的字典时，骨骼列表为同一对象且 description 相同的模型直接沿用上次的
+        结果（源数据不会被修改，所以结果不变）；调用结束后 memo 只保留本次用到的条目。
+        """
+        keys = [None] * len(geometries)
+        results = [None] * len(geometries)
+        pending = []
+        for i, geometry in enumerate(geometries):
+            if memo is not None:
+                keys[i] = GeometryAnalyzer._memo_key(geometry)
+                cached = memo.get(keys[i]) if keys[i] is not None else None
+                # 缓存中保留了骨骼列表的引用，id 不会被其他对象复用
+                if cached is not None and cached[0] is geometry.get('bones'):
+                    results[i] = cached[1]
+                    continue
+            pending.append(i)
         
-        # 跟踪重复项
-        existing_skin_names = set()
-        existing_geometry_ids = set()
-        all_pack_names = []
+        subset = [geometries[i] for i in pending]
+        table = GeometryAnalyzer.flatten(subset)
+        texture_sizes = GeometryAnalyzer._texture_sizes(subset)
+        if np is not None:
+            bounds, degenerate, outside = GeometryAnalyzer._compute_numpy(table, texture_sizes)
+        else:
+            bounds, degenerate, outside = GeometryAnalyzer._compute_python(table, texture_sizes)
         
-        total_skins = 0
-        total_geometries = 0
+        # 按模型整理本次计算的结果：方块数、可见范围、UV越界、退化方块和格式错误的方块
+        computed = [{'cubes': 0, 'bounds': None, 'uv': [], 'degenerate': [], 'malformed': []} for _ in subset]
+        for index in table['geometry']:
+            computed[index]['cubes'] += 1
+        for index, low_high in bounds.items():
+            computed[index]['bounds'] = low_high
+        for row in outside:
+            index, bone_name, cube_index = table['where'][row]
+            computed[index]['uv'].append((bone_name, cube_index, list(texture_sizes[table['geometry'][row]])))
+        for row in degenerate:
+            index, bone_name, cube_index = table['where'][row]
+            computed[index]['degenerate'].append((bone_name, cube_index, table['size'][row * 3:row * 3 + 3]))
+        for index, bone_name, cube_index in table['malformed']:
+            computed[index]['malformed'].append((bone_name, cube_index, None))
+        for j, i in enumerate(pending):
+            results[i] = computed[j]
+        if memo is not None:
+            used = {key: (geometries[i].get('bones'), results[i]) for i, key in enumerate(keys) if key is not None}
+            memo.clear()
+            memo.update(used)
         
-        for i, pack in enumerate(self.loaded_packs):
-            print(f"📦 处理: {pack.folder_name} ({i + 1}/{len(self.loaded_packs)})")
-            
-            all_pack_names.append(pack.info['serialize_name'])
-            
-            # 处理皮肤
-            skins = pack.skin_data.get('skins', [])
-            for skin in skins:
-                skin_copy = json.loads(json.dumps(skin))  # 深拷贝
-                skin_name = skin_copy.get('localization_name', 'unknown')
-                
-                # 处理重复的皮肤名称
-                if skin_name in existing_skin_names:
-                    counter = 2
-                    new_name = f"{skin_name}_{counter}"
-                    while new_name in existing_skin_names:
-                        counter += 1
-                        new_name = f"{skin_name}_{counter}"
-                    skin_copy['localization_name'] = new_name
-                    skin_name = new_name
-                    print(f"   🔀 重命名皮肤: {skin['localization_name']} -> {new_name}")
-                
-                existing_skin_names.add(skin_name)
-                merged_skins['skins'].append(skin_copy)
-                total_skins += 1
-            
-            # 处理几何模型
-            for geo_file in pack.geometry_data:
-                converted = GeometryConverter.convert_to_new_format(geo_file['data'])
-                if converted and 'minecraft:geometry' in converted:
-                    for geometry in converted['minecraft:geometry']:
-                        geometry_copy = json.loads(json.dumps(geometry))  # 深拷贝
-                        original_id = geometry_copy['description']['identifier']
-                        
-                        # 处理重复的几何模型ID
-                        identifier = original_id
-                        if identifier in existing_geometry_ids:
-                            counter = 2
-                            new_id = f"{identifier}_{counter}"
-                            while new_id in existing_geometry_ids:
-                                counter += 1
-                                new_id = f"{identifier}_{counter}"
-                            geometry_copy['description']['identifier'] = new_id
-                            identifier = new_id
-                            print(f"   🔀 重命名几何模型: {original_id} -> {new_id}")
-                        
-                        existing_geometry_ids.add(identifier)
-                        merged_geometry['minecraft:geometry'].append(geometry_copy)
-                        total_geometries += 1
+        def items(kind: str, field: str) -> List[Dict]:
+            found = []
+            for geometry, result in zip(geometries, results):
+                identifier = geometry.get('description', {}).get('identifier')
+                found.extend({'geometry': identifier, 'bone': bone_name, 'cube': cube_index, field: value}
+                             for bone_name, cube_index, value in result[kind])
+            return found
+        
+        report = {
+            'backend': 'numpy' if np is not None else 'python',
+            'geometries': len(geometries),
+            'cubes': sum(result['cubes'] for result in results),
+            'bounds_fixed': [],
+            'uv_out_of_bounds': items('uv', 'texture_size'),
+            'degenerate': items('degenerate', 'size') + items('malformed', 'size'),
+        }
+        for index, result in enumerate(results):
+            if result['bounds'] is None:
+                continue
+            low, high = result['bounds']
+            description = geometries[index].get('description', {})
+            if ':' in description.get('identifier', '') or GeometryAnalyzer.covers(description, low, high):
+                continue
+            new_bounds = GeometryAnalyzer.visible_bounds(low, high)
+            report['bounds_fixed'].append(dict(new_bounds, geometry=description.get('identifier')))
+            if fix_bounds:
+                geometries[index] = dict(geometries[index], description=dict(description, **new_bounds))
+        return report
+    
+    @staticmethod
+    def print_report(report: Dict, fixed: bool = True, limit: int = 10):
+        """输出分析结果，每类最多列出 limit 条"""
+        action = "已修正" if fixed else "需要修正"
+        print(f"📐 几何模型分析 ({report['geometries']} 个模型，{report['cubes']} 个方块，{report['backend']}): "
+              f"可见范围{action} {len(report['bounds_fixed'])} | UV越界 {len(report['uv_out_of_bounds'])} | "
+              f"退化方块 {len(report['degenerate'])}")
+        for item in report['uv_out_of_bounds'][:limit]:
+            print(f"   🧭 UV越界: {item['geometry']} / {item['bone']} #{item['cube']} "
+                  f"(纹理 {item['texture_size'][0]:g}x{item['texture_size'][1]:g})")
+        for item in report['degenerate'][:limit]:
+            print(f"   🪡 退化方块: {item['geometry']} / {item['bone']} #{item['cube']} 尺寸 {item['size']}")
+
+
+class JSONCleaner:
+    """JSON清理器，用于处理带注释的JSON文件
+    
+    宽松模式只扫描一遍：用正则定位注释和多余逗号这些候选位置，再根据其前面的
+    未转义引号数量判断候选是否落在字符串字面量内，落在字符串内的原样保留。
+    扫描开销只与候选数量相关，而不是与整个文件的词法单元数量相关。
+    
+    文件直接以字节解析（大文件通过 mmap），不再先解码出完整的字符串；解码后端在
+    JSON_BACKENDS 中按速度排列，运行时选用第一个可用的（安装了 orjson 时为 orjson），
+    标准库 json 作为兜底。解码期间暂停循环垃圾回收：解码结果不含循环引用，大文件
+    解码时反复触发的回收扫描比解码本身还慢。gc.disable() 对整个进程生效，多线程同时
+    解码时其他线程的回收也会推迟到最后一个解码结束；长期运行的多线程服务可将 pause_gc
+    设为 False。设置 split_workers 后，只有标准库后端时超大的几何模型文件把
+    minecraft:geometry 数组拆成若干段在进程池中并行解码（快速后端解码比主进程
+    反序列化工作进程的结果还快，拆分没有收益）。默认不拆分，按需开启。
+    """
+    
+    # 超过该大小的文件通过 mmap 解析
+    MMAP_THRESHOLD = 4 * 1024 * 1024
+    # 超过该大小的文件尝试拆分 minecraft:geometry 数组并行解码，每段约 SPLIT_CHUNK_BYTES
+    SPLIT_THRESHOLD = 16 * 1024 * 1024
+    SPLIT_CHUNK_BYTES = 4 * 1024 * 1024
+    # 并行解码的进程数：默认 1 表示不拆分，0 为CPU数量；已在工作进程中时总是不拆分
+    split_workers: int = 1
+    # 解码期间是否暂停循环垃圾回收（对整个进程生效）
+    pause_gc = True
+    
+    _gc_lock = threading.Lock()
+    _gc_pause_depth = 0
+    _gc_was_enabled = True
+    
+    _BOM = b'\xef\xbb\xbf'
+    _GEOMETRY_ARRAY_RE = re.compile(rb'"minecraft:geometry"\s*:\s*\[')
+    _DESCRIPTION_RE = re.compile(rb'"description"\s*:')
+    _WHITESPACE = b' \t\r\n'
+    # 快速后端在这些字符处报错时（NaN、Infinity、超出范围的数字）标准库可能可以解析
+    _STDLIB_RETRY_CHARS = 'NI-+.0123456789'
+    
+    _COMMENT = r'//[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
+    _COMMENT_RE = re.compile(_COMMENT)
+    # 逗号后（隔着空白）紧跟右括号或注释；两个正则分开搜索，各自都能利用首字符快速定位
+    _COMMA_RE = re.compile(r',(?=\s*[}\]/])')
+    # 行注释必须一直匹配到行尾，否则回溯时注释里的 ] 或 } 会被当成右括号
+    _TRAILING_RE = re.compile(r'(?:\s|//[^\n]*(?=\n|$)|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)*[}\]]')
+    # 从字符串内部某处到其结束引号
+    _STRING_TAIL_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    _QUOTE_OR_ESCAPE_RE = re.compile(r'\\.|"', re.DOTALL)
+    
+    @staticmethod
+    def _count_quotes(text: str, start: int, end: int) -> int:
+        """统计区间内未转义的引号数量"""
+        if text.find('\\', start, end) == -1:
+            return text.count('"', start, end)
+        return sum(1 for m in JSONCleaner._QUOTE_OR_ESCAPE_RE.finditer(text, start, end)
+                   if m.group() == '"')
+    
+    @staticmethod
+    def clean_json_comments(json_string: str) -> str:
+        """清理JSON中的注释和多余的逗号（不会改动字符串内容，如URL中的 //）"""
+        if json_string.startswith('\ufeff'):
+            json_string = json_string[1:]
+        
+        comment_re = JSONCleaner._COMMENT_RE
+        comma_re = JSONCleaner._COMMA_RE
+        pieces = []
+        pos = 0  # pos 始终位于字符串字面量之外
+        next_comment = comment_re.search(json_string)
+        next_comma = comma_re.search(json_string)
+        while next_comment or next_comma:
+            if next_comment and (not next_comma or next_comment.start() < next_comma.start()):
+                match = next_comment
+            else:
+                match = next_comma
+            start = match.start()
             
-            # 收集文件
-            for texture_file in pack.texture_files:
-                if texture_file.name not in texture_files:
-                    texture_files[texture_file.name] = texture_file
+            if JSONCleaner._count_quotes(json_string, pos, start) % 2:
+                # 候选位于字符串内部，跳到字符串结束处继续
+                tail = JSONCleaner._STRING_TAIL_RE.match(json_string, start)
+                if tail is None:
+                    break
+                pieces.append(json_string[pos:tail.end()])
+                pos = tail.end()
+            elif match is next_comma and not JSONCleaner._TRAILING_RE.match(json_string, match.end()):
+                # 逗号后面的注释之后不是右括号，逗号需要保留
+                pieces.append(json_string[pos:match.end()])
+                pos = match.end()
+            else:
+                pieces.append(json_string[pos:start])
+                pos = match.end()
             
-            for other_file in pack.other_files:
-                if other_file.name not in other_files:
-                    other_files[other_file.name] = other_file
+            if next_comment and next_comment.start() < pos:
+                next_comment = comment_re.search(json_string, pos)
+            if next_comma and next_comma.start() < pos:
+                next_comma = comma_re.search(json_string, pos)
+        pieces.append(json_string[pos:])
+        return ''.join(pieces)
+    
+    @staticmethod
+    @contextlib.contextmanager
+    def gc_paused():
+        """暂停循环垃圾回收（可嵌套、可在多个线程中同时使用）
         
-        # 如果没有指定名称，使用合并的包名
-        if self.package_name == "MergedSkinPack":
-            merged_skins['serialize_name'] = '_'.join(all_pack_names[:3])  # 最多3个包名
-        if self.display_name == "合并皮肤包":
-            merged_skins['localization_name'] = ' + '.join(all_pack_names[:3])
+        暂停对整个进程生效，直到所有线程的暂停都结束；pause_gc 为 False 时不做任何事。
+        """
+        if not JSONCleaner.pause_gc:
+            yield
+            return
+        with JSONCleaner._gc_lock:
+            if JSONCleaner._gc_pause_depth == 0:
+                JSONCleaner._gc_was_enabled = gc.isenabled()
+                gc.disable()
+            JSONCleaner._gc_pause_depth += 1
+        try:
+            yield
+        finally:
+            with JSONCleaner._gc_lock:
+                JSONCleaner._gc_pause_depth -= 1
+                if JSONCleaner._gc_pause_depth == 0 and JSONCleaner._gc_was_enabled:
+                    gc.enable()
+    
+    @staticmethod
+    def loads(content, cleanable: bool = False) -> Any:
+        """严格模式解析（str、bytes 或 memoryview），使用当前选用的后端
+        
+        cleanable=True 表示调用方出错后会清理注释再解析：快速后端不是因为 NaN、Infinity 或数字
+        出错时（注释、多余的逗号）直接抛出异常，不再用标准库把同样会失败的内容重新解析一遍。
+        """
+        _, backend_loads, errors = JSON_BACKEND
+        with JSONCleaner.gc_paused():
+            if backend_loads is not _stdlib_json_loads:
+                try:
+                    return backend_loads(content)
+                except errors as e:
+                    # orjson 不支持 NaN、超长整数等标准库可以接受的写法
+                    if cleanable and not JSONCleaner._stdlib_may_accept(content, e):
+                        raise
+            return _stdlib_json_loads(content)
+    
+    @staticmethod
+    def _stdlib_may_accept(content, error: ValueError) -> bool:
+        """根据快速后端报错位置的字符判断标准库是否可能解析成功"""
+        pos = getattr(error, 'pos', None)
+        if pos is None:
+            return True
+        char = content[pos:pos + 1]
+        if not isinstance(char, str):
+            char = bytes(char).decode('latin-1')
+        return bool(char) and char in JSONCleaner._STDLIB_RETRY_CHARS
+    
+    @staticmethod
+    def load_json_file(file_path: Path) -> Dict:
+        """加载JSON文件，支持注释；大文件通过 mmap 直接解析"""
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < JSONCleaner.MMAP_THRESHOLD:
+                return JSONCleaner.load_json_bytes(f.read(), file_path.name)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return JSONCleaner.load_json_bytes(memoryview(mapped), file_path.name)
+            finally:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # 异常回溯仍引用着视图，由垃圾回收负责解除映射
+                    pass
+    
+    @staticmethod
+    def load_json_bytes(data, name: str) -> Dict:
+        """解析UTF-8字节（bytes 或 memoryview），支持注释；只有需要清理注释时才解码为字符串"""
+        if data[:3] == JSONCleaner._BOM:
+            data = data[3:]
+        if (JSONCleaner.split_workers != 1 and len(data) >= JSONCleaner.SPLIT_THRESHOLD
+                and JSON_BACKEND[1] is _stdlib_json_loads):
+            result = JSONCleaner.load_geometry_split(data)
+            if result is not None:
+                return result
+        try:
+            return JSONCleaner.loads(data, cleanable=True)
+        except json.JSONDecodeError:
+            print(f"⚠️  清理JSON注释: {name}")
+            return JSONCleaner.loads(JSONCleaner.clean_json_comments(str(data, 'utf-8')))
+    
+    @staticmethod
+    def _skip_whitespace_back(data, pos: int) -> int:
+        """返回 pos 之前最后一个非空白字节的位置"""
+        pos -= 1
+        while pos >= 0 and data[pos] in JSONCleaner._WHITESPACE:
+            pos -= 1
+        return pos
+    
+    @staticmethod
+    def geometry_chunks(data, chunk_bytes: int) -> Optional[Tuple[int, int, List[Tuple[int, int]]]]:
+        """按几何模型边界把顶层 minecraft:geometry 数组切成约 chunk_bytes 的若干段
+        
+        返回 (数组 "[" 之后的位置, 数组 "]" 的位置, [(段起点, 段终点)])。数组必须是文档的最后一个键，
+        边界取在 "description" 所在对象的 "{" 前的逗号处；找不到时返回 None。
+        这里只是候选边界，每段能独立解析为完整的数组才说明切分正确。
+        """
+        match = JSONCleaner._GEOMETRY_ARRAY_RE.search(data)
+        if match is None:
+            return None
+        array_start = match.end()
+        close_object = JSONCleaner._skip_whitespace_back(data, len(data))
+        array_end = JSONCleaner._skip_whitespace_back(data, close_object)
+        if close_object < 0 or data[close_object] != ord('}') or data[array_end] != ord(']'):
+            return None
+        
+        chunks = []
+        chunk_start = array_start
+        for description in JSONCleaner._DESCRIPTION_RE.finditer(data, array_start + chunk_bytes, array_end):
+            if description.start() < chunk_start + chunk_bytes:
+                continue
+            brace = JSONCleaner._skip_whitespace_back(data, description.start())
+            comma = JSONCleaner._skip_whitespace_back(data, brace)
+            if data[brace] != ord('{') or data[comma] != ord(','):
+                continue
+            chunks.append((chunk_start, comma))
+            chunk_start = brace
+        chunks.append((chunk_start, array_end))
+        return array_start, array_end, chunks
+    
+    @staticmethod
+    def decode_array_chunk(chunk: bytes) -> List:
+        """解码一段数组元素（进程池中执行）"""
+        return JSONCleaner.loads(b'[' + chunk + b']')
+    
+    @staticmethod
+    def load_geometry_split(data, workers: Optional[int] = None) -> Optional[Dict]:
+        """把超大文件的 minecraft:geometry 数组拆段，在进程池中并行解码
+        
+        拆分不可行（单进程、已在工作进程中、格式不符或任一段解析失败）时返回 None，
+        由调用方按整个文件解析。
+        """
+        if workers is None:
+            workers = JSONCleaner.split_workers
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or multiprocessing.parent_process() is not None:
+            return None
+        located = JSONCleaner.geometry_chunks(data, JSONCleaner.SPLIT_CHUNK_BYTES)
+        if located is None or len(located[2]) < 2:
+            return None
+        array_start, array_end, chunks = located
+        try:
+            # 数组替换为空数组后解析其余部分
+            document = JSONCleaner.loads(bytes(data[:array_start]) + bytes(data[array_end:]))
+            if not isinstance(document, dict) or document.get('minecraft:geometry') != []:
+                return None
+            geometries = document['minecraft:geometry']
+            # 工作进程的结果在主进程中反序列化，同样暂停垃圾回收
+            with JSONCleaner.gc_paused(), ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                # 同时在途的分段有限，避免为所有分段一次性复制出完整的数据
+                pending = deque()
+                for start, end in chunks:
+                    pending.append(executor.submit(JSONCleaner.decode_array_chunk, bytes(data[start:end])))
+                    if len(pending) >= workers * 2:
+                        geometries.extend(pending.popleft().result())
+                while pending:
+                    geometries.extend(pending.popleft().result())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+        return document
+    
+    @staticmethod
+    def load_json_text(content: str, name: str) -> Dict:
+        """解析JSON文本，支持注释"""
+        try:
+            return JSONCleaner.loads(content, cleanable=True)
+        except json.JSONDecodeError:
+            print(f"⚠️  清理JSON注释: {name}")
+            cleaned_content = JSONCleaner.clean_json_comments(content)
+            return JSONCleaner.loads(cleaned_content)
+
+
+def _stdlib_json_loads(content) -> Any:
+    """标准库解析；字节直接解码为字符串（json.loads 不接受 memoryview，传入 bytes 也会先解码）"""
+    if not isinstance(content, str):
+        content = str(content, 'utf-8')
+    return json.loads(content)
+
+
+# JSON解码后端，按解析速度从快到慢排列：(名称, loads, 解析失败时抛出的异常)。
+# loads 需要同时接受 str、bytes 和 memoryview；标准库后端总是可用，排在最后兜底
+JSON_BACKENDS: List[Tuple[str, Any, Tuple[type, ...]]] = []
+if orjson is not None:
+    JSON_BACKENDS.append(('orjson', orjson.loads, (orjson.JSONDecodeError,)))
+JSON_BACKENDS.append(('json', _stdlib_json_loads, (json.JSONDecodeError,)))
+JSON_BACKEND = JSON_BACKENDS[0]
+
+
+def use_json_backend(name: Optional[str] = None) -> str:
+    """切换JSON解码后端（None 为最快的可用后端），返回实际使用的后端名称"""
+    global JSON_BACKEND
+    for backend in JSON_BACKENDS:
+        if name is None or backend[0] == name:
+            JSON_BACKEND = backend
+            return backend[0]
+    raise ValueError(f"JSON解码后端不可用: {name}（可用: {', '.join(b[0] for b in JSON_BACKENDS)}）")
+
+
+def _legacy_clean_json_comments(json_string: str) -> str:
+    """旧版三次正则清理，仅用于基准测试对比"""
+    cleaned = re.sub(r'//.*$', '', json_string, flags=re.MULTILINE)
+    cleaned = re.sub(r'/\*[\s\S]*?\*/', '', cleaned)
+    cleaned = re.sub(r',(\s*[}\]])', r'\1', cleaned)
+    return cleaned
+
+
+def _legacy_load_json_text(content: str) -> Dict:
+    """旧版解析流程：标准库解析失败后三次正则清理再解析，仅用于基准测试对比"""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return json.loads(_legacy_clean_json_comments(content))
+
+
+def make_commented_geometry_json(geometry_count: int = 200, bones_per_geometry: int = 20,
+                                 cubes_per_bone: int = 8) -> str:
+    """生成带注释和多余逗号的大型几何模型JSON文本，用于基准测试"""
+    lines = ['// generated geometry', '{', '  "format_version": "1.12.0",', '  "minecraft:geometry": [']
+    for g in range(geometry_count):
+        lines.append('    { /* geometry */')
+        lines.append(f'      "description": {{"identifier": "geometry.bench_{g}", "texture_width": 64, '
+                     f'"texture_height": 64,}},')
+        lines.append('      "bones": [ // bones')
+        for b in range(bones_per_geometry):
+            cubes = ', '.join(
+                f'{{"origin": [{c}, {b}, -2], "size": [4, 4, 4], "uv": [{c * 4}, {b % 16}]}}'
+                for c in range(cubes_per_bone))
+            lines.append(f'        {{"name": "bone_{b}", "pivot": [0, {b}, 0], "cubes": [{cubes}]}},')
+        lines.append('      ]')
+        lines.append('    },')
+    lines.append('  ]')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def benchmark_json_loading(file_paths: Optional[List[Path]] = None, repeat: int = 10) -> List[Dict]:
+    """对比旧版清理流程和单次扫描宽松解析的耗时
+    
+    未指定文件时使用生成的大型带注释几何模型。返回每个样本的最短耗时（秒）。
+    """
+    samples = []
+    if file_paths:
+        for file_path in file_paths:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                samples.append((Path(file_path).name, f.read()))
+    else:
+        samples.append(('synthetic_geometry.json', make_commented_geometry_json()))
+    
+    def best_time(func, content) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(content)
+            best = min(best, time.perf_counter() - start)
+        return best
+    
+    def lenient_load(content):
+        try:
+            return JSONCleaner.loads(content, cleanable=True)
+        except json.JSONDecodeError:
+            return JSONCleaner.loads(JSONCleaner.clean_json_comments(content))
+    
+    results = []
+    for name, content in samples:
+        lenient = best_time(lenient_load, content)
+        try:
+            legacy = best_time(_legacy_load_json_text, content)
+        except json.JSONDecodeError:
+            # 旧版会误删字符串中的 //，部分文件根本无法解析
+            legacy = None
+        results.append({
+            'name': name,
+            'size_bytes': len(content.encode('utf-8')),
+            'legacy_seconds': legacy,
+            'lenient_seconds': lenient,
+            'speedup': legacy / lenient if legacy and lenient else None,
+            'backend': JSON_BACKEND[0]
+        })
+        legacy_text = f"{legacy * 1000:.1f} ms" if legacy is not None else "解析失败"
+        speedup_text = f"{results[-1]['speedup']:.2f}x" if results[-1]['speedup'] else "-"
+        print(f"📊 {name} ({len(content) / (1024 * 1024):.2f} MB): 旧版 {legacy_text} | "
+              f"单次扫描 {lenient * 1000:.1f} ms | 提升 {speedup_text}")
+    return results
+
+
+def make_geometry_document(target_bytes: int, bones_per_geometry: int = 20, cubes_per_bone: int = 8) -> Dict:
+    """生成缩进后约 target_bytes 大小的多模型几何文件（实体风格），用于解码基准测试"""
+    rng = random.Random(target_bytes)
+    geometries = []
+    size = 0
+    while size < target_bytes:
+        g = len(geometries)
+        bones = []
+        for b in range(bones_per_geometry):
+            cubes = [{'origin': [round(rng.uniform(-8, 8), 3), b, round(rng.uniform(-8, 8), 3)],
+                      'size': [rng.randint(1, 8), rng.randint(1, 8), rng.randint(1, 8)],
+                      'uv': [rng.randint(0, 60), rng.randint(0, 60)]} for _ in range(cubes_per_bone)]
+            bones.append({'name': f'bone_{b}', 'parent': f'bone_{b - 1}' if b else None,
+                          'pivot': [0, b, 0], 'cubes': cubes})
+        geometry = {'description': {'identifier': f'geometry.entity_{g}', 'texture_width': 64,
+                                    'texture_height': 64},
+                    'bones': bones}
+        geometries.append(geometry)
+        size += len(json.dumps(geometry, indent=2))
+    return {'format_version': '1.12.0', 'minecraft:geometry': geometries}
+
+
+def benchmark_json_decoding(file_paths: Optional[List[Path]] = None, size_mb: int = 32,
+                            repeat: int = 3, workers: Optional[int] = None) -> List[Dict]:
+    """对比大型几何模型文件的解码路径：各后端下的旧流程（读入完整字符串）、
+    字节/mmap 解码以及拆分 minecraft:geometry 并行解码
+    
+    未指定文件时生成约 size_mb MB 的多模型几何文件。返回每个样本、后端和路径的
+    最短耗时（秒）与 tracemalloc 统计的主进程内存峰值。
+    """
+    import tempfile
+    
+    split_workers = workers or max(2, os.cpu_count() or 1)
+    
+    def legacy_load(file_path: Path):
+        # 旧流程：读入完整字符串，解码期间垃圾回收照常运行
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        try:
+            return JSON_BACKEND[1](content)
+        except JSON_BACKEND[2]:
+            return json.loads(content)
+    
+    def bytes_load(file_path: Path):
+        JSONCleaner.split_workers = 1
+        return JSONCleaner.load_json_file(file_path)
+    
+    def split_load(file_path: Path):
+        # 不论后端都强制拆分，用于对比
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            document = JSONCleaner.load_geometry_split(view, workers=split_workers)
+            view.release()
+        if document is None:
+            raise ValueError(f"无法拆分: {file_path.name}")
+        return document
+    
+    def signature(document: Dict) -> Tuple:
+        geometries = document.get('minecraft:geometry') or [None]
+        return len(document), len(geometries), geometries[-1]
+    
+    paths = [('str', legacy_load), ('bytes', bytes_load), (f'split x{split_workers}', split_load)]
+    results = []
+    original_backend = JSON_BACKEND[0]
+    original_split = JSONCleaner.split_workers
+    with tempfile.TemporaryDirectory(prefix='skinpack-json-') as temp_dir:
+        if not file_paths:
+            file_path = Path(temp_dir) / 'entity_geometry.json'
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(make_geometry_document(size_mb * 1024 * 1024), f, indent=2)
+            file_paths = [file_path]
+        try:
+            for file_path in file_paths:
+                file_path = Path(file_path)
+                size = file_path.stat().st_size
+                expected = None
+                for backend_name, _, _ in JSON_BACKENDS:
+                    use_json_backend(backend_name)
+                    for path_name, load in paths:
+                        best = float('inf')
+                        for _ in range(repeat):
+                            # 不保留上一次的结果，避免存活对象数量影响垃圾回收开销
+                            document = None
+                            gc.collect()
+                            start = time.perf_counter()
+                            document = load(file_path)
+                            best = min(best, time.perf_counter() - start)
+                        if expected is None:
+                            expected = signature(document)
+                        elif signature(document) != expected:
+                            raise ValueError(f"解码结果不一致: {backend_name}/{path_name}")
+                        document = None
+                        gc.collect()
+                        tracemalloc.start()
+                        load(file_path)
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                        results.append({'name': file_path.name, 'size_bytes': size, 'backend': backend_name,
+                                        'path': path_name, 'seconds': best, 'peak_bytes': peak})
+                        print(f"📊 {file_path.name} ({size / (1024 * 1024):.1f} MB) {backend_name:<7} "
+                              f"{path_name:<10} {best * 1000:8.1f} ms | 峰值 {peak / (1024 * 1024):7.1f} MB")
+                expected = None
+        finally:
+            use_json_backend(original_backend)
+            JSONCleaner.split_workers = original_split
+    return results
+
+
+# 支持直接读取的压缩包格式
+ARCHIVE_EXTENSIONS = {'.zip', '.mcpack'}
+
+
+class ArchiveMember:
+    """压缩包内文件的延迟引用（压缩包路径 + 成员名），不提前解压数据"""
+    
+    def __init__(self, archive_path: Path, member_name: str):
+        self.archive_path = Path(archive_path)
+        self.member_name = member_name
+    
+    @property
+    def name(self) -> str:
+        return self.member_name.rsplit('/', 1)[-1]
+    
+    @property
+    def suffix(self) -> str:
+        return Path(self.name).suffix
+    
+    def read_bytes(self) -> bytes:
+        with zipfile.ZipFile(self.archive_path) as zf:
+            return zf.read(self.member_name)
+    
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, ArchiveMember) and self.archive_path == other.archive_path
+                and self.member_name == other.member_name)
+    
+    def __hash__(self) -> int:
+        return hash((self.archive_path, self.member_name))
+    
+    def __repr__(self) -> str:
+        return f"ArchiveMember({str(self.archive_path)!r}, {self.member_name!r})"
+
+
+# write_raw_zip_entry 用到的 zipfile 内部属性，任何一个不存在时退回解压后重新写入
+ZIPFILE_RAW_WRITE_ATTRS = ('_lock', '_writing', '_seekable', '_writecheck', '_didModify', 'start_dir',
+                           'fp', 'filelist', 'NameToInfo')
+
+
+def zipfile_supports_raw_write(zf: zipfile.ZipFile) -> bool:
+    """当前 Python 的 zipfile 是否具备原样写入压缩数据所需的内部属性"""
+    return all(hasattr(zf, name) for name in ZIPFILE_RAW_WRITE_ATTRS)
+
+
+def set_zip_compress_level(zinfo: zipfile.ZipInfo, level: Optional[int]):
+    """设置条目的压缩级别（Python 3.13 起为公开的 compress_level）"""
+    if hasattr(zipfile.ZipInfo, 'compress_level'):
+        zinfo.compress_level = level
+    else:
+        zinfo._compresslevel = level
+
+
+def rewrite_zip_entry(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, raw_data: bytes):
+    """解压已压缩的数据，再用 zipfile 的公开接口按原压缩方式写入"""
+    if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(raw_data, -15)
+    elif zinfo.compress_type == zipfile.ZIP_STORED:
+        data = raw_data
+    else:
+        raise zipfile.BadZipFile(f"不支持的压缩方式 {zinfo.compress_type}: {zinfo.filename}")
+    if zlib.crc32(data) != zinfo.CRC:
+        raise zipfile.BadZipFile(f"CRC校验失败: {zinfo.filename}")
+    new_info = zipfile.ZipInfo(zinfo.filename, date_time=zinfo.date_time)
+    new_info.external_attr = zinfo.external_attr or 0o600 << 16
+    zf.writestr(new_info, data, compress_type=zinfo.compress_type)
+
+
+def write_raw_zip_entry(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, raw_data: bytes):
+    """将已压缩的数据原样写入ZIP
+    
+    zinfo 必须已填好 compress_type、CRC、compress_size 和 file_size。
+    zipfile 没有公开的原始写入接口，这里按 ZipFile._open_to_write 的流程直接写本地文件头；
+    zipfile 内部实现不同（缺少所需属性）时退回 rewrite_zip_entry。
+    """
+    if not zipfile_supports_raw_write(zf):
+        rewrite_zip_entry(zf, zinfo, raw_data)
+        return
+    with zf._lock:
+        if zf._writing:
+            raise ValueError("ZIP文件存在未关闭的写入句柄")
+        zinfo.flag_bits = 0x00
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader())
+        zf.fp.write(raw_data)
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+
+
+class ArchiveMemberCopier:
+    """读取压缩包成员，压缩方式与输出一致时提供原始压缩数据供直接复用"""
+    
+    # ZIP本地文件头：固定30字节，文件名长度和扩展字段长度位于第26-29字节
+    LOCAL_HEADER_SIZE = 30
+    LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+    
+    def __init__(self):
+        self._archives: Dict[Path, Tuple[zipfile.ZipFile, Any]] = {}
+        # 允许多个压缩线程同时读取
+        self._lock = threading.Lock()
+    
+    def _open(self, archive_path: Path) -> Tuple[zipfile.ZipFile, Any]:
+        with self._lock:
+            if archive_path not in self._archives:
+                self._archives[archive_path] = (zipfile.ZipFile(archive_path), open(archive_path, 'rb'))
+            return self._archives[archive_path]
+    
+    def getinfo(self, member: ArchiveMember) -> zipfile.ZipInfo:
+        """获取成员的ZipInfo"""
+        src_zf, _ = self._open(member.archive_path)
+        return src_zf.getinfo(member.member_name)
+    
+    def read(self, member: ArchiveMember) -> bytes:
+        """读取并解压成员数据"""
+        src_zf, _ = self._open(member.archive_path)
+        return src_zf.read(member.member_name)
+    
+    def read_raw(self, member: ArchiveMember) -> Tuple[zipfile.ZipInfo, bytes]:
+        """读取成员的原始压缩数据"""
+        src_zf, raw_fp = self._open(member.archive_path)
+        info = src_zf.getinfo(member.member_name)
+        with self._lock:
+            raw_fp.seek(info.header_offset)
+            header = raw_fp.read(self.LOCAL_HEADER_SIZE)
+            if len(header) != self.LOCAL_HEADER_SIZE or header[:4] != self.LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f"本地文件头损坏: {member.member_name}")
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            raw_fp.seek(name_length + extra_length, 1)
+            return info, raw_fp.read(info.compress_size)
+    
+    def can_reuse(self, member: ArchiveMember, compress_type: int) -> bool:
+        """成员的压缩方式与目标一致（且未加密）时可直接复用压缩数据"""
+        info = self.getinfo(member)
+        return info.compress_type == compress_type and not info.flag_bits & 0x1
+    
+    def close(self):
+        for src_zf, raw_fp in self._archives.values():
+            src_zf.close()
+            raw_fp.close()
+        self._archives.clear()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JSONStreamEncoder:
+    """逐条输出JSON文档的编码器
+    
+    顶层的列表值（如 skins、minecraft:geometry）逐个元素编码后立即写出，
+    不需要先在内存中拼出整个文档字符串。indent=2 时输出与
+    json.dumps(indent=2, ensure_ascii=False) 相同；indent=None 输出紧凑格式。
+    安装了 orjson 时用它编码单个元素。
+    """
+    
+    BUFFER_SIZE = 1024 * 1024
+    
+    def __init__(self, indent: Optional[int] = 2):
+        self.indent = indent
+    
+    def encode_value(self, value, level: int = 0) -> bytes:
+        """编码单个值，缩进模式下按所在层级补齐缩进"""
+        data = None
+        if orjson is not None and self.indent in (None, 2):
+            try:
+                data = orjson.dumps(value, option=orjson.OPT_INDENT_2 if self.indent else 0)
+            except (orjson.JSONEncodeError, TypeError):
+                data = None
+        if data is None:
+            if self.indent is None:
+                data = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            else:
+                data = json.dumps(value, indent=self.indent, ensure_ascii=False).encode('utf-8')
+        if self.indent and level:
+            # JSON字符串中的换行都已转义，这里的换行只会是格式换行
+            data = data.replace(b'\n', b'\n' + b' ' * (self.indent * level))
+        return data
+    
+    def iter_chunks(self, document: Dict) -> Iterator[bytes]:
+        """按顺序产出文档的UTF-8片段"""
+        if not document:
+            yield b'{}'
+            return
+        
+        indent = self.indent
+        if indent is None:
+            key_sep, item_sep, open_obj, close_obj = b':', b',', b'{', b'}'
+            pad1 = pad2 = b''
+            open_list, close_list = b'[', b']'
+        else:
+            key_sep, item_sep, open_obj, close_obj = b': ', b',\n', b'{\n', b'\n}'
+            pad1, pad2 = b' ' * indent, b' ' * (indent * 2)
+            open_list, close_list = b'[\n', b'\n' + pad1 + b']'
+        
+        yield open_obj
+        for i, (key, value) in enumerate(document.items()):
+            prefix = (item_sep if i else b'') + pad1 + json.dumps(key, ensure_ascii=False).encode('utf-8') + key_sep
+            if isinstance(value, list) and value:
+                yield prefix + open_list
+                for j, item in enumerate(value):
+                    yield (item_sep if j else b'') + pad2 + self.encode_value(item, 2)
+                yield close_list
+            else:
+                yield prefix + self.encode_value(value, 1)
+        yield close_obj
+    
+    def write(self, document: Dict, fp) -> int:
+        """写入二进制文件对象，返回写入的字节数"""
+        buffer = []
+        buffered = 0
+        total = 0
+        for chunk in self.iter_chunks(document):
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= self.BUFFER_SIZE:
+                fp.write(b''.join(buffer))
+                total += buffered
+                buffer, buffered = [], 0
+        if buffer:
+            fp.write(b''.join(buffer))
+            total += buffered
+        return total
+
+
+class CompressionPolicy:
+    """按文件类型选择压缩方式和压缩级别
+    
+    PNG/JPG 本身已经是压缩格式，再次DEFLATE几乎没有收益，默认直接存储；
+    JSON 等文本压缩率高，使用较高的DEFLATE级别。快速模式以体积换速度。
+    """
+    
+    STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+    TEXT_EXTENSIONS = {'.json', '.lang'}
+    
+    def __init__(self, fast: bool = False, text_level: Optional[int] = None,
+                 default_level: Optional[int] = None):
+        self.fast = fast
+        self.text_level = text_level if text_level is not None else (1 if fast else 9)
+        self.default_level = default_level if default_level is not None else (1 if fast else 6)
+    
+    def for_name(self, arcname: str) -> Tuple[int, int]:
+        """返回 (compress_type, compresslevel)"""
+        suffix = Path(arcname).suffix.lower()
+        if suffix in self.STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED, 0
+        if suffix in self.TEXT_EXTENSIONS:
+            return zipfile.ZIP_DEFLATED, self.text_level
+        return zipfile.ZIP_DEFLATED, self.default_level
+
+
+class ParallelZipWriter:
+    """并行压缩、顺序写入的ZIP写入器
+    
+    各条目在线程池中读取并压缩（zlib压缩时会释放GIL），主线程按添加顺序
+    将压缩好的数据写入压缩包。同时排队的条目数量有上限，避免占用过多内存。
+    """
+    
+    def __init__(self, output_path: Path, policy: Optional[CompressionPolicy] = None,
+                 workers: Optional[int] = None, metrics: Optional[Metrics] = None):
+        self.policy = policy or CompressionPolicy()
+        self.metrics = metrics or Metrics('quiet')
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = self.workers * 4
+        self.zf = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED)
+        self.copier = ArchiveMemberCopier()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+    
+    def add(self, arcname: str, source, on_written=None, on_error=None):
+        """添加条目；source 可以是 bytes、str、磁盘路径或 ArchiveMember
+        
+        on_written(arcname) 在条目写入后调用，on_error(arcname, exc) 在读取或压缩失败时调用，
+        未提供 on_error 时异常会直接抛出。
+        """
+        future = self.executor.submit(self._prepare_entry, arcname, source)
+        self.pending.append((arcname, future, on_written, on_error))
+        while len(self.pending) > self.max_pending:
+            self._write_next()
+    
+    def _prepare_entry(self, arcname: str, source) -> Tuple[zipfile.ZipInfo, bytes]:
+        """在工作线程中读取并压缩条目"""
+        compress_type, level = self.policy.for_name(arcname)
+        
+        if isinstance(source, ArchiveMember):
+            if self.copier.can_reuse(source, compress_type):
+                info, raw_data = self.copier.read_raw(source)
+                zinfo = zipfile.ZipInfo(arcname, date_time=info.date_time)
+                zinfo.compress_type = info.compress_type
+                zinfo.CRC = info.CRC
+                zinfo.compress_size = info.compress_size
+                zinfo.file_size = info.file_size
+                zinfo.external_attr = info.external_attr
+                return zinfo, raw_data
+            zinfo = zipfile.ZipInfo(arcname, date_time=self.copier.getinfo(source).date_time)
+            data = self.copier.read(source)
+        elif isinstance(source, (bytes, str)):
+            zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+            data = source.encode('utf-8') if isinstance(source, str) else source
+        else:
+            zinfo = zipfile.ZipInfo.from_file(source, arcname)
+            with open(source, 'rb') as f:
+                data = f.read()
+        
+        zinfo.file_size = len(data)
+        zinfo.CRC = zlib.crc32(data)
+        raw_data = data
+        zinfo.compress_type = zipfile.ZIP_STORED
+        if compress_type == zipfile.ZIP_DEFLATED:
+            start = time.perf_counter()
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            self.metrics.add_time('compress', time.perf_counter() - start, emit=False)
+            # 压缩后反而变大的数据直接存储
+            if len(compressed) < len(data):
+                raw_data = compressed
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.compress_size = len(raw_data)
+        return zinfo, raw_data
+    
+    def add_json(self, arcname: str, document: Dict, encoder: JSONStreamEncoder) -> int:
+        """将JSON文档流式写入条目，返回未压缩的字节数
+        
+        数据边编码边压缩写入，不会生成完整的文档字符串；写入前会先写完排队中的条目。
+        """
+        self.flush()
+        compress_type, level = self.policy.for_name(arcname)
+        zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        set_zip_compress_level(zinfo, level)
+        with self.metrics.stage('json_stream', entry=arcname):
+            with self.zf.open(zinfo, 'w') as dest:
+                written = encoder.write(document, dest)
+        self.metrics.count('bytes_written', zinfo.compress_size)
+        return written
+    
+    def add_stream(self, arcname: str, chunks: Iterator[bytes]) -> int:
+        """将逐块生成的数据流式写入条目，返回未压缩的字节数；写入前会先写完排队中的条目"""
+        self.flush()
+        compress_type, level = self.policy.for_name(arcname)
+        zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        set_zip_compress_level(zinfo, level)
+        written = 0
+        with self.zf.open(zinfo, 'w') as dest:
+            for chunk in chunks:
+                dest.write(chunk)
+                written += len(chunk)
+        self.metrics.count('bytes_written', zinfo.compress_size)
+        return written
+    
+    def _write_next(self):
+        arcname, future, on_written, on_error = self.pending.popleft()
+        try:
+            zinfo, raw_data = future.result()
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(arcname, e)
+            return
+        start = time.perf_counter()
+        write_raw_zip_entry(self.zf, zinfo, raw_data)
+        self.metrics.add_time('write', time.perf_counter() - start, emit=False)
+        self.metrics.count('bytes_written', len(raw_data))
+        if on_written is not None:
+            on_written(zinfo.filename)
+    
+    def flush(self):
+        """写入所有排队中的条目"""
+        while self.pending:
+            self._write_next()
+    
+    def order_entries(self, names: List[str]):
+        """按 names 排列中央目录中的条目（即读取时 namelist() 的顺序），未列出的条目排在最后
+        
+        已写入的条目数据不会移动或重新写入，只改变目录顺序。
+        """
+        self.flush()
+        rank = {name: i for i, name in enumerate(names)}
+        self.zf.filelist.sort(key=lambda info: rank.get(info.filename, len(rank)))
+    
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.copier.close()
+            self.zf.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LangMerger:
+    """本地化文件 (texts/*.lang) 合并器
+    
+    按语言逐个处理：依次流式读取各皮肤包中该语言的 .lang 文件，把 skinpack.<包名> 和
+    skin.<包名>.<皮肤名> 改写为合并后的包名和（重命名后的）皮肤名，直接写入输出条目。
+    同一时间只保留当前语言已写入的键集合，不会把所有语言的内容读入内存。
+    缺少某种语言的皮肤包使用其 en_US 翻译，仍没有翻译的皮肤以皮肤名作为显示名。
+    """
+    
+    DEFAULT_LOCALE = 'en_US'
+    # 攒够这么多字节再交给压缩流，避免逐行写入
+    CHUNK_SIZE = 64 * 1024
+    
+    @staticmethod
+    def _locale_of(source) -> str:
+        name = source.member_name if isinstance(source, ArchiveMember) else Path(source).name
+        return name.rsplit('/', 1)[-1][:-len('.lang')]
+    
+    @staticmethod
+    def locales(lang_sources: List[Dict]) -> List[str]:
+        """所有皮肤包出现过的语言（总是包含 en_US）"""
+        found = {LangMerger.DEFAULT_LOCALE}
+        for lang_source in lang_sources:
+            found.update(LangMerger._locale_of(source) for source in lang_source['files'])
+        return sorted(found)
+    
+    @staticmethod
+    def _read_lines(source) -> Iterator[str]:
+        if isinstance(source, ArchiveMember):
+            with zipfile.ZipFile(source.archive_path) as zf, zf.open(source.member_name) as raw:
+                yield from io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace')
+        else:
+            with open(source, 'r', encoding='utf-8-sig', errors='replace') as f:
+                yield from f
+    
+    @staticmethod
+    def merge_locale(locale: str, lang_sources: List[Dict], skins_doc: Dict) -> Iterator[bytes]:
+        """生成合并后某种语言的 .lang 内容（分块的 UTF-8 字节）
+        
+        lang_sources 为 MergeState 记录的 [{'pack', 'files', 'skins': {原皮肤名: [合并后皮肤名, ...]}}]，
+        同名皮肤被重命名后每个合并后名称都使用原翻译。只输出 skins_doc 中存在的皮肤
+        （分包时各分包只包含自己的皮肤）。重复的键以先出现的为准。
+        """
+        serialize_name = skins_doc['serialize_name']
+        skin_names = {skin.get('localization_name') for skin in skins_doc['skins']}
+        written = set()
+        buffer = []
+        buffered = 0
+        
+        def emit(key: str, value: str):
+            nonlocal buffered
+            if key in written:
+                return
+            written.add(key)
+            line = f"{key}={value}\n"
+            buffer.append(line)
+            buffered += len(line)
+        
+        emit(f"skinpack.{serialize_name}", skins_doc['localization_name'])
+        for lang_source in lang_sources:
+            files = {LangMerger._locale_of(source): source for source in lang_source['files']}
+            source = files.get(locale) or files.get(LangMerger.DEFAULT_LOCALE)
+            if source is None:
+                continue
+            pack_key = f"skinpack.{lang_source['pack']}"
+            skin_prefix = f"skin.{lang_source['pack']}."
+            for line in LangMerger._read_lines(source):
+                key, sep, value = line.rstrip('\r\n').partition('=')
+                key = key.strip()
+                if not sep or not key or key.startswith('#') or key == pack_key:
+                    continue
+                merged_names = None
+                if key.startswith(skin_prefix):
+                    merged_names = lang_source['skins'].get(key[len(skin_prefix):])
+                if merged_names is None:
+                    emit(key, value)
+                else:
+                    for merged_name in merged_names:
+                        if merged_name in skin_names:
+                            emit(f"skin.{serialize_name}.{merged_name}", value)
+                if buffered >= LangMerger.CHUNK_SIZE:
+                    yield ''.join(buffer).encode('utf-8')
+                    buffer.clear()
+                    buffered = 0
+        
+        for skin in skins_doc['skins']:
+            name = skin.get('localization_name')
+            if name:
+                emit(f"skin.{serialize_name}.{name}", name)
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+    
+    @staticmethod
+    def write(writer: 'ParallelZipWriter', merged_result: Dict) -> List[str]:
+        """把合并后的各语言 .lang 和 languages.json 写入压缩包，返回语言列表"""
+        lang_sources = merged_result.get('texts', [])
+        locales = LangMerger.locales(lang_sources)
+        for locale in locales:
+            writer.add_stream(f"{PackIndexer.LANG_DIR}/{locale}.lang",
+                              LangMerger.merge_locale(locale, lang_sources, merged_result['skins']))
+        writer.add(f"{PackIndexer.LANG_DIR}/languages.json", json.dumps(locales, indent=2))
+        return locales
+
+
+class TextureHasher:
+    """纹理内容哈希计算器
+    
+    并行计算纹理文件的内容哈希，结果按 (路径, 大小, 修改时间) 缓存，
+    文件未变化时不会重复读取。
+    """
+    
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._cache: Dict[Tuple, str] = {}
+    
+    @staticmethod
+    def cache_key(source) -> Tuple:
+        """生成缓存键；压缩包成员使用压缩包本身的大小和修改时间"""
+        if isinstance(source, ArchiveMember):
+            stat = source.archive_path.stat()
+            return (str(source.archive_path), source.member_name, stat.st_size, stat.st_mtime_ns)
+        stat = Path(source).stat()
+        return (str(source), stat.st_size, stat.st_mtime_ns)
+    
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+    
+    def _hash_one(self, source) -> Optional[str]:
+        try:
+            key = self.cache_key(source)
+            digest = self._cache.get(key)
+            if digest is None:
+                data = source.read_bytes()
+                digest = self.hash_bytes(data)
+                self._cache[key] = digest
+            return digest
+        except OSError:
+            return None
+    
+    def hash_files(self, sources: List) -> Dict[Any, Optional[str]]:
+        """计算一组纹理的哈希，无法读取的文件对应 None"""
+        if not sources:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            digests = list(executor.map(self._hash_one, sources))
+        return dict(zip(sources, digests))
+    
+    def clear(self):
+        self._cache.clear()
+
+
+class TextureInspector:
+    """纹理文件头检查器
+    
+    只读取 PNG 的 IHDR 或 JPEG 的 SOF 段获取格式和尺寸，不解码像素。
+    结果按 (路径, 大小, 修改时间) 缓存，多个文件在线程池中并行检查。
+    """
+    
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    # 大多数 JPEG 的 SOF 段在前 64KB 内（EXIF 段最长 64KB）
+    READ_CHUNK = 64 * 1024
+    # SOF0-SOF15，排除 DHT(C4)、JPG(C8)、DAC(CC)
+    JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+    
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._cache: Dict[Tuple, Dict] = {}
+    
+    @staticmethod
+    def parse_header(data: bytes, complete: bool = True) -> Optional[Dict]:
+        """解析文件头，返回 {'format', 'width', 'height'} 或 {'error'}
+        
+        complete=False 表示 data 只是文件开头，数据不足时返回 None 以便继续读取。
+        """
+        if data.startswith(TextureInspector.PNG_SIGNATURE):
+            if len(data) < 33:
+                return None if not complete else {'error': "PNG文件头不完整"}
+            length, chunk_type = struct.unpack('>I4s', data[8:16])
+            if chunk_type != b'IHDR' or length != 13:
+                return {'error': "PNG缺少IHDR"}
+            (crc,) = struct.unpack('>I', data[29:33])
+            if zlib.crc32(data[12:29]) & 0xffffffff != crc:
+                return {'error': "PNG IHDR校验失败"}
+            width, height, bit_depth, color_type = struct.unpack('>IIBB', data[16:26])
+            if width == 0 or height == 0:
+                return {'error': "PNG尺寸为0"}
+            return {'format': 'png', 'width': width, 'height': height,
+                    'bit_depth': bit_depth, 'color_type': color_type}
+        
+        if data.startswith(b'\xff\xd8'):
+            i = 2
+            while i + 4 <= len(data):
+                if data[i] != 0xFF:
+                    return {'error': "JPEG段结构损坏"}
+                marker = data[i + 1]
+                if marker == 0xFF:
+                    i += 1
+                    continue
+                if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                    i += 2
+                    continue
+                if marker in (0xD9, 0xDA):
+                    return {'error': "JPEG缺少SOF段"}
+                (length,) = struct.unpack('>H', data[i + 2:i + 4])
+                if marker in TextureInspector.JPEG_SOF_MARKERS:
+                    if i + 9 > len(data):
+                        break
+                    height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                    if width == 0 or height == 0:
+                        return {'error': "JPEG尺寸为0"}
+                    return {'format': 'jpeg', 'width': width, 'height': height}
+                i += 2 + length
+            return None if not complete else {'error': "JPEG文件头不完整"}
+        
+        # 数据还不够判断格式（PNG签名或JPEG SOI只读到一部分）时继续读取
+        if not complete and (TextureInspector.PNG_SIGNATURE.startswith(data) or b'\xff\xd8'.startswith(data)):
+            return None
+        return {'error': "不是PNG或JPEG文件"}
+    
+    def _inspect_stream(self, fp) -> Dict:
+        data = b''
+        while True:
+            chunk = fp.read(self.READ_CHUNK)
+            data += chunk
+            header = self.parse_header(data, complete=not chunk)
+            if header is not None:
+                return header
+    
+    def inspect(self, source) -> Dict:
+        """检查单个纹理（磁盘路径或 ArchiveMember）"""
+        try:
+            key = TextureHasher.cache_key(source)
+        except OSError as e:
+            return {'error': f"无法读取: {e}"}
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+        
+        try:
+            if isinstance(source, ArchiveMember):
+                with zipfile.ZipFile(source.archive_path) as zf, zf.open(source.member_name) as fp:
+                    result = self._inspect_stream(fp)
+            else:
+                with open(source, 'rb') as fp:
+                    result = self._inspect_stream(fp)
+                    # 磁盘文件顺便检查结尾，能发现大部分截断的PNG
+                    if result.get('format') == 'png':
+                        fp.seek(-12, os.SEEK_END)
+                        if fp.read(12)[4:8] != b'IEND':
+                            result = {'error': "PNG缺少IEND（文件可能被截断）"}
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            result = {'error': f"无法读取: {e}"}
+        self._cache[key] = result
+        return result
+    
+    def inspect_files(self, sources: List) -> Dict[Any, Dict]:
+        """并行检查一组纹理"""
+        if not sources:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.inspect, sources))
+        return dict(zip(sources, results))
+    
+    def validate(self, merged_result: Dict) -> Dict:
+        """检查合并结果中的纹理，返回缺失、未引用、尺寸不符和损坏的纹理列表
+        
+        纹理尺寸应与皮肤所用几何模型的 texture_width/texture_height 成相同的整数倍
+        （高清皮肤可以是模型UV尺寸的整数倍）；引用内置几何模型的皮肤不检查尺寸。
+        """
+        textures = merged_result['textures']
+        headers = self.inspect_files(list(textures.values()))
+        headers_by_name = {name: headers[source] for name, source in textures.items()}
+        
+        uv_sizes = {}
+        for geometry in merged_result['geometry']['minecraft:geometry']:
+            description = geometry.get('description', {})
+            uv_sizes[description.get('identifier', '').split(':', 1)[0]] = (
+                description.get('texture_width'), description.get('texture_height'))
+        
+        report = {'checked': len(textures), 'missing': [], 'orphaned': [], 'mis_sized': [], 'corrupt': []}
+        referenced = set()
+        mis_sized_seen = set()
+        for skin in merged_result['skins']['skins']:
+            texture_name = skin.get('texture')
+            if not texture_name:
+                continue
+            referenced.add(texture_name)
+            header = headers_by_name.get(texture_name)
+            if header is None:
+                report['missing'].append({'skin': skin.get('localization_name'), 'texture': texture_name})
+                continue
+            if 'error' in header:
+                continue
+            
+            expected = uv_sizes.get(skin.get('geometry'))
+            if not expected or not all(isinstance(value, int) and value > 0 for value in expected):
+                continue
+            width, height = header['width'], header['height']
+            scale_x, rem_x = divmod(width, expected[0])
+            scale_y, rem_y = divmod(height, expected[1])
+            if (rem_x or rem_y or scale_x != scale_y or scale_x == 0) and \
+                    (texture_name, skin.get('geometry')) not in mis_sized_seen:
+                mis_sized_seen.add((texture_name, skin.get('geometry')))
+                report['mis_sized'].append({'texture': texture_name, 'size': [width, height],
+                                            'geometry': skin.get('geometry'), 'expected': list(expected)})
+        
+        for name, header in headers_by_name.items():
+            if 'error' in header:
+                report['corrupt'].append({'texture': name, 'error': header['error']})
+            if name not in referenced:
+                report['orphaned'].append(name)
+        return report
+    
+    @staticmethod
+    def print_report(report: Dict, limit: int = 10):
+        """输出检查结果，每类最多列出 limit 条"""
+        problems = sum(len(report[key]) for key in ('missing', 'orphaned', 'mis_sized', 'corrupt'))
+        if not problems:
+            print(f"✅ 纹理检查通过 ({report['checked']} 个)")
+            return
+        print(f"⚠️  纹理检查 ({report['checked']} 个): 缺失 {len(report['missing'])} | "
+              f"未引用 {len(report['orphaned'])} | 尺寸不符 {len(report['mis_sized'])} | "
+              f"损坏 {len(report['corrupt'])}")
+        for item in report['missing'][:limit]:
+            print(f"   ❓ 缺失: {item['texture']} (皮肤 {item['skin']})")
+        for item in report['corrupt'][:limit]:
+            print(f"   💥 损坏: {item['texture']} - {item['error']}")
+        for item in report['mis_sized'][:limit]:
+            print(f"   📐 尺寸不符: {item['texture']} {item['size'][0]}x{item['size'][1]}，"
+                  f"{item['geometry']} 需要 {item['expected'][0]}x{item['expected'][1]} 的整数倍")
+        for name in report['orphaned'][:limit]:
+            print(f"   🗑️  未引用: {name}")
+    
+    def clear(self):
+        self._cache.clear()
+
+
+class PNGOptimizer:
+    """无损PNG重新压缩（仅使用标准库）
+    
+    解码像素后尝试更小的颜色类型（RGBA -> RGB / 灰度 / 调色板）、多种行过滤方式和
+    zlib 策略，只保留 IHDR/PLTE/tRNS/IDAT/IEND，结果比原文件小时才采用。
+    gAMA、iCCP 等颜色管理块会被去掉，游戏内显示不受影响。
+    仅处理 8 位、非隔行扫描的PNG，其他文件保持原样。
+    结果按内容哈希缓存在磁盘上，相同的纹理下次合并时不再重新压缩。
+    磁盘缓存超过 max_bytes 时按最近使用时间（文件修改时间）淘汰，内存中的结果也有总大小上限。
+    """
+    
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+    DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+    MEMORY_MAX_BYTES = 32 * 1024 * 1024
+    # 每个缓存条目至少按这么多字节计算，避免大量空的 .skip 文件不受限制
+    ENTRY_OVERHEAD = 512
+    
+    def __init__(self, cache_dir: Optional[Path] = None, workers: Optional[int] = None,
+                 persistent: bool = True, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else PackCache.default_cache_dir() / PackCache.PNG_DIR
+        self.workers = workers or os.cpu_count() or 1
+        # persistent=False 时只在内存中缓存
+        self.persistent = persistent
+        self.max_bytes = max_bytes
+        self._cache: OrderedDict = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def read_chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+        """拆分PNG数据块，结构损坏时抛出 ValueError"""
+        if not data.startswith(PNGOptimizer.PNG_SIGNATURE):
+            raise ValueError("不是PNG文件")
+        chunks = []
+        pos = len(PNGOptimizer.PNG_SIGNATURE)
+        while pos + 12 <= len(data):
+            length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+            body = data[pos + 8:pos + 8 + length]
+            if len(body) != length:
+                raise ValueError("PNG数据块被截断")
+            chunks.append((chunk_type, body))
+            pos += 12 + length
+            if chunk_type == b'IEND':
+                return chunks
+        raise ValueError("PNG缺少IEND")
+    
+    @staticmethod
+    def _chunk(chunk_type: bytes, body: bytes) -> bytes:
+        return (struct.pack('>I', len(body)) + chunk_type + body
+                + struct.pack('>I', zlib.crc32(chunk_type + body) & 0xffffffff))
+    
+    @staticmethod
+    def unfilter(raw: bytes, height: int, stride: int, bpp: int) -> List[bytearray]:
+        """还原按行过滤的数据"""
+        rows = []
+        prev = bytearray(stride)
+        pos = 0
+        for _ in range(height):
+            filter_type = raw[pos]
+            line = bytearray(raw[pos + 1:pos + 1 + stride])
+            pos += stride + 1
+            if filter_type == 1:
+                for i in range(bpp, stride):
+                    line[i] = (line[i] + line[i - bpp]) & 0xFF
+            elif filter_type == 2:
+                line = bytearray((a + b) & 0xFF for a, b in zip(line, prev))
+            elif filter_type == 3:
+                for i in range(stride):
+                    left = line[i - bpp] if i >= bpp else 0
+                    line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+            elif filter_type == 4:
+                for i in range(stride):
+                    a = line[i - bpp] if i >= bpp else 0
+                    b = prev[i]
+                    c = prev[i - bpp] if i >= bpp else 0
+                    p = a + b - c
+                    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                    line[i] = (line[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+            elif filter_type != 0:
+                raise ValueError(f"未知的PNG过滤类型: {filter_type}")
+            rows.append(line)
+            prev = line
+        return rows
+    
+    @staticmethod
+    def filter_row(filter_type: int, line: bytes, prev: bytes, bpp: int) -> bytes:
+        if filter_type == 0:
+            return bytes(line)
+        if filter_type == 1:
+            return bytes(line[:bpp]) + bytes((line[i] - line[i - bpp]) & 0xFF for i in range(bpp, len(line)))
+        if filter_type == 2:
+            return bytes((a - b) & 0xFF for a, b in zip(line, prev))
+        out = bytearray(len(line))
+        for i in range(len(line)):
+            a = line[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            if filter_type == 3:
+                out[i] = (line[i] - ((a + b) >> 1)) & 0xFF
+            else:
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                out[i] = (line[i] - (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+        return bytes(out)
+    
+    @staticmethod
+    def filter_variants(rows: List[bytes], bpp: int) -> List[bytes]:
+        """生成不同过滤方式的数据流：全部不过滤、Sub、Up、Paeth 以及逐行自适应"""
+        stride = len(rows[0]) if rows else 0
+        per_type = {filter_type: [] for filter_type in (0, 1, 2, 3, 4)}
+        prev = bytes(stride)
+        for line in rows:
+            for filter_type in per_type:
+                per_type[filter_type].append(PNGOptimizer.filter_row(filter_type, line, prev, bpp))
+            prev = line
+        
+        def cost(filtered: bytes) -> int:
+            # 常用的启发式：把字节当作有符号数求绝对值之和
+            return sum(value if value < 128 else 256 - value for value in filtered)
+        
+        variants = [b''.join(bytes([filter_type]) + filtered for filtered in per_type[filter_type])
+                    for filter_type in (0, 1, 2, 4)]
+        adaptive = []
+        for y in range(len(rows)):
+            filter_type = min(per_type, key=lambda t: cost(per_type[t][y]))
+            adaptive.append(bytes([filter_type]) + per_type[filter_type][y])
+        variants.append(b''.join(adaptive))
+        return variants
+    
+    @staticmethod
+    def decode_rgba(data: bytes) -> Optional[Tuple[int, int, List[bytes]]]:
+        """解码为 RGBA 行数据，不支持的格式返回 None"""
+        chunks = PNGOptimizer.read_chunks(data)
+        if chunks[0][0] != b'IHDR':
+            raise ValueError("PNG缺少IHDR")
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunks[0][1])
+        if bit_depth != 8 or interlace != 0 or color_type not in PNGOptimizer.CHANNELS:
+            return None
+        palette = b''.join(body for chunk_type, body in chunks if chunk_type == b'PLTE')
+        trns = b''.join(body for chunk_type, body in chunks if chunk_type == b'tRNS')
+        if trns and color_type in (0, 2):
+            # 颜色键透明较少见，保持原样
+            return None
+        
+        bpp = PNGOptimizer.CHANNELS[color_type]
+        raw = zlib.decompress(b''.join(body for chunk_type, body in chunks if chunk_type == b'IDAT'))
+        if len(raw) < height * (width * bpp + 1):
+            raise ValueError("PNG像素数据不完整")
+        rows = PNGOptimizer.unfilter(raw, height, width * bpp, bpp)
+        
+        rgba_rows = []
+        if color_type == 3:
+            alphas = trns + b'\xff' * 256
+            lut = [palette[i * 3:i * 3 + 3] + alphas[i:i + 1] for i in range(len(palette) // 3)]
+            for line in rows:
+                rgba_rows.append(b''.join(lut[index] for index in line))
+            return width, height, rgba_rows
+        
+        for line in rows:
+            if color_type == 6:
+                rgba_rows.append(bytes(line))
+                continue
+            out = bytearray(b'\xff' * (width * 4))
+            if color_type == 2:
+                out[0::4], out[1::4], out[2::4] = line[0::3], line[1::3], line[2::3]
+            elif color_type == 0:
+                out[0::4] = out[1::4] = out[2::4] = line
+            else:
+                out[0::4] = out[1::4] = out[2::4] = line[0::2]
+                out[3::4] = line[1::2]
+            rgba_rows.append(bytes(out))
+        return width, height, rgba_rows
+    
+    @staticmethod
+    def _candidates(rgba_rows: List[bytes]) -> List[Tuple[int, List[bytes], int, bytes, bytes]]:
+        """按像素内容生成可无损表示的颜色类型：(颜色类型, 行数据, 每像素字节数, PLTE, tRNS)"""
+        pixels = b''.join(rgba_rows)
+        opaque = pixels[3::4] == b'\xff' * (len(pixels) // 4)
+        gray = pixels[0::4] == pixels[1::4] == pixels[2::4]
+        
+        candidates = []
+        colors = set(pixels[i:i + 4] for i in range(0, len(pixels), 4))
+        if len(colors) <= 256:
+            # 半透明颜色排在前面，tRNS 可以尽量短
+            palette_colors = sorted(colors, key=lambda color: (color[3] == 255, color))
+            index = {color: i for i, color in enumerate(palette_colors)}
+            rows = [bytes(index[line[i:i + 4]] for i in range(0, len(line), 4)) for line in rgba_rows]
+            plte = b''.join(color[:3] for color in palette_colors)
+            trns = bytes(color[3] for color in palette_colors if color[3] != 255)
+            candidates.append((3, rows, 1, plte, trns))
+        
+        if gray and opaque:
+            candidates.append((0, [line[0::4] for line in rgba_rows], 1, b'', b''))
+        elif gray:
+            rows = []
+            for line in rgba_rows:
+                out = bytearray(len(line) // 2)
+                out[0::2], out[1::2] = line[0::4], line[3::4]
+                rows.append(bytes(out))
+            candidates.append((4, rows, 2, b'', b''))
+        elif opaque:
+            rows = []
+            for line in rgba_rows:
+                out = bytearray(len(line) // 4 * 3)
+                out[0::3], out[1::3], out[2::3] = line[0::4], line[1::4], line[2::4]
+                rows.append(bytes(out))
+            candidates.append((2, rows, 3, b'', b''))
+        else:
+            candidates.append((6, rgba_rows, 4, b'', b''))
+        return candidates
+    
+    @staticmethod
+    def optimize(data: bytes) -> Optional[bytes]:
+        """返回更小的等价PNG；无法处理或没有变小时返回 None"""
+        try:
+            decoded = PNGOptimizer.decode_rgba(data)
+        except (ValueError, zlib.error, struct.error, IndexError):
+            return None
+        if decoded is None:
+            return None
+        width, height, rgba_rows = decoded
+        
+        best = None
+        for color_type, rows, bpp, plte, trns in PNGOptimizer._candidates(rgba_rows):
+            for stream in PNGOptimizer.filter_variants(rows, bpp):
+                for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED):
+                    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+                    idat = compressor.compress(stream) + compressor.flush()
+                    if best is None or len(idat) < len(best[0]):
+                        best = (idat, color_type, plte, trns)
+        
+        idat, color_type, plte, trns = best
+        output = [PNGOptimizer.PNG_SIGNATURE,
+                  PNGOptimizer._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))]
+        if plte:
+            output.append(PNGOptimizer._chunk(b'PLTE', plte))
+        if trns:
+            output.append(PNGOptimizer._chunk(b'tRNS', trns))
+        output.append(PNGOptimizer._chunk(b'IDAT', idat))
+        output.append(PNGOptimizer._chunk(b'IEND', b''))
+        optimized = b''.join(output)
+        if len(optimized) >= len(data):
+            return None
+        # 再解码一次确认像素完全一致
+        if PNGOptimizer.decode_rgba(optimized) != decoded:
+            return None
+        return optimized
+    
+    def _cache_path(self, digest: str, suffix: str) -> Path:
+        return self.cache_dir / digest[:2] / f"{digest}{suffix}"
+    
+    def _remember(self, digest: str, optimized: Optional[bytes]):
+        """放入内存缓存，超过 MEMORY_MAX_BYTES 时淘汰最久未使用的结果"""
+        with self._lock:
+            if digest in self._cache:
+                self._memory_bytes -= len(self._cache.pop(digest) or b'') + self.ENTRY_OVERHEAD
+            self._cache[digest] = optimized
+            self._memory_bytes += len(optimized or b'') + self.ENTRY_OVERHEAD
+            while self._memory_bytes > self.MEMORY_MAX_BYTES and len(self._cache) > 1:
+                _, dropped = self._cache.popitem(last=False)
+                self._memory_bytes -= len(dropped or b'') + self.ENTRY_OVERHEAD
+    
+    def _lookup(self, digest: str) -> Tuple[bool, Optional[bytes]]:
+        """返回 (是否命中, 优化结果)；命中但无需优化时结果为 None"""
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return True, self._cache[digest]
+        if not self.persistent:
+            return False, None
+        for suffix in ('.png', '.skip'):
+            path = self._cache_path(digest, suffix)
+            try:
+                optimized = path.read_bytes() if suffix == '.png' else None
+                # 更新修改时间，作为磁盘缓存的最近使用时间
+                os.utime(path)
+            except OSError:
+                continue
+            self._remember(digest, optimized)
+            return True, optimized
+        return False, None
+    
+    def _store(self, digest: str, optimized: Optional[bytes]):
+        self._remember(digest, optimized)
+        if not self.persistent:
+            return
+        path = self._cache_path(digest, '.png' if optimized is not None else '.skip')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + '.tmp')
+            tmp_path.write_bytes(optimized or b'')
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    
+    def optimize_sources(self, sources: List, metrics: Optional[Metrics] = None) -> Dict[Any, bytes]:
+        """优化一组PNG纹理，返回 {来源: 优化后的数据}，未变小的纹理不包含在结果中"""
+        metrics = metrics or Metrics('quiet')
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            contents = list(executor.map(self._read_source, sources))
+        
+        results = {}
+        pending = {}
+        for source, data in zip(sources, contents):
+            if data is None:
+                continue
+            digest = TextureHasher.hash_bytes(data)
+            hit, optimized = self._lookup(digest)
+            if hit:
+                metrics.count('png_cache_hits')
+                if optimized is not None:
+                    results[source] = optimized
+            else:
+                pending.setdefault(digest, (data, []))[1].append(source)
+        
+        if pending:
+            digests = list(pending)
+            executor_class = ProcessPoolExecutor if self.workers > 1 and len(digests) > 1 else ThreadPoolExecutor
+            with executor_class(max_workers=self.workers) as executor:
+                optimized_list = list(executor.map(PNGOptimizer.optimize,
+                                                   [pending[digest][0] for digest in digests], chunksize=8))
+            for digest, optimized in zip(digests, optimized_list):
+                self._store(digest, optimized)
+                if optimized is not None:
+                    for source in pending[digest][1]:
+                        results[source] = optimized
+            if self.persistent:
+                self.prune()
+        
+        saved = 0
+        for source, data in zip(sources, contents):
+            if source in results:
+                saved += len(data) - len(results[source])
+        metrics.count('png_optimized', len(results))
+        metrics.count('png_bytes_saved', saved)
+        return results
+    
+    @staticmethod
+    def _read_source(source) -> Optional[bytes]:
+        try:
+            return source.read_bytes()
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+    
+    @staticmethod
+    def disk_entries(cache_dir: Path) -> List[Tuple[Path, int, float]]:
+        """列出磁盘缓存中的 (路径, 大小, 修改时间)，目录不存在时返回空列表"""
+        entries = []
+        try:
+            subdirs = list(os.scandir(cache_dir))
+        except OSError:
+            return entries
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            with os.scandir(subdir.path) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(('.png', '.skip')):
+                        stat = entry.stat()
+                        entries.append((Path(entry.path), stat.st_size, stat.st_mtime))
+        return entries
+    
+    def prune(self) -> int:
+        """磁盘缓存超过 max_bytes 时按修改时间从旧到新删除，返回删除的条目数量"""
+        entries = self.disk_entries(self.cache_dir)
+        total = sum(max(size, self.ENTRY_OVERHEAD) for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in sorted(entries, key=lambda item: item[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= max(size, self.ENTRY_OVERHEAD)
+            removed += 1
+        return removed
+
+
+class PackIndexer:
+    """基于 os.scandir 的皮肤包索引器
+    
+    每个目录只扫描一次，按文件名直接分类；同一次扫描中顺带计算缓存指纹。
+    """
+    
+    TEXTURE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+    # 本地化文件所在的子目录
+    LANG_DIR = 'texts'
+    
+    @staticmethod
+    def scan_lang_files(texts_dir) -> List[Tuple[Path, os.stat_result]]:
+        """扫描 texts 目录中的 .lang 文件，按文件名排序"""
+        found = []
+        with os.scandir(texts_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.lower().endswith('.lang'):
+                    found.append((Path(entry.path), entry.stat()))
+        return sorted(found)
+    
+    @staticmethod
+    def classify(name: str) -> Optional[str]:
+        """按文件名分类：skins / geometry / texture / other，无关文件返回 None"""
+        if name == 'skins.json':
+            return 'skins'
+        suffix = os.path.splitext(name)[1]
+        if suffix.lower() in PackIndexer.TEXTURE_EXTENSIONS:
+            return 'texture'
+        if suffix == '.json':
+            lower_name = name.lower()
+            if lower_name != 'skins.json' and ('geometry' in lower_name or 'model' in lower_name):
+                return 'geometry'
+            return 'other'
+        return None
+    
+    @staticmethod
+    def fingerprint_entry(name: str, path, stat: os.stat_result, content: bool = True) -> str:
+        """生成单个文件的指纹条目
+        
+        skins.json 和几何模型文件额外加入内容哈希：大小相同且修改时间被还原的改动也能发现。
+        纹理等其他文件只比较大小和修改时间，避免每次都读取全部纹理。content=False 时不读取文件内容。
+        """
+        entry = f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        if content and PackIndexer.classify(os.path.basename(name)) in ('skins', 'geometry'):
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            entry += f"\0{digest.hexdigest()}"
+        return entry
+    
+    @staticmethod
+    def index_folder(folder_path: Path, fingerprint: Optional[str] = None) -> Dict:
+        """扫描皮肤包文件夹，返回分类后的文件列表、文件大小和指纹
+        
+        调用方已计算过指纹时传入 fingerprint，不再读取文件内容重复计算。
+        """
+        folder_path = Path(folder_path)
+        index = {
+            'skins_json': None,
+            'geometry_files': [],
+            'texture_files': [],
+            'other_files': [],
+            'lang_files': [],
+            'sizes': {},
+        }
+        fingerprint_entries = []
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                if entry.is_dir() and entry.name.lower() == PackIndexer.LANG_DIR:
+                    for lang_path, stat in PackIndexer.scan_lang_files(entry.path):
+                        fingerprint_entries.append(
+                            f"{PackIndexer.LANG_DIR}/{lang_path.name}\0{stat.st_size}\0{stat.st_mtime_ns}")
+                        index['lang_files'].append(lang_path)
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if fingerprint is None:
+                    fingerprint_entries.append(PackIndexer.fingerprint_entry(entry.name, entry.path, stat))
+                index['sizes'][entry.name] = stat.st_size
+                
+                kind = PackIndexer.classify(entry.name)
+                if kind == 'skins':
+                    index['skins_json'] = folder_path / entry.name
+                elif kind is not None:
+                    index[f"{kind}_files"].append(folder_path / entry.name)
+        index['fingerprint'] = fingerprint or PackCache.digest_entries(fingerprint_entries)
+        return index
+    
+    @staticmethod
+    def archive_has_skins(archive_path: Path) -> bool:
+        """压缩包中是否包含 skins.json（只读取中央目录）"""
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                return any(name == 'skins.json' or name.endswith('/skins.json') for name in zf.namelist())
+        except (OSError, zipfile.BadZipFile):
+            return False
+    
+    @staticmethod
+    def discover(root: Path, include_archives: bool = True) -> List[Path]:
+        """递归查找 root 下所有包含 skins.json 的皮肤包文件夹和 .mcpack/.zip 压缩包
+        
+        每个目录只扫描一次，找到皮肤包后不再进入其子目录；隐藏目录和符号链接目录会被跳过。
+        结果按路径排序。
+        """
+        packs = []
+        stack = [str(root)]
+        while stack:
+            directory = stack.pop()
+            subdirs = []
+            archives = []
+            is_pack = False
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                subdirs.append(entry.path)
+                        elif entry.name == 'skins.json':
+                            is_pack = True
+                        elif include_archives and os.path.splitext(entry.name)[1].lower() in ARCHIVE_EXTENSIONS:
+                            archives.append(entry.path)
+            except OSError:
+                continue
+            
+            if is_pack:
+                packs.append(Path(directory))
+                continue
+            packs.extend(Path(archive) for archive in archives if PackIndexer.archive_has_skins(archive))
+            stack.extend(subdirs)
+        return sorted(packs)
+    
+    @staticmethod
+    def expand_sources(sources: List[Path]) -> List[Path]:
+        """不含 skins.json 的目录展开为其下的所有皮肤包，其他来源保持不变"""
+        expanded = []
+        for source in sources:
+            source = Path(source)
+            if source.is_dir() and not (source / 'skins.json').exists():
+                discovered = PackIndexer.discover(source)
+                if discovered:
+                    expanded.extend(discovered)
+                    continue
+            expanded.append(source)
+        return expanded
+
+
+class PackCache:
+    """持久化的皮肤包解析缓存
+    
+    以皮肤包路径为键，按文件名、大小、修改时间（skins.json 和几何模型文件另加内容哈希）生成指纹校验是否过期；
+    缓存内容为解析后的皮肤数据、转换后的几何模型（含结构哈希）和纹理哈希。
+    总大小超过上限时按最近使用时间（LRU）淘汰。
+    """
+    
+    VERSION = 2
+    INDEX_FILE = 'index.json'
+    # PNGOptimizer 的磁盘缓存子目录，自行限制大小，统计和清空时一并处理
+    PNG_DIR = 'png'
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+    
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else self.default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+    
+    @staticmethod
+    def default_cache_dir() -> Path:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(Path.home(), '.cache')
+        return Path(base) / 'skinpack-merger'
+    
+    @property
+    def png_dir(self) -> Path:
+        return self.cache_dir / self.PNG_DIR
+    
+    @staticmethod
+    def fingerprint(pack_path: Path, content: bool = True) -> str:
+        """根据皮肤包内文件的名称、大小和修改时间生成指纹
+        
+        skins.json 和几何模型文件另加内容哈希（压缩包使用中央目录中的 CRC32，无需解压）。
+        content=False 时只用 os.scandir 得到的大小和修改时间，不读取任何文件内容，
+        得到的是用于轮询的廉价签名，不能与缓存指纹比较。
+        """
+        pack_path = Path(pack_path)
+        if pack_path.is_dir():
+            entries = []
+            with os.scandir(pack_path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        entries.append(PackIndexer.fingerprint_entry(entry.name, entry.path, entry.stat(), content))
+                    elif entry.is_dir() and entry.name.lower() == PackIndexer.LANG_DIR:
+                        # 与 PackIndexer.index_folder 计算的指纹一致
+                        for lang_path, stat in PackIndexer.scan_lang_files(entry.path):
+                            entries.append(f"{PackIndexer.LANG_DIR}/{lang_path.name}"
+                                           f"\0{stat.st_size}\0{stat.st_mtime_ns}")
+        else:
+            stat = pack_path.stat()
+            entries = [f"{pack_path.name}\0{stat.st_size}\0{stat.st_mtime_ns}"]
+            if not content:
+                return PackCache.digest_entries(entries)
+            try:
+                with zipfile.ZipFile(pack_path) as zf:
+                    for info in zf.infolist():
+                        if PackIndexer.classify(info.filename.rsplit('/', 1)[-1]) in ('skins', 'geometry'):
+                            entries.append(f"{info.filename}\0{info.CRC:08x}")
+            except zipfile.BadZipFile:
+                pass
+        return PackCache.digest_entries(entries)
+    
+    @staticmethod
+    def digest_entries(entries: List[str]) -> str:
+        """由 "名称\0大小\0修改时间[\0内容哈希]" 条目生成指纹，与条目顺序无关"""
+        return hashlib.sha256('\n'.join(sorted(entries)).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def key_for(pack_path: Path) -> str:
+        return hashlib.sha256(str(Path(pack_path).resolve()).encode('utf-8')).hexdigest()[:32]
+    
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pickle"
+    
+    def _load_index(self) -> Dict:
+        if self._index is None:
+            index_path = self.cache_dir / self.INDEX_FILE
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('version') != self.VERSION:
+                    raise ValueError("缓存版本不匹配")
+            except (OSError, ValueError):
+                index = {'version': self.VERSION, 'entries': {}}
+            self._index = index
+        return self._index
+    
+    def _save_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        index_path = self.cache_dir / self.INDEX_FILE
+        tmp_path = index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    
+    def get(self, pack_path: Path, fingerprint: Optional[str] = None) -> Optional[SkinPackInfo]:
+        """读取缓存的皮肤包；指纹不一致或缓存损坏时返回 None"""
+        key = self.key_for(pack_path)
+        with self._lock:
+            meta = self._load_index()['entries'].get(key)
+            if meta is None:
+                return None
+            fingerprint = fingerprint or self.fingerprint(pack_path)
+            if meta['fingerprint'] != fingerprint:
+                return None
+            try:
+                with open(self._entry_path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except Exception:
+                self._remove_entry(key)
+                self._save_index()
+                return None
+            meta['last_used'] = time.time()
+            self._evict()
+            self._save_index()
+        
+        pack_info = SkinPackInfo(
+            entry['folder_name'],
+            entry['skin_data'],
+            entry['geometry_data'],
+            entry['texture_files'],
+            entry['other_files'],
+            source_path=Path(pack_path),
+            fingerprint=fingerprint,
+            lang_files=entry.get('lang_files')
+        )
+        pack_info.texture_hashes = entry['texture_hashes']
+        geometries = [geometry for geo_file in entry['geometry_data']
+                      for geometry in geo_file['data'].get('minecraft:geometry', [])]
+        pack_info.geometry_entries = list(zip(geometries, entry['geometry_hashes']))
+        pack_info.geometry_index = entry.get('geometry_index') or [
+            (geometry['description']['identifier'], *GeometryConverter.structural_digest(geometry))
+            for geometry in geometries]
+        return pack_info
+    
+    def put(self, pack_info: SkinPackInfo):
+        """写入（或更新）皮肤包缓存，并按LRU淘汰超出上限的条目
+        
+        完整数据已释放的皮肤包只更新纹理哈希。
+        """
+        if pack_info.source_path is None or pack_info.fingerprint is None:
+            return
+        if not pack_info.loaded:
+            self._update_texture_hashes(pack_info)
+            return
+        
+        # 几何模型以转换后的新格式保存，读取缓存时无需再次转换
+        geometry_data = []
+        for geo_file in pack_info.geometry_data:
+            converted = GeometryConverter.convert_to_new_format(geo_file['data'])
+            if converted and 'minecraft:geometry' in converted:
+                geometry_data.append({'file_name': geo_file['file_name'], 'data': converted})
+            else:
+                geometry_data.append({'file_name': geo_file['file_name'], 'data': {}})
+        entry = {
+            'folder_name': pack_info.folder_name,
+            'skin_data': pack_info.skin_data,
+            'geometry_data': geometry_data,
+            'geometry_hashes': [digest for _, digest in pack_info.converted_geometries()],
+            'geometry_index': pack_info.geometry_index,
+            'texture_files': pack_info.texture_files,
+            'other_files': pack_info.other_files,
+            'lang_files': pack_info.lang_files,
+            'texture_hashes': pack_info.texture_hashes,
+        }
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        key = self.key_for(pack_info.source_path)
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            entry_path = self._entry_path(key)
+            tmp_path = entry_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, entry_path)
+            
+            index = self._load_index()
+            index['entries'][key] = {
+                'source_path': str(pack_info.source_path),
+                'fingerprint': pack_info.fingerprint,
+                'size': len(payload),
+                'last_used': time.time()
+            }
+            self._evict()
+            self._save_index()
+    
+    def _update_texture_hashes(self, pack_info: SkinPackInfo):
+        """完整数据已释放的皮肤包只更新已有缓存条目中的纹理哈希"""
+        key = self.key_for(pack_info.source_path)
+        with self._lock:
+            meta = self._load_index()['entries'].get(key)
+            if meta is None or meta['fingerprint'] != pack_info.fingerprint:
+                return
+            try:
+                with open(self._entry_path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except Exception:
+                return
+            entry['texture_hashes'] = pack_info.texture_hashes
+            payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+            entry_path = self._entry_path(key)
+            tmp_path = entry_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, entry_path)
+            meta['size'] = len(payload)
+            self._save_index()
+    
+    def _remove_entry(self, key: str):
+        self._load_index()['entries'].pop(key, None)
+        try:
+            self._entry_path(key).unlink()
+        except FileNotFoundError:
+            pass
+    
+    def _evict(self):
+        entries = self._load_index()['entries']
+        total = sum(meta['size'] for meta in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]['size']
+            self._remove_entry(key)
+    
+    def stats(self) -> Dict:
+        """返回缓存统计信息"""
+        png_entries = PNGOptimizer.disk_entries(self.png_dir)
+        with self._lock:
+            entries = self._load_index()['entries']
+            return {
+                'cache_dir': str(self.cache_dir),
+                'entry_count': len(entries),
+                'total_bytes': sum(meta['size'] for meta in entries.values()),
+                'max_bytes': self.max_bytes,
+                'png_count': len(png_entries),
+                'png_bytes': sum(size for _, size, _ in png_entries),
+                'entries': sorted(
+                    ({'source_path': meta['source_path'], 'size': meta['size'],
+                      'last_used': meta['last_used']} for meta in entries.values()),
+                    key=lambda item: item['last_used'], reverse=True)
+            }
+    
+    def clear(self) -> int:
+        """清空缓存（包括PNG优化结果），返回删除的条目数量"""
+        with self._lock:
+            entries = self._load_index()['entries']
+            count = len(entries)
+            for key in list(entries):
+                self._remove_entry(key)
+            if self.cache_dir.exists():
+                self._save_index()
+        png_entries = PNGOptimizer.disk_entries(self.png_dir)
+        shutil.rmtree(self.png_dir, ignore_errors=True)
+        return count + len(png_entries)
+
+
+class ShardPlanner:
+    """将合并结果拆分为多个分包
+    
+    限制条件为每个分包的最大皮肤数、最大字节数（未压缩的纹理和JSON估算）和最大几何模型数。
+    每个分包都包含其皮肤引用的几何模型（含继承的父模型）和纹理，多个分包共用的会各自复制一份。
+    分配结果按皮肤名称记录，再次运行时已有皮肤优先留在原分包中，新皮肤填入有空余的分包。
+    """
+    
+    def __init__(self, max_skins: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_geometries: Optional[int] = None):
+        if not (max_skins or max_bytes or max_geometries):
+            raise ValueError("至少需要指定一个分包限制")
+        self.max_skins = max_skins
+        self.max_bytes = max_bytes
+        self.max_geometries = max_geometries
+    
+    def limits(self) -> Dict:
+        return {'max_skins': self.max_skins, 'max_bytes': self.max_bytes, 'max_geometries': self.max_geometries}
+    
+    @staticmethod
+    def _json_size(value) -> int:
+        return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    
+    @staticmethod
+    def skin_requirements(merged_result: Dict) -> List[Tuple[Set[str], Set[str]]]:
+        """返回每个皮肤需要的 (几何模型ID集合, 纹理文件名集合)"""
+        geometries_by_id = {}
+        for geometry in merged_result['geometry']['minecraft:geometry']:
+            identifier = geometry['description']['identifier']
+            geometries_by_id[identifier.split(':', 1)[0]] = identifier
+        
+        def geometry_chain(geometry_id: str) -> Set[str]:
+            chain = set()
+            while geometry_id in geometries_by_id and geometry_id not in chain:
+                chain.add(geometry_id)
+                geometry_id = geometries_by_id[geometry_id].partition(':')[2]
+            return chain
+        
+        requirements = []
+        for skin in merged_result['skins']['skins']:
+            geometry_ids = geometry_chain(skin.get('geometry'))
+            texture = skin.get('texture')
+            textures = {texture} if texture in merged_result['textures'] else set()
+            requirements.append((geometry_ids, textures))
+        return requirements
+    
+    def plan(self, merged_result: Dict, previous: Optional[Dict[str, int]] = None) -> List[List[int]]:
+        """计算分包方案，返回每个分包的皮肤下标列表
+        
+        previous 为上次的 {皮肤名称: 分包序号}。先按原分包放置已有皮肤，放不下的和新皮肤
+        再按顺序放入第一个放得下的分包，都放不下时新建分包。单个皮肤超过限制时独占一个分包。
+        没有皮肤的分包保留为空列表，其余分包的序号因此保持不变。
+        """
+        previous = previous or {}
+        skins = merged_result['skins']['skins']
+        requirements = self.skin_requirements(merged_result)
+        
+        geometry_sizes = {}
+        if self.max_bytes:
+            for geometry in merged_result['geometry']['minecraft:geometry']:
+                geometry_sizes[geometry['description']['identifier'].split(':', 1)[0]] = self._json_size(geometry)
+        texture_sizes = {}
+        if self.max_bytes:
+            with ArchiveMemberCopier() as copier:
+                for name, source in merged_result['textures'].items():
+                    try:
+                        if isinstance(source, ArchiveMember):
+                            texture_sizes[name] = copier.getinfo(source).file_size
+                        else:
+                            texture_sizes[name] = Path(source).stat().st_size
+                    except (OSError, KeyError):
+                        texture_sizes[name] = 0
+        
+        shards = []
+        
+        def new_shard() -> Dict:
+            shard = {'skins': [], 'geometries': set(), 'textures': set(), 'bytes': 0}
+            shards.append(shard)
+            return shard
+        
+        def added_cost(shard: Dict, i: int) -> Tuple[Set[str], Set[str], int]:
+            geometry_ids, textures = requirements[i]
+            new_geometries = geometry_ids - shard['geometries']
+            new_textures = textures - shard['textures']
+            size = 0
+            if self.max_bytes:
+                size = (self._json_size(skins[i]) + sum(geometry_sizes[g] for g in new_geometries)
+                        + sum(texture_sizes[t] for t in new_textures))
+            return new_geometries, new_textures, size
+        
+        def try_place(shard: Dict, i: int) -> bool:
+            new_geometries, new_textures, size = added_cost(shard, i)
+            if shard['skins']:
+                if self.max_skins and len(shard['skins']) + 1 > self.max_skins:
+                    return False
+                if self.max_geometries and len(shard['geometries']) + len(new_geometries) > self.max_geometries:
+                    return False
+                if self.max_bytes and shard['bytes'] + size > self.max_bytes:
+                    return False
+            shard['skins'].append(i)
+            shard['geometries'] |= new_geometries
+            shard['textures'] |= new_textures
+            shard['bytes'] += size
+            return True
+        
+        # 第一轮：已有皮肤放回原分包
+        remaining = []
+        for i, skin in enumerate(skins):
+            shard_index = previous.get(skin.get('localization_name'))
+            if isinstance(shard_index, int) and shard_index >= 0:
+                while len(shards) <= shard_index:
+                    new_shard()
+                if try_place(shards[shard_index], i):
+                    continue
+            remaining.append(i)
+        
+        # 第二轮：其余皮肤放入第一个放得下的分包
+        for i in remaining:
+            if not any(try_place(shard, i) for shard in shards):
+                try_place(new_shard(), i)
+        
+        return [sorted(shard['skins']) for shard in shards]
+    
+    @staticmethod
+    def build_shard(merged_result: Dict, skin_indices: List[int], shard_number: int, shard_count: int,
+                    requirements: List[Tuple[Set[str], Set[str]]]) -> Dict:
+        """按皮肤下标生成单个分包的合并结果（结构与 merge_skin_packs 的结果相同）"""
+        skins = [merged_result['skins']['skins'][i] for i in skin_indices]
+        geometry_ids = set()
+        texture_names = set()
+        for i in skin_indices:
+            geometry_ids |= requirements[i][0]
+            texture_names |= requirements[i][1]
+        
+        geometries = [geometry for geometry in merged_result['geometry']['minecraft:geometry']
+                      if geometry['description']['identifier'].split(':', 1)[0] in geometry_ids]
+        textures = {name: source for name, source in merged_result['textures'].items() if name in texture_names}
+        skins_doc = dict(merged_result['skins'],
+                         skins=skins,
+                         serialize_name=f"{merged_result['skins']['serialize_name']}_{shard_number}",
+                         localization_name=f"{merged_result['skins']['localization_name']} "
+                                           f"({shard_number}/{shard_count})")
+        return {
+            'skins': skins_doc,
+            'geometry': dict(merged_result['geometry'], **{'minecraft:geometry': geometries}),
+            'textures': textures,
+            'others': merged_result['others'],
+            'texts': merged_result.get('texts', []),
+            'stats': dict(merged_result['stats'],
+                          total_skins=len(skins),
+                          total_geometries=len(geometries),
+                          texture_count=len(textures),
+                          shard=shard_number,
+                          shard_count=shard_count)
+        }
+    
+    @staticmethod
+    def plan_path(output_path: Path) -> Path:
+        """分包方案文件路径，与输出文件放在一起"""
+        return output_path.with_name(f"{output_path.stem}.shards.json")
+    
+    @staticmethod
+    def load_assignment(output_path: Path) -> Dict[str, int]:
+        plan_path = ShardPlanner.plan_path(output_path)
+        try:
+            with open(plan_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('assignment', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+    
+    def save_assignment(self, output_path: Path, merged_result: Dict, shard_plan: List[List[int]]):
+        skins = merged_result['skins']['skins']
+        assignment = {skins[i].get('localization_name'): shard_index
+                      for shard_index, skin_indices in enumerate(shard_plan) for i in skin_indices}
+        plan_path = self.plan_path(output_path)
+        tmp_path = plan_path.with_name(plan_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'limits': self.limits(), 'assignment': assignment}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, plan_path)
+
+
+class NameAllocator:
+    """冲突名称分配器
+    
+    记录已使用的名称，以及每个基础名下一个待尝试的数字后缀：冲突时不必每次从 _2 开始探测，
+    单次分配为摊销 O(1)。重命名策略（结果都是确定的）：
+      suffix  name_2、name_3 …（默认）
+      pack    name_<皮肤包 serialize_name>，仍冲突时再加数字后缀
+      hash    name_<内容哈希前8位>，仍冲突时再加数字后缀
+    每次重命名都记录在 mapping 中（皮肤包、原名称、新名称），后续阶段和报告可以直接使用。
+    """
+    
+    STRATEGIES = ('suffix', 'pack', 'hash')
+    HASH_LENGTH = 8
+    _UNSAFE_RE = re.compile(r'[^\w.-]+')
+    
+    def __init__(self, strategy: str = 'suffix'):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的重命名策略: {strategy}")
+        self.strategy = strategy
+        self.used: Set[str] = set()
+        # (数字后缀前的部分, 数字后缀后的部分) -> 下一个待尝试的数字
+        self._next_suffix: Dict[Tuple[str, str], int] = {}
+        self.mapping: List[Dict[str, Optional[str]]] = []
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.used
+    
+    def _numbered(self, stem: str, tail: str) -> str:
+        key = (stem, tail)
+        counter = self._next_suffix.get(key, 2)
+        candidate = f"{stem}_{counter}{tail}"
+        # 名称只增不减，小于记录值的候选一定已被占用
+        while candidate in self.used:
+            counter += 1
+            candidate = f"{stem}_{counter}{tail}"
+        self._next_suffix[key] = counter + 1
+        return candidate
+    
+    def allocate(self, name: str, stem: Optional[str] = None, tail: str = '',
+                 pack: Optional[str] = None, digest: Optional[str] = None) -> str:
+        """登记名称并返回实际使用的名称，冲突时按策略分配新名称
+        
+        stem/tail 为新名称中标记前后的部分（默认整个名称和空串），例如纹理的扩展名、
+        几何模型继承写法的 ":父模型"。pack 和 digest 分别供 pack、hash 策略使用，
+        缺少时退回数字后缀。
+        """
+        if name not in self.used:
+            self.used.add(name)
+            return name
+        
+        if stem is None:
+            stem = name
+        tag = None
+        if self.strategy == 'pack' and pack:
+            tag = self._UNSAFE_RE.sub('_', pack).strip('_')
+        elif self.strategy == 'hash' and digest:
+            tag = digest[:self.HASH_LENGTH]
+        if tag:
+            stem = f"{stem}_{tag}"
+            new_name = f"{stem}{tail}"
+            if new_name in self.used:
+                new_name = self._numbered(stem, tail)
+        else:
+            new_name = self._numbered(stem, tail)
+        
+        self.used.add(new_name)
+        self.mapping.append({'pack': pack, 'original': name, 'merged': new_name})
+        return new_name
+
+
+class MergeState:
+    """增量合并状态：逐个加入皮肤包，最后生成合并结果
+    
+    merge_skin_packs 和流水线模式共用同一套逻辑，两种模式的输出完全一致。
+    """
+    
+    def __init__(self, package_name: str, display_name: str, metrics: Optional[Metrics] = None,
+                 rename_strategy: str = 'suffix'):
+        self.package_name = package_name
+        self.display_name = display_name
+        self.metrics = metrics or Metrics('quiet')
+        
+        # 初始化合并结果
+        self.merged_skins = {
+            'skins': [],
+            'serialize_name': package_name,
+            'localization_name': display_name
+        }
+        
+        self.merged_geometry = {
+            'format_version': '1.12.0',
+            'minecraft:geometry': []
+        }
+        
+        self.texture_files = {}
+        self.other_files = {}
+        # 带本地化文件的皮肤包：{'pack', 'files', 'skins': {原皮肤名: [合并后皮肤名, ...]}}
+        self.lang_sources = []
+        
+        # 跟踪重复项，冲突时按策略分配新名称
+        self.skin_names = NameAllocator(rename_strategy)
+        self.geometry_ids = NameAllocator(rename_strategy)
+        self.texture_names = NameAllocator(rename_strategy)
+        self.all_pack_names = []
+        
+        self.pack_count = 0
+        self.total_skins = 0
+        self.total_geometries = 0
+        self.texture_dedup_count = 0
+        self.texture_renamed_count = 0
+        
+        # 按内容哈希去重纹理：相同内容只保存一次，同名不同内容则重命名
+        self.texture_names_by_hash = {}
+        self.geometry_ids_by_hash = {}
+        self.geometry_dedup_count = 0
+        self.geometry_renamed_count = 0
+    
+    def add_pack(self, pack: SkinPackInfo, index: int, total: int) -> List[Tuple[str, Any]]:
+        """合并一个皮肤包（纹理哈希需已计算），返回本包新增的 (合并后纹理名, 来源) 列表"""
+        print(f"📦 处理: {pack.folder_name} ({index + 1}/{total})")
+        self.pack_count += 1
+        self.all_pack_names.append(pack.serialize_name)
+        
+        # 处理纹理，记录本包纹理名到合并后纹理名的映射
+        new_textures = []
+        texture_map = {}
+        for texture_file in pack.texture_files:
+            # 无法读取的纹理按来源区分，不同皮肤包中的同名纹理不会被误判为重复
+            digest = (pack.texture_hashes.get(texture_file.name)
+                      or f"unreadable:{pack.serialize_name}/{texture_file.name}")
+            merged_name = self.texture_names_by_hash.get(digest)
+            if merged_name is not None:
+                self.texture_dedup_count += 1
+            else:
+                stem, suffix = os.path.splitext(texture_file.name)
+                merged_name = self.texture_names.allocate(texture_file.name, stem, suffix, pack=pack.serialize_name,
+                                                          digest=pack.texture_hashes.get(texture_file.name))
+                if merged_name != texture_file.name:
+                    self.texture_renamed_count += 1
+                    self.metrics.rename('textures', texture_file.name, merged_name)
+                self.texture_files[merged_name] = texture_file
+                self.texture_names_by_hash[digest] = merged_name
+                new_textures.append((merged_name, texture_file))
+            texture_map[texture_file.name] = merged_name
+        
+        # 处理几何模型：结构相同的只保留一份，ID冲突且结构不同的重命名；
+        # 父模型先处理，子模型的继承写法跟随父模型的合并结果
+        geometry_map = {}
+        entries = pack.converted_geometries()
+        order = GeometryConverter.parents_first([geometry['description']['identifier'] for geometry, _ in entries])
+        for geometry, digest in (entries[i] for i in order):
+            original_id = geometry['description']['identifier']
+            inherited_id, digest = GeometryConverter.remap_parent(original_id, digest, geometry_map)
+            
+            if digest in self.geometry_ids_by_hash:
+                GeometryConverter.add_reference_mapping(
+                    geometry_map, original_id, self.geometry_ids_by_hash[digest])
+                self.geometry_dedup_count += 1
+                continue
+            
+            # 源数据不会被修改，未重命名的几何模型直接共享原对象
+            geometry_copy = geometry
+            
+            # 处理重复的几何模型ID（继承写法 "geometry.a:geometry.b" 只按前半部分分配名称）
+            base_id, sep, parent_id = inherited_id.partition(':')
+            identifier = self.geometry_ids.allocate(base_id, pack=pack.serialize_name, digest=digest) + sep + parent_id
+            if identifier != original_id:
+                # 只复制需要修改的 description，bones 等仍与源数据共享
+                geometry_copy = dict(geometry, description=dict(geometry['description'], identifier=identifier))
+                self.geometry_renamed_count += 1
+                self.metrics.rename('geometries', original_id, identifier)
+            
+            self.geometry_ids_by_hash[digest] = identifier
+            GeometryConverter.add_reference_mapping(geometry_map, original_id, identifier)
+            self.merged_geometry['minecraft:geometry'].append(geometry_copy)
+            self.total_geometries += 1
+        
+        # 处理皮肤；本包的重命名记录从 skin_names.mapping 的这个位置开始
+        skins = pack.skins()
+        skin_map: Dict[str, List[str]] = {}
+        renames_start = len(self.skin_names.mapping)
+        for skin in skins:
+            # 浅拷贝即可：只会替换 localization_name/texture/geometry 等顶层字段
+            skin_copy = dict(skin)
+            skin_name = skin_copy.get('localization_name', 'unknown')
+            
+            # 纹理和几何模型引用跟随去重/重命名结果
+            texture_name = skin_copy.get('texture')
+            if texture_name in texture_map and texture_map[texture_name] != texture_name:
+                skin_copy['texture'] = texture_map[texture_name]
+            geometry_name = skin_copy.get('geometry')
+            if geometry_name in geometry_map and geometry_map[geometry_name] != geometry_name:
+                skin_copy['geometry'] = geometry_map[geometry_name]
+            
+            # 处理重复的皮肤名称；内容哈希只在 hash 策略发生冲突时才计算
+            digest = None
+            if self.skin_names.strategy == 'hash' and skin_name in self.skin_names:
+                digest = hashlib.sha256(json.dumps(skin_copy, sort_keys=True, ensure_ascii=False)
+                                        .encode('utf-8')).hexdigest()
+            new_name = self.skin_names.allocate(skin_name, pack=pack.serialize_name, digest=digest)
+            if new_name != skin_name:
+                skin_copy['localization_name'] = new_name
+                self.metrics.rename('skins', skin_name, new_name)
+            else:
+                skin_map.setdefault(skin_name, []).append(skin_name)
+            
+            self.merged_skins['skins'].append(skin_copy)
+            self.total_skins += 1
+        
+        # 重命名的皮肤以分配器的记录为准（与报告一致）；同名的多个皮肤各自对应一个合并后名称
+        for rename in self.skin_names.mapping[renames_start:]:
+            skin_map.setdefault(rename['original'], []).append(rename['merged'])
+        
+        if pack.lang_files:
+            self.lang_sources.append({'pack': pack.serialize_name, 'files': pack.lang_files, 'skins': skin_map})
+        
+        # 收集其他文件
+        for other_file in pack.other_files:
+            if other_file.name not in self.other_files:
+                self.other_files[other_file.name] = other_file
+        return new_textures
+    
+    def result(self) -> Dict:
+        """生成合并结果"""
+        # 如果没有指定名称，使用合并的包名
+        if self.package_name == "MergedSkinPack":
+            self.merged_skins['serialize_name'] = '_'.join(self.all_pack_names[:3])  # 最多3个包名
+        if self.display_name == "合并皮肤包":
+            self.merged_skins['localization_name'] = ' + '.join(self.all_pack_names[:3])
+        
+        return {
+            'skins': self.merged_skins,
+            'geometry': self.merged_geometry,
+            'textures': self.texture_files,
+            'others': self.other_files,
+            'texts': self.lang_sources,
+            # 重命名对照表，按类型列出 {'pack', 'original', 'merged'}
+            'renames': {
+                'skins': self.skin_names.mapping,
+                'geometries': self.geometry_ids.mapping,
+                'textures': self.texture_names.mapping,
+            },
+            'stats': {
+                'total_skins': self.total_skins,
+                'total_geometries': self.total_geometries,
+                'geometry_dedup_count': self.geometry_dedup_count,
+                'geometry_renamed_count': self.geometry_renamed_count,
+                'texture_count': len(self.texture_files),
+                'texture_dedup_count': self.texture_dedup_count,
+                'texture_renamed_count': self.texture_renamed_count,
+                'folder_count': self.pack_count
+            }
+        }
+
+
+class MergePlanner:
+    """合并预演：只根据皮肤包摘要推算合并结果，不复制数据，也不写任何文件
+    
+    名称分配使用与 MergeState 相同的 NameAllocator 和处理顺序，纹理哈希已知时
+    重命名方案、重复项与实际合并完全一致；尚未计算哈希的纹理按内容不同处理
+    （报告中 exact 为 False）。输出大小按磁盘上的文件大小和典型压缩率估算。
+    """
+    
+    # 内置几何模型，皮肤引用它们时不需要包内定义
+    BUILTIN_GEOMETRY_PREFIX = 'geometry.humanoid'
+    # 输出JSON经DEFLATE后相对紧凑JSON的典型比例：缩进几乎不增加压缩后的大小，
+    # 生成的测试皮肤包约为 0.06~0.12，实际皮肤包的名称和数值重复更少，取偏大的值
+    JSON_DEFLATE_RATIO = 0.12
+    LANG_DEFLATE_RATIO = 0.3
+    # 每个ZIP条目的本地文件头和中央目录开销（不含两次出现的文件名），以及目录结束记录
+    ZIP_ENTRY_OVERHEAD = 76
+    ZIP_END_OVERHEAD = 22
+    
+    def __init__(self):
+        # 压缩包路径 -> ((大小, 修改时间), {成员名: (原始大小, 压缩后大小)})
+        self._archive_sizes: Dict[str, Tuple[Tuple[int, int], Dict[str, Tuple[int, int]]]] = {}
+    
+    def _archive_members(self, archive_path: Path) -> Dict[str, Tuple[int, int]]:
+        """读取（并缓存）压缩包的成员大小表，只读取中央目录"""
+        stat = archive_path.stat()
+        key = str(archive_path)
+        cached = self._archive_sizes.get(key)
+        if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+            return cached[1]
+        with zipfile.ZipFile(archive_path) as zf:
+            sizes = {info.filename: (info.file_size, info.compress_size) for info in zf.infolist()}
+        self._archive_sizes[key] = ((stat.st_size, stat.st_mtime_ns), sizes)
+        return sizes
+    
+    def _source_size(self, source, policy: CompressionPolicy) -> int:
+        """估算单个来源文件写入ZIP后的大小"""
+        try:
+            if isinstance(source, ArchiveMember):
+                file_size, compress_size = self._archive_members(source.archive_path)[source.member_name]
+            else:
+                file_size = compress_size = Path(source).stat().st_size
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return 0
+        compress_type, _ = policy.for_name(source.name)
+        if compress_type == zipfile.ZIP_STORED:
+            return file_size
+        if Path(source.name).suffix.lower() in CompressionPolicy.TEXT_EXTENSIONS:
+            return int(file_size * self.LANG_DEFLATE_RATIO)
+        # 来源压缩包里已压缩过的条目按原压缩率估算，其他文件按原始大小保守估算
+        return min(file_size, compress_size)
+    
+    def _zip_entry(self, name: str) -> int:
+        return self.ZIP_ENTRY_OVERHEAD + 2 * len(name.encode('utf-8'))
+    
+    def plan(self, packs: List[SkinPackInfo], rename_strategy: str = 'suffix',
+             policy: Optional[CompressionPolicy] = None) -> Dict:
+        """推算合并报告：重命名方案、重复项、缺失引用和估算的输出大小"""
+        start = time.perf_counter()
+        policy = policy or CompressionPolicy()
+        skin_names = NameAllocator(rename_strategy)
+        geometry_ids = NameAllocator(rename_strategy)
+        texture_names = NameAllocator(rename_strategy)
+        textures_by_hash: Dict[str, str] = {}
+        geometries_by_hash: Dict[str, str] = {}
+        merged_textures: Dict[str, Any] = {}
+        other_files: Dict[str, Any] = {}
+        lang_files: List = []
+        references: Set[str] = set()
+        skin_refs: List[Tuple[str, str, Optional[str], Optional[str]]] = []
+        duplicates = {'textures': [], 'geometries': []}
+        unhashed = 0
+        exact = True
+        skin_bytes = 0
+        fallback_lang_bytes = 0
+        geometry_bytes = 0
+        geometry_count = 0
+        
+        for pack in packs:
+            texture_map = {}
+            for texture_file in pack.texture_files:
+                known = pack.texture_hashes.get(texture_file.name)
+                if known is None:
+                    unhashed += 1
+                digest = known or f"unhashed:{pack.serialize_name}/{texture_file.name}"
+                merged_name = textures_by_hash.get(digest)
+                if merged_name is not None:
+                    duplicates['textures'].append({'pack': pack.serialize_name, 'texture': texture_file.name,
+                                                   'same_as': merged_name})
+                else:
+                    stem, suffix = os.path.splitext(texture_file.name)
+                    merged_name = texture_names.allocate(texture_file.name, stem, suffix, pack=pack.serialize_name,
+                                                         digest=known)
+                    merged_textures[merged_name] = texture_file
+                    textures_by_hash[digest] = merged_name
+                texture_map[texture_file.name] = merged_name
+            
+            geometry_index = pack.geometry_index
+            if geometry_index is None:
+                # 索引只能从未释放的数据补算，否则按没有几何模型处理
+                if pack.loaded:
+                    pack.converted_geometries()
+                    geometry_index = pack.geometry_index
+                else:
+                    geometry_index, exact = [], False
+            geometry_map = {}
+            order = GeometryConverter.parents_first([original_id for original_id, _, _ in geometry_index])
+            for original_id, digest, size in (geometry_index[i] for i in order):
+                inherited_id, digest = GeometryConverter.remap_parent(original_id, digest, geometry_map)
+                if digest in geometries_by_hash:
+                    GeometryConverter.add_reference_mapping(geometry_map, original_id, geometries_by_hash[digest])
+                    duplicates['geometries'].append({'pack': pack.serialize_name, 'geometry': original_id,
+                                                     'same_as': geometries_by_hash[digest]})
+                    continue
+                base_id, sep, parent_id = inherited_id.partition(':')
+                identifier = geometry_ids.allocate(base_id, pack=pack.serialize_name, digest=digest) + sep + parent_id
+                geometries_by_hash[digest] = identifier
+                GeometryConverter.add_reference_mapping(geometry_map, original_id, identifier)
+                references.add(identifier)
+                references.add(identifier.split(':', 1)[0])
+                geometry_bytes += size + len(identifier) - len(original_id)
+                geometry_count += 1
+            
+            for skin_name, texture_name, geometry_name in pack.skin_index:
+                # hash 策略的皮肤哈希需要完整的皮肤数据，预演时退回数字后缀
+                if rename_strategy == 'hash' and skin_name in skin_names:
+                    exact = False
+                new_name = skin_names.allocate(skin_name, pack=pack.serialize_name)
+                skin_refs.append((pack.serialize_name, new_name, texture_map.get(texture_name, texture_name),
+                                  geometry_map.get(geometry_name, geometry_name)))
+            skin_bytes += pack.skin_bytes
+            
+            lang_files.extend(pack.lang_files)
+            if not pack.lang_files:
+                # skin.<包名>.<皮肤名>=<皮肤名>
+                fallback_lang_bytes += sum(2 * len(skin_name) + len(pack.serialize_name) + 8
+                                           for skin_name, _, _ in pack.skin_index)
+            for other_file in pack.other_files:
+                other_files.setdefault(other_file.name, other_file)
+        
+        missing = {'textures': [], 'geometries': []}
+        for pack_name, skin_name, texture_name, geometry_name in skin_refs:
+            if texture_name and texture_name not in merged_textures:
+                missing['textures'].append({'pack': pack_name, 'skin': skin_name, 'texture': texture_name})
+            if geometry_name and geometry_name not in references \
+                    and not geometry_name.startswith(self.BUILTIN_GEOMETRY_PREFIX):
+                missing['geometries'].append({'pack': pack_name, 'skin': skin_name, 'geometry': geometry_name})
+        
+        estimate = {
+            'skins_json': int(skin_bytes * self.JSON_DEFLATE_RATIO),
+            'geometry_json': int(geometry_bytes * self.JSON_DEFLATE_RATIO),
+            'textures': sum(self._source_size(source, policy) for source in merged_textures.values()),
+            # 合并后的 .lang 文件按来源总大小估算（不扣除去重的行），没有翻译的皮肤各加一行 en_US
+            'texts': sum(self._source_size(source, policy) for source in lang_files)
+            + int(fallback_lang_bytes * self.LANG_DEFLATE_RATIO),
+            'others': sum(self._source_size(source, policy) for source in other_files.values()),
+        }
+        locales = LangMerger.locales([{'files': lang_files}])
+        entry_names = ['skins.json'] + (['geometry.json'] if geometry_count else []) \
+            + list(merged_textures) + list(other_files) \
+            + [f"{PackIndexer.LANG_DIR}/{locale}.lang" for locale in locales] \
+            + [f"{PackIndexer.LANG_DIR}/languages.json"]
+        estimate['overhead'] = sum(self._zip_entry(name) for name in entry_names) + self.ZIP_END_OVERHEAD
+        estimate['total'] = sum(estimate.values())
+        
+        return {
+            'packs': len(packs),
+            'skins': len(skin_refs),
+            'geometries': geometry_count,
+            'textures': len(merged_textures),
+            'renames': {
+                'skins': skin_names.mapping,
+                'geometries': geometry_ids.mapping,
+                'textures': texture_names.mapping,
+            },
+            'duplicates': duplicates,
+            'missing': missing,
+            'estimate': estimate,
+            'unhashed': unhashed,
+            'exact': exact and not unhashed,
+            'seconds': round(time.perf_counter() - start, 4),
+        }
+    
+    @staticmethod
+    def counts(report: Dict) -> Dict:
+        """报告的数量摘要（批量任务摘要中使用）"""
+        return {
+            'skins': report['skins'],
+            'geometries': report['geometries'],
+            'textures': report['textures'],
+            'renames': {kind: len(items) for kind, items in report['renames'].items()},
+            'duplicates': {kind: len(items) for kind, items in report['duplicates'].items()},
+            'missing': {kind: len(items) for kind, items in report['missing'].items()},
+            'estimated_bytes': report['estimate']['total'],
+            'exact': report['exact'],
+        }
+    
+    @staticmethod
+    def describe(report: Dict) -> str:
+        """单行摘要，供交互式界面的状态栏显示"""
+        renames = sum(len(items) for items in report['renames'].values())
+        duplicates = sum(len(items) for items in report['duplicates'].values())
+        missing = sum(len(items) for items in report['missing'].values())
+        approx = '' if report['exact'] else '~'
+        return (f"{report['skins']} 皮肤 / {report['geometries']} 模型 / {report['textures']} 纹理 | "
+                f"重命名 {approx}{renames} | 重复 {approx}{duplicates} | 缺失引用 {missing} | "
+                f"约 {report['estimate']['total'] / (1024 * 1024):.2f} MB")
+    
+    @staticmethod
+    def print_report(report: Dict, limit: int = 10):
+        """输出预演报告，每类最多列出 limit 条"""
+        print(f"\n🔮 合并预演 ({report['packs']} 个皮肤包, {report['seconds'] * 1000:.1f} ms)")
+        print(f"   {MergePlanner.describe(report)}")
+        if report['unhashed']:
+            print(f"   ℹ️  {report['unhashed']} 个纹理尚未计算哈希，按内容不同处理（实际合并时重复项可能更多）")
+        estimate = report['estimate']
+        print(f"   📦 估算大小: skins.json {estimate['skins_json'] / 1024:.1f} KB | "
+              f"geometry.json {estimate['geometry_json'] / 1024:.1f} KB | 纹理 {estimate['textures'] / 1024:.1f} KB | "
+              f"本地化 {estimate['texts'] / 1024:.1f} KB | 其他 {estimate['others'] / 1024:.1f} KB")
+        for kind, label in (('skins', '皮肤'), ('geometries', '几何模型'), ('textures', '纹理')):
+            for item in report['renames'][kind][:limit]:
+                print(f"   🔀 {label}重命名: {item['original']} -> {item['merged']} ({item['pack']})")
+        for kind, key, label in (('textures', 'texture', '纹理'), ('geometries', 'geometry', '几何模型')):
+            for item in report['duplicates'][kind][:limit]:
+                print(f"   ♻️  重复{label}: {item[key]} ({item['pack']}) = {item['same_as']}")
+            for item in report['missing'][kind][:limit]:
+                print(f"   ❓ 缺失{label}: {item[key]} (皮肤 {item['skin']}, {item['pack']})")
+
+
+class SkinPackMerger:
+    """皮肤包合并器"""
+    
+    def __init__(self, package_name: str = "MergedSkinPack", display_name: str = "合并皮肤包",
+                 cache: Optional[PackCache] = None, metrics: Optional[Metrics] = None,
+                 low_memory: bool = False):
+        self.package_name = package_name
+        self.display_name = display_name
+        self.loaded_packs: List[SkinPackInfo] = []
+        # 低内存模式：加载后只保留摘要，合并时逐个重新读取完整数据，用完即丢弃
+        self.low_memory = low_memory
+        # 合并后修正不足或缺失的几何模型可见范围
+        self.fix_visible_bounds = True
+        # 多次合并同一批皮肤包时（监视模式）设为字典，未变化的几何模型沿用上次的分析结果
+        self.geometry_analysis_memo: Optional[Dict] = None
+        # 名称冲突时的重命名策略（NameAllocator.STRATEGIES）
+        self.rename_strategy = 'suffix'
+        # 预演合并，缓存了压缩包的成员大小表
+        self.planner = MergePlanner()
+        self.texture_hasher = TextureHasher()
+        self.texture_inspector = TextureInspector()
+        self.png_optimizer = (PNGOptimizer(cache.png_dir) if cache is not None
+                              else PNGOptimizer(persistent=False))
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+    
+    @staticmethod
+    def read_skin_pack_folder(folder_path: Path, fingerprint: Optional[str] = None) -> SkinPackInfo:
+        """读取单个皮肤包文件夹，失败时抛出异常；fingerprint 为已计算好的指纹"""
+        timer = StageTimer()
+        
+        # 单次扫描完成文件分类
+        with timer.measure('scan'):
+            index = PackIndexer.index_folder(folder_path, fingerprint)
+        skins_json = index['skins_json']
+        if skins_json is None:
+            raise FileNotFoundError(f"未找到skins.json: {folder_path}")
+        
+        # 读取失败的几何模型文件按其他文件处理
+        other_files = list(index['other_files'])
+        with timer.measure('parse'):
+            # 加载皮肤数据
+            skin_data = JSONCleaner.load_json_file(skins_json)
+            timer.count('bytes_read', index['sizes'][skins_json.name])
+            
+            # 加载几何模型文件
+            geometry_data = []
+            for geo_file in index['geometry_files']:
+                try:
+                    geo_data = JSONCleaner.load_json_file(geo_file)
+                    timer.count('bytes_read', index['sizes'][geo_file.name])
+                    geometry_data.append({
+                        'file_name': geo_file.name,
+                        'data': geo_data
+                    })
+                except Exception as e:
+                    print(f"⚠️  几何模型读取失败: {geo_file.name} - {e}")
+                    other_files.append(geo_file)
+        
+        # 创建皮肤包信息
+        pack_info = SkinPackInfo(
+            folder_path.name,
+            skin_data,
+            geometry_data,
+            index['texture_files'],
+            other_files,
+            source_path=folder_path,
+            fingerprint=index['fingerprint'],
+            lang_files=index['lang_files']
+        )
+        # 几何模型转换和结构哈希随加载一起完成（并行加载时在工作进程中执行）
+        with timer.measure('geometry_convert'):
+            pack_info.converted_geometries()
+        pack_info.load_metrics = timer.as_dict()
+        return pack_info
+    
+    @staticmethod
+    def read_skin_pack_archive(archive_path: Path, fingerprint: Optional[str] = None) -> SkinPackInfo:
+        """直接从 .mcpack/.zip 压缩包读取皮肤包，失败时抛出异常
+        
+        skins.json 和几何模型JSON从压缩包中直接解析，纹理等文件只保留延迟引用。
+        fingerprint 为已计算好的指纹。
+        """
+        timer = StageTimer()
+        with zipfile.ZipFile(archive_path) as zf:
+            with timer.measure('scan'):
+                members = [info for info in zf.infolist() if not info.is_dir()]
+            
+            # 以层级最浅的skins.json所在目录作为皮肤包根目录
+            skins_candidates = [info.filename for info in members
+                                if info.filename.rsplit('/', 1)[-1] == 'skins.json']
+            if not skins_candidates:
+                raise FileNotFoundError(f"未找到skins.json: {archive_path}")
+            skins_member = min(skins_candidates, key=lambda name: (name.count('/'), name))
+            prefix = skins_member[:-len('skins.json')]
+            
+            def read_member(member_name: str) -> bytes:
+                data = zf.read(member_name)
+                timer.count('bytes_read', len(data))
+                return data
+            
+            with timer.measure('parse'):
+                skin_data = JSONCleaner.load_json_bytes(read_member(skins_member), 'skins.json')
+            
+            geometry_data = []
+            texture_files = []
+            other_files = []
+            lang_files = []
+            texture_extensions = {'.png', '.jpg', '.jpeg'}
+            for info in members:
+                if not info.filename.startswith(prefix) or info.filename == skins_member:
+                    continue
+                file_name = info.filename[len(prefix):]
+                directory, _, base_name = file_name.rpartition('/')
+                if directory.lower() == PackIndexer.LANG_DIR and base_name.lower().endswith('.lang'):
+                    lang_files.append(ArchiveMember(archive_path, info.filename))
+                    continue
+                if '/' in file_name:
+                    continue
+                suffix = Path(file_name).suffix.lower()
+                if suffix in texture_extensions:
+                    texture_files.append(ArchiveMember(archive_path, info.filename))
+                elif suffix == '.json':
+                    lower_name = file_name.lower()
+                    if 'geometry' in lower_name or 'model' in lower_name:
+                        try:
+                            with timer.measure('parse'):
+                                geo_data = JSONCleaner.load_json_bytes(read_member(info.filename), file_name)
+                            geometry_data.append({
+                                'file_name': file_name,
+                                'data': geo_data
+                            })
+                        except Exception as e:
+                            print(f"⚠️  几何模型读取失败: {file_name} - {e}")
+                    else:
+                        other_files.append(ArchiveMember(archive_path, info.filename))
+        
+        pack_info = SkinPackInfo(
+            archive_path.stem,
+            skin_data,
+            geometry_data,
+            texture_files,
+            other_files,
+            source_path=archive_path,
+            fingerprint=fingerprint or PackCache.fingerprint(archive_path),
+            lang_files=sorted(lang_files, key=lambda member: member.member_name)
+        )
+        with timer.measure('geometry_convert'):
+            pack_info.converted_geometries()
+        pack_info.load_metrics = timer.as_dict()
+        return pack_info
+    
+    @staticmethod
+    def read_skin_pack(pack_path: Path, fingerprint: Optional[str] = None) -> SkinPackInfo:
+        """读取皮肤包文件夹或压缩包"""
+        if pack_path.is_file() and pack_path.suffix.lower() in ARCHIVE_EXTENSIONS:
+            return SkinPackMerger.read_skin_pack_archive(pack_path, fingerprint)
+        return SkinPackMerger.read_skin_pack_folder(pack_path, fingerprint)
+    
+    @staticmethod
+    def read_skin_pack_with_hashes(pack_path: Path, fingerprint: Optional[str] = None) -> SkinPackInfo:
+        """读取皮肤包并计算纹理哈希（流水线模式在工作进程中执行）"""
+        pack_info = SkinPackMerger.read_skin_pack(pack_path, fingerprint)
+        start = time.perf_counter()
+        for texture_file in pack_info.texture_files:
+            try:
+                pack_info.texture_hashes[texture_file.name] = TextureHasher.hash_bytes(texture_file.read_bytes())
+            except (OSError, KeyError, zipfile.BadZipFile):
+                continue
+        pack_info.load_metrics.setdefault('seconds', {})['texture_hash'] = time.perf_counter() - start
+        return pack_info
+    
+    def load_skin_pack_archive(self, archive_path: Path, fingerprint: Optional[str] = None) -> bool:
+        """加载单个 .mcpack/.zip 皮肤包"""
+        print(f"📦 处理压缩包: {archive_path.name}")
+        try:
+            pack_info = self._read_with_cache(archive_path, self.read_skin_pack_archive, fingerprint)
+        except Exception as e:
+            return self._report_load_result(archive_path, None, e)
+        return self._report_load_result(archive_path, pack_info, None)
+    
+    def load_skin_pack(self, pack_path: Path, fingerprint: Optional[str] = None) -> bool:
+        """加载皮肤包文件夹或压缩包；fingerprint 为调用方已计算好的指纹（避免重复读取内容）"""
+        if pack_path.is_file() and pack_path.suffix.lower() in ARCHIVE_EXTENSIONS:
+            return self.load_skin_pack_archive(pack_path, fingerprint)
+        return self.load_skin_pack_folder(pack_path, fingerprint)
+    
+    def load_skin_pack_folder(self, folder_path: Path, fingerprint: Optional[str] = None) -> bool:
+        """加载单个皮肤包文件夹"""
+        print(f"📁 处理文件夹: {folder_path.name}")
+        try:
+            pack_info = self._read_with_cache(folder_path, self.read_skin_pack_folder, fingerprint)
+        except Exception as e:
+            return self._report_load_result(folder_path, None, e)
+        return self._report_load_result(folder_path, pack_info, None)
+    
+    def load_skin_pack_folders(self, folder_paths: List[Path], workers: Optional[int] = None,
+                               use_processes: bool = True,
+                               fingerprints: Optional[List[Optional[str]]] = None) -> List[bool]:
+        """并行加载多个皮肤包文件夹（也可以是 .mcpack/.zip 压缩包）
+        
+        JSON解析在进程池中进行（use_processes=False 时使用线程池），
+        结果按输入顺序加入 loaded_packs，保证合并输出稳定。
+        fingerprints 为调用方已计算好的指纹（与 folder_paths 一一对应），每个皮肤包的指纹
+        只计算一次，缓存校验和解析共用。返回与输入顺序一致的成功标志列表。
+        """
+        folder_paths = [Path(p) for p in folder_paths]
+        if not folder_paths:
+            return []
+        if fingerprints is None:
+            fingerprints = [self._fingerprint(folder_path) for folder_path in folder_paths]
+        
+        workers = min(workers or os.cpu_count() or 1, len(folder_paths))
+        if workers <= 1:
+            return [self.load_skin_pack(folder_path, fingerprint)
+                    for folder_path, fingerprint in zip(folder_paths, fingerprints)]
+        
+        # 先查缓存，只有未命中的皮肤包才需要重新解析
+        cached = {i: self._get_cached(folder_path, fingerprints[i]) for i, folder_path in enumerate(folder_paths)}
+        if self.cache is not None:
+            hit_count = sum(1 for pack_info in cached.values() if pack_info is not None)
+            print(f"🗄️  缓存命中 {hit_count}/{len(folder_paths)}")
+        
+        print(f"📁 并行处理 {len(folder_paths)} 个文件夹 (workers={workers})")
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=workers) as executor:
+            futures = {i: executor.submit(SkinPackMerger.read_skin_pack, folder_path, fingerprints[i])
+                       for i, folder_path in enumerate(folder_paths) if cached[i] is None}
+            # 按提交顺序收集结果，而非完成顺序
+            results = []
+            for i, folder_path in enumerate(folder_paths):
+                pack_info, error = cached[i], None
+                if pack_info is None:
+                    try:
+                        pack_info = futures[i].result()
+                        if self.cache is not None:
+                            self.cache.put(pack_info)
+                    except Exception as e:
+                        pack_info, error = None, e
+                results.append(self._report_load_result(folder_path, pack_info, error))
+        return results
+    
+    def _fingerprint(self, pack_path: Path) -> Optional[str]:
+        """启用缓存时计算一次指纹供缓存校验和解析共用；未启用缓存或无法读取时返回 None"""
+        if self.cache is None:
+            return None
+        try:
+            return PackCache.fingerprint(pack_path)
+        except OSError:
+            return None
+    
+    def _get_cached(self, pack_path: Path, fingerprint: Optional[str] = None) -> Optional[SkinPackInfo]:
+        """从缓存读取皮肤包，未启用缓存或未命中时返回 None"""
+        if self.cache is None:
+            return None
+        start = time.perf_counter()
+        try:
+            pack_info = self.cache.get(pack_path, fingerprint)
+        except OSError:
+            pack_info = None
+        if pack_info is not None:
+            pack_info.load_metrics = {'seconds': {'cache_load': time.perf_counter() - start},
+                                      'counters': {'cache_hits': 1}}
+        return pack_info
+    
+    def _read_with_cache(self, pack_path: Path, reader, fingerprint: Optional[str] = None) -> SkinPackInfo:
+        """优先使用缓存，未命中时解析并写入缓存；指纹只计算一次"""
+        fingerprint = fingerprint or self._fingerprint(pack_path)
+        pack_info = self._get_cached(pack_path, fingerprint)
+        if pack_info is None:
+            pack_info = reader(pack_path, fingerprint)
+            if self.cache is not None:
+                self.cache.put(pack_info)
+        return pack_info
+    
+    def _report_load_result(self, folder_path: Path, pack_info: Optional[SkinPackInfo],
+                            error: Optional[Exception], keep: bool = True) -> bool:
+        """登记单个皮肤包的加载结果并输出状态；keep=False 时不加入 loaded_packs"""
+        if error is not None:
+            print(f"❌ 加载失败: {folder_path.name} - {error}")
+            return False
+        
+        if keep:
+            self.loaded_packs.append(pack_info)
+            if self.low_memory:
+                pack_info.release()
+        self.metrics.record_pack(pack_info.folder_name, pack_info.load_metrics)
+        print(f"✅ 成功加载: {folder_path.name} ({pack_info.skin_count} 皮肤)")
+        return True
+    
+    def merge_skin_packs(self) -> Dict:
+        """合并所有加载的皮肤包"""
+        if not self.loaded_packs:
+            raise ValueError("没有加载任何皮肤包")
+        
+        print("\n🔄 开始合并皮肤包...")
+        with self.metrics.stage('texture_hash'):
+            self._update_texture_hashes()
+        with self.metrics.stage('merge', packs=len(self.loaded_packs)):
+            result = self._merge_loaded_packs()
+        self.analyze_geometries(result)
+        
+        stats = result['stats']
+        self.metrics.count('dedup_textures', stats['texture_dedup_count'])
+        self.metrics.count('dedup_geometries', stats['geometry_dedup_count'])
+        rename_total = sum(self.metrics.counters.get(f'renamed_{kind}', 0)
+                           for kind in ('skins', 'geometries', 'textures'))
+        if rename_total > Metrics.RENAME_PRINT_LIMIT:
+            print(f"   🔀 共重命名 {rename_total} 项（仅显示部分）")
+        print("✅ 合并完成!")
+        return result
+    
+    def _merge_loaded_packs(self) -> Dict:
+        """merge_skin_packs 的主体"""
+        state = MergeState(self.package_name, self.display_name, self.metrics,
+                           rename_strategy=self.rename_strategy)
+        for i, pack in enumerate(self.loaded_packs):
+            # 重新读取的数据只在本次合并中使用，用完即丢弃
+            state.add_pack(self._pack_data(pack), i, len(self.loaded_packs))
+        return state.result()
+    
+    def _pack_data(self, pack: SkinPackInfo) -> SkinPackInfo:
+        """返回带完整数据的皮肤包：未释放时就是它本身，已释放时重新读取一份（优先使用缓存）
+        
+        皮肤包可能在多个任务之间共享（BatchRunner），这里从不修改或释放传入的皮肤包。
+        """
+        if pack.loaded:
+            return pack
+        if pack.source_path is None:
+            raise ValueError(f"皮肤包数据已释放且没有来源路径: {pack.folder_name}")
+        view = self._read_with_cache(pack.source_path, SkinPackMerger.read_skin_pack)
+        if view.fingerprint == pack.fingerprint:
+            view.texture_hashes = pack.texture_hashes
+        else:
+            print(f"   ⚠️  皮肤包在加载后被修改，使用当前内容: {pack.folder_name}")
+            self._fill_texture_hashes(view)
+        return view
+    
+    def _fill_texture_hashes(self, pack: SkinPackInfo):
+        """补全单个皮肤包缺失的纹理哈希"""
+        missing = [texture for texture in pack.texture_files if texture.name not in pack.texture_hashes]
+        if missing:
+            for texture, digest in self.texture_hasher.hash_files(missing).items():
+                if digest is not None:
+                    pack.texture_hashes[texture.name] = digest
+    
+    def run_pipeline(self, pack_paths: List[Path], output_path: Path, workers: Optional[int] = None,
+                     fast: bool = False, compact: bool = False, queue_size: Optional[int] = None,
+                     use_processes: bool = True, failed_sources: Optional[List[str]] = None) -> Dict:
+        """流水线模式：加载、合并和写入同时进行，返回合并结果
+        
+        皮肤包在进程池中解析并计算纹理哈希（最多提前 queue_size 个），主线程按输入顺序逐个合并，
+        新增的纹理立即交给压缩线程直接写入输出文件。全部合并完成后写入JSON、本地化文件和其他文件，
+        再按与 save_as_zip 相同的顺序排列中央目录，输出的条目和内容与普通模式一致，纹理只写入一次。
+        内存中只保留合并后的JSON数据和有限数量的待处理皮肤包及纹理，与皮肤包总数无关。
+        先写入临时文件，成功后才替换 output_path。加载失败的来源会追加到 failed_sources 中。
+        """
+        pack_paths = [Path(p) for p in pack_paths]
+        output_path = Path(output_path)
+        workers = workers or os.cpu_count() or 1
+        queue_size = queue_size or workers * 2
+        policy = CompressionPolicy(fast=fast)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        state = MergeState(self.package_name, self.display_name, self.metrics,
+                           rename_strategy=self.rename_strategy)
+        
+        def texture_error(name, e):
+            print(f"   ⚠️  纹理文件添加失败: {name} - {e}")
         
-        result = {
-            'skins': merged_skins,
-            'geometry': merged_geometry,
-            'textures': texture_files,
-            'others': other_files,
-            'stats': {
-                'total_skins': total_skins,
-                'total_geometries': total_geometries,
-                'texture_count': len(texture_files),
-                'folder_count': len(self.loaded_packs)
-            }
-        }
+        print(f"\n🚰 流水线处理 {len(pack_paths)} 个皮肤包 (workers={workers}, 队列={queue_size})")
+        executor_class = ProcessPoolExecutor if use_processes and workers > 1 else ThreadPoolExecutor
+        try:
+            with ParallelZipWriter(tmp_path, policy=policy, workers=workers, metrics=self.metrics) as writer:
+                with self.metrics.stage('pipeline', packs=len(pack_paths)), \
+                        executor_class(max_workers=workers) as executor:
+                    window = deque()
+                    remaining = iter(pack_paths)
+                    
+                    def submit_next():
+                        path = next(remaining, None)
+                        if path is None:
+                            return
+                        fingerprint = self._fingerprint(path)
+                        cached = self._get_cached(path, fingerprint)
+                        if cached is not None:
+                            window.append((path, cached, None))
+                        else:
+                            window.append((path, None, executor.submit(SkinPackMerger.read_skin_pack_with_hashes,
+                                                                       path, fingerprint)))
+                    
+                    for _ in range(queue_size):
+                        submit_next()
+                    
+                    index = 0
+                    while window:
+                        path, pack_info, future = window.popleft()
+                        submit_next()
+                        error = None
+                        if pack_info is None:
+                            try:
+                                pack_info = future.result()
+                                if self.cache is not None:
+                                    self.cache.put(pack_info)
+                            except Exception as e:
+                                error = e
+                        if not self._report_load_result(path, pack_info, error, keep=False):
+                            if failed_sources is not None:
+                                failed_sources.append(str(path))
+                            index += 1
+                            continue
+                        
+                        # 缓存中的皮肤包可能缺少纹理哈希
+                        self._fill_texture_hashes(pack_info)
+                        
+                        start = time.perf_counter()
+                        new_textures = state.add_pack(pack_info, index, len(pack_paths))
+                        self.metrics.add_time('merge', time.perf_counter() - start, emit=False)
+                        # 写入队列有上限，压缩跟不上时在这里等待
+                        for name, source in new_textures:
+                            writer.add(name, source, on_error=texture_error)
+                        index += 1
+                
+                if state.pack_count == 0:
+                    raise ValueError("没有加载任何皮肤包")
+                result = state.result()
+                self.analyze_geometries(result)
+                
+                print(f"\n📦 生成ZIP文件: {output_path}")
+                encoder = JSONStreamEncoder(indent=None if compact else 2)
+                with self.metrics.stage('assemble'):
+                    order = ['skins.json']
+                    writer.add_json('skins.json', result['skins'], encoder)
+                    if result['geometry']['minecraft:geometry']:
+                        order.append('geometry.json')
+                        writer.add_json('geometry.json', result['geometry'], encoder)
+                    locales = LangMerger.write(writer, result)
+                    order += [f"{PackIndexer.LANG_DIR}/{locale}.lang" for locale in locales]
+                    order.append(f"{PackIndexer.LANG_DIR}/languages.json")
+                    for name, source in result['others'].items():
+                        writer.add(name, source,
+                                   on_error=lambda name, e: print(f"   ⚠️  其他文件添加失败: {name} - {e}"))
+                    # 纹理已在合并时写入，这里只调整目录顺序
+                    writer.order_entries(order + list(result['textures']) + list(result['others']))
+            os.replace(tmp_path, output_path)
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
         
-        print("✅ 合并完成!")
+        file_size = output_path.stat().st_size / (1024 * 1024)
+        print(f"✅ ZIP文件生成完成，大小: {file_size:.2f} MB")
         return result
     
-    def save_as_zip(self, merged_result: Dict, output_path: Path):
-        """保存为ZIP文件"""
+    def _update_texture_hashes(self):
+        """补全各皮肤包缺失的纹理哈希，并把新结果写回缓存"""
+        pending = [(pack, texture_file) for pack in self.loaded_packs
+                   for texture_file in pack.texture_files if texture_file.name not in pack.texture_hashes]
+        if not pending:
+            return
+        
+        digests = self.texture_hasher.hash_files([texture_file for _, texture_file in pending])
+        updated_packs = []
+        for pack, texture_file in pending:
+            digest = digests.get(texture_file)
+            if digest is not None:
+                pack.texture_hashes[texture_file.name] = digest
+                if not updated_packs or updated_packs[-1] is not pack:
+                    updated_packs.append(pack)
+        
+        if self.cache is not None:
+            for pack in updated_packs:
+                self.cache.put(pack)
+    
+    def dry_run(self) -> Dict:
+        """预演合并已加载的皮肤包：只用摘要推算重命名、重复项、缺失引用和输出大小"""
+        if not self.loaded_packs:
+            raise ValueError("没有加载任何皮肤包")
+        with self.metrics.stage('dry_run', packs=len(self.loaded_packs)):
+            return self.planner.plan(self.loaded_packs, self.rename_strategy)
+    
+    def analyze_geometries(self, merged_result: Dict) -> Dict:
+        """批量分析合并后的几何模型，按设置修正可见范围，并把问题数量写入统计"""
+        geometries = merged_result['geometry']['minecraft:geometry']
+        with self.metrics.stage('geometry_analyze', geometries=len(geometries)):
+            report = GeometryAnalyzer.analyze(geometries, fix_bounds=self.fix_visible_bounds,
+                                              memo=self.geometry_analysis_memo)
+        merged_result['stats'].update(bounds_fixed=len(report['bounds_fixed']) if self.fix_visible_bounds else 0,
+                                      uv_out_of_bounds=len(report['uv_out_of_bounds']),
+                                      degenerate_cubes=len(report['degenerate']))
+        self.metrics.count('geometry_cubes', report['cubes'])
+        self.metrics.count('bounds_fixed', merged_result['stats']['bounds_fixed'])
+        GeometryAnalyzer.print_report(report, fixed=self.fix_visible_bounds)
+        return report
+    
+    def validate_textures(self, merged_result: Dict) -> Dict:
+        """写入前检查纹理：缺失、未引用、尺寸与几何模型不符以及文件头损坏"""
+        with self.metrics.stage('texture_validate', textures=len(merged_result['textures'])):
+            report = self.texture_inspector.validate(merged_result)
+        self.metrics.count('textures_corrupt', len(report['corrupt']))
+        self.metrics.count('textures_missing', len(report['missing']))
+        TextureInspector.print_report(report)
+        return report
+    
+    def optimize_textures(self, merged_result: Dict) -> Dict[Any, bytes]:
+        """无损重新压缩合并结果中的PNG纹理，返回 {来源: 优化后的数据}"""
+        png_sources = [source for name, source in merged_result['textures'].items()
+                       if name.lower().endswith('.png')]
+        saved_before = self.metrics.counters.get('png_bytes_saved', 0)
+        with self.metrics.stage('png_optimize', textures=len(png_sources)):
+            optimized = self.png_optimizer.optimize_sources(png_sources, self.metrics)
+        if optimized:
+            saved = self.metrics.counters.get('png_bytes_saved', 0) - saved_before
+            print(f"   🗜️  PNG优化: {len(optimized)}/{len(png_sources)} 个纹理变小，节省 {saved / 1024:.1f} KB")
+        return optimized
+    
+    def save_as_zip(self, merged_result: Dict, output_path: Path, workers: Optional[int] = None,
+                    fast: bool = False, policy: Optional[CompressionPolicy] = None,
+                    compact: bool = False, optimize_png: bool = False):
+        """保存为ZIP文件
+        
+        条目在线程池中并行压缩，压缩方式由 policy 按文件类型决定；
+        fast=True 时使用低压缩级别以换取速度。JSON 逐条流式写入压缩包，
+        compact=True 时输出不带缩进的紧凑JSON。optimize_png=True 时先无损重新压缩PNG纹理。
+        """
         print(f"\n📦 生成ZIP文件: {output_path}")
+        optimized = self.optimize_textures(merged_result) if optimize_png else {}
         
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        policy = policy or CompressionPolicy(fast=fast)
+        encoder = JSONStreamEncoder(indent=None if compact else 2)
+        with ParallelZipWriter(output_path, policy=policy, workers=workers, metrics=self.metrics) as writer:
             # 添加JSON文件
-            zf.writestr('skins.json', json.dumps(merged_result['skins'], indent=2, ensure_ascii=False))
+            writer.add_json('skins.json', merged_result['skins'], encoder)
             print("   ✅ 添加 skins.json")
             
             if merged_result['geometry']['minecraft:geometry']:
-                zf.writestr('geometry.json', json.dumps(merged_result['geometry'], indent=2, ensure_ascii=False))
+                writer.add_json('geometry.json', merged_result['geometry'], encoder)
                 print("   ✅ 添加 geometry.json")
             
+            with self.metrics.stage('lang_merge'):
+                locales = LangMerger.write(writer, merged_result)
+            print(f"   🌐 添加 {len(locales)} 种语言的本地化文件")
+            
             # 添加纹理文件
             texture_count = len(merged_result['textures'])
             if texture_count > 0:
                 print(f"   📸 添加 {texture_count} 个纹理文件...")
-                for i, (filename, filepath) in enumerate(merged_result['textures'].items()):
-                    try:
-                        zf.write(filepath, filename)
-                        if (i + 1) % 10 == 0 or i == texture_count - 1:  # 每10个文件或最后一个显示进度
-                            print(f"      进度: {i + 1}/{texture_count}")
-                    except Exception as e:
-                        print(f"   ⚠️  纹理文件添加失败: {filename} - {e}")
+                done = [0]
+                
+                def texture_progress(_name):
+                    done[0] += 1
+                    if done[0] % 10 == 0 or done[0] == texture_count:  # 每10个文件或最后一个显示进度
+                        print(f"      进度: {done[0]}/{texture_count}")
+                
+                def texture_error(name, e):
+                    done[0] += 1
+                    print(f"   ⚠️  纹理文件添加失败: {name} - {e}")
+                
+                for filename, filepath in merged_result['textures'].items():
+                    writer.add(filename, optimized.get(filepath, filepath), on_written=texture_progress, on_error=texture_error)
+                writer.flush()
             
             # 添加其他文件
             other_count = len(merged_result['others'])
             if other_count > 0:
                 print(f"   📄 添加 {other_count} 个其他文件...")
                 for filename, filepath in merged_result['others'].items():
-                    try:
-                        zf.write(filepath, filename)
-                    except Exception as e:
-                        print(f"   ⚠️  其他文件添加失败: {filename} - {e}")
+                    writer.add(filename, filepath,
+                               on_error=lambda name, e: print(f"   ⚠️  其他文件添加失败: {name} - {e}"))
         
         file_size = output_path.stat().st_size / (1024 * 1024)
         print(f"✅ ZIP文件生成完成，大小: {file_size:.2f} MB")
     
-    def save_json_files(self, merged_result: Dict, output_dir: Path):
-        """保存为单独的JSON文件"""
+    def save_as_shards(self, merged_result: Dict, output_path: Path, planner: ShardPlanner,
+                       workers: Optional[int] = None, fast: bool = False, compact: bool = False,
+                       concurrent: Optional[int] = None, optimize_png: bool = False) -> List[Path]:
+        """按 planner 的限制拆分为多个ZIP（name_1.zip, name_2.zip, ...）并发写入
+        
+        分包方案保存在 name.shards.json 中，下次运行时据此保持皮肤所在的分包不变。
+        返回生成的文件列表。
+        """
+        with self.metrics.stage('shard_plan'):
+            previous = ShardPlanner.load_assignment(output_path)
+            shard_plan = planner.plan(merged_result, previous)
+            requirements = ShardPlanner.skin_requirements(merged_result)
+        # 空分包不写入，但保留序号，其余分包的文件名不变
+        shard_numbers = [i for i, skin_indices in enumerate(shard_plan) if skin_indices]
+        shard_count = shard_numbers[-1] + 1 if shard_numbers else 0
+        print(f"\n🧩 拆分为 {len(shard_numbers)} 个分包")
+        
+        shard_paths = [output_path.with_name(f"{output_path.stem}_{i}{output_path.suffix or '.zip'}")
+                       for i in range(1, len(shard_plan) + 1)]
+        for i, skin_indices in enumerate(shard_plan):
+            if not skin_indices and shard_paths[i].exists():
+                # 上次生成的分包已没有皮肤，删除以免留下过期内容
+                shard_paths[i].unlink()
+                print(f"   🗑️  分包 {i + 1} 已为空，删除 {shard_paths[i].name}")
+        workers = workers or os.cpu_count() or 1
+        concurrent = max(1, min(concurrent or workers, len(shard_numbers)))
+        # 压缩线程在同时写入的分包之间平分
+        shard_workers = max(1, workers // concurrent)
+        # PNG只统一优化一次，各分包直接写入优化后的数据
+        optimized = self.optimize_textures(merged_result) if optimize_png else {}
+        
+        def write_shard(i: int) -> Path:
+            shard_result = ShardPlanner.build_shard(merged_result, shard_plan[i], i + 1, shard_count, requirements)
+            if optimized:
+                shard_result['textures'] = {name: optimized.get(source, source)
+                                            for name, source in shard_result['textures'].items()}
+            self.save_as_zip(shard_result, shard_paths[i], workers=shard_workers, fast=fast, compact=compact)
+            return shard_paths[i]
+        
+        with ThreadPoolExecutor(max_workers=concurrent) as executor:
+            written = list(executor.map(write_shard, shard_numbers))
+        
+        planner.save_assignment(output_path, merged_result, shard_plan)
+        return written
+    
+    def save_json_files(self, merged_result: Dict, output_dir: Path, compact: bool = False):
+        """保存为单独的JSON文件（compact=True 时输出紧凑格式）"""
         output_dir.mkdir(exist_ok=True)
+        encoder = JSONStreamEncoder(indent=None if compact else 2)
         
         # 保存skins.json
         skins_path = output_dir / 'merged_skins.json'
-        with open(skins_path, 'w', encoding='utf-8') as f:
-            json.dump(merged_result['skins'], f, indent=2, ensure_ascii=False)
+        with self.metrics.stage('json_stream', entry=skins_path.name), open(skins_path, 'wb') as f:
+            self.metrics.count('bytes_written', encoder.write(merged_result['skins'], f))
         print(f"✅ 保存: {skins_path}")
         
         # 保存geometry.json（如果有几何模型）
         if merged_result['geometry']['minecraft:geometry']:
             geometry_path = output_dir / 'merged_geometry.json'
-            with open(geometry_path, 'w', encoding='utf-8') as f:
-                json.dump(merged_result['geometry'], f, indent=2, ensure_ascii=False)
+            with self.metrics.stage('json_stream', entry=geometry_path.name), open(geometry_path, 'wb') as f:
+                self.metrics.count('bytes_written', encoder.write(merged_result['geometry'], f))
             print(f"✅ 保存: {geometry_path}")
         
         print(f"📁 JSON文件保存完成: {output_dir}")
 
 
+class BatchRunner:
+    """无交互的批量合并执行器
+    
+    在同一进程内依次（或并发）执行多个合并任务，已解析的皮肤包和纹理哈希
+    在任务之间共享，同一个皮肤包只解析一次。
+    """
+    
+    def __init__(self, workers: Optional[int] = None, cache: Optional[PackCache] = None,
+                 metrics_mode: str = 'quiet', metrics_stream=None):
+        self.workers = workers
+        self.cache = cache
+        # 每个任务单独统计，jsonl 模式下事件带有任务标签
+        self.metrics_mode = metrics_mode
+        self.metrics_stream = metrics_stream
+        self.texture_hasher = TextureHasher()
+        self.texture_inspector = TextureInspector()
+        self.png_optimizer = (PNGOptimizer(cache.png_dir) if cache is not None
+                              else PNGOptimizer(persistent=False))
+        # (绝对路径, 指纹) -> SkinPackInfo
+        self._packs: Dict[Tuple[str, str], SkinPackInfo] = {}
+        self._lock = threading.Lock()
+    
+    def load_packs(self, sources: List[Path], metrics: Optional[Metrics] = None,
+                   low_memory: bool = False) -> Tuple[List[SkinPackInfo], List[str]]:
+        """按输入顺序返回已加载的皮肤包和加载失败的来源
+        
+        low_memory=True 时新解析的皮肤包在共享之前就释放完整数据；已共享的皮肤包不会再被释放，
+        各任务合并时各自重新读取一份。
+        """
+        keys = {}
+        failed = []
+        for source in sources:
+            try:
+                keys[source] = (str(source.resolve()), PackCache.fingerprint(source))
+            except OSError as e:
+                print(f"❌ 加载失败: {source} - {e}")
+                failed.append(str(source))
+        
+        with self._lock:
+            missing = [source for source, key in keys.items() if key not in self._packs]
+            if missing:
+                loader = SkinPackMerger(cache=self.cache, metrics=metrics, low_memory=low_memory)
+                flags = loader.load_skin_pack_folders(missing, workers=self.workers,
+                                                      fingerprints=[keys[source][1] for source in missing])
+                loaded = iter(loader.loaded_packs)
+                for source, ok in zip(missing, flags):
+                    if ok:
+                        self._packs[keys[source]] = next(loaded)
+            
+            packs = []
+            for source, key in keys.items():
+                if key in self._packs:
+                    packs.append(self._packs[key])
+                else:
+                    failed.append(str(source))
+        return packs, failed
+    
+    def forget(self, sources: List[Path]):
+        """丢弃这些来源已解析的皮肤包（例如来源文件已被删除）"""
+        paths = {str(Path(source).resolve()) for source in sources}
+        with self._lock:
+            for key in [key for key in self._packs if key[0] in paths]:
+                del self._packs[key]
+    
+    def run_job(self, job: Dict) -> Dict:
+        """执行单个合并任务，返回任务摘要"""
+        start = time.perf_counter()
+        summary = {'output': job.get('output'), 'status': 'ok'}
+        metrics = Metrics(self.metrics_mode, stream=self.metrics_stream,
+                          labels={'job': job.get('output')})
+        try:
+            # 不含 skins.json 的目录会递归查找其中的皮肤包
+            sources = PackIndexer.expand_sources([Path(source) for source in job.get('sources') or []])
+            if not sources:
+                raise ValueError("任务缺少 sources")
+            if not job.get('output'):
+                raise ValueError("任务缺少 output")
+            output_path = Path(job['output'])
+            output_format = job.get('format', 'zip')
+            if output_format not in ('zip', 'json'):
+                raise ValueError(f"不支持的输出格式: {output_format}")
+            
+            merger = SkinPackMerger(job.get('name') or "MergedSkinPack",
+                                    job.get('display_name') or "合并皮肤包",
+                                    cache=self.cache, metrics=metrics,
+                                    low_memory=bool(job.get('low_memory')))
+            merger.texture_hasher = self.texture_hasher
+            merger.texture_inspector = self.texture_inspector
+            merger.png_optimizer = self.png_optimizer
+            merger.fix_visible_bounds = not job.get('keep_bounds')
+            merger.rename_strategy = job.get('rename_strategy') or 'suffix'
+            shard_limits = {key: job.get(key) for key in ('max_skins', 'max_bytes', 'max_geometries')}
+            
+            if job.get('dry_run'):
+                # 只推算合并结果，不合并也不写入输出
+                merger.loaded_packs, failed = self.load_packs(sources, metrics, low_memory=merger.low_memory)
+                summary['failed_sources'] = failed
+                report = merger.dry_run()
+                MergePlanner.print_report(report)
+                summary['dry_run'] = MergePlanner.counts(report)
+            elif job.get('pipeline'):
+                # 流水线边合并边写入，写入前无法整体优化、检查纹理或分包，不支持的选项直接报错
+                conflicts = [option for option in ('optimize_png', 'validate', 'strict') if job.get(option)]
+                conflicts += [key for key, value in shard_limits.items() if value]
+                if output_format != 'zip':
+                    conflicts.append(f"format={output_format}")
+                if conflicts:
+                    raise ValueError(f"流水线模式只支持单个ZIP输出，不能与这些选项同时使用: {', '.join(conflicts)}")
+                failed = []
+                summary['failed_sources'] = failed
+                result = merger.run_pipeline(sources, output_path, workers=self.workers,
+                                             fast=bool(job.get('fast')), compact=bool(job.get('compact')),
+                                             failed_sources=failed)
+                summary['output_bytes'] = output_path.stat().st_size
+                summary['stats'] = result['stats']
+            else:
+                merger.loaded_packs, failed = self.load_packs(sources, metrics, low_memory=merger.low_memory)
+                summary['failed_sources'] = failed
+                
+                result = merger.merge_skin_packs()
+                if job.get('validate') or job.get('strict'):
+                    report = merger.validate_textures(result)
+                    summary['validation'] = {key: value if key == 'checked' else len(value)
+                                             for key, value in report.items()}
+                    if job.get('strict') and (report['missing'] or report['corrupt']):
+                        raise ValueError(f"纹理检查未通过: 缺失 {len(report['missing'])}，损坏 {len(report['corrupt'])}")
+                if output_format == 'zip' and any(shard_limits.values()):
+                    shard_paths = merger.save_as_shards(result, output_path, ShardPlanner(**shard_limits),
+                                                        workers=self.workers, fast=bool(job.get('fast')),
+                                                        compact=bool(job.get('compact')),
+                                                        optimize_png=bool(job.get('optimize_png')))
+                    summary['shards'] = [str(path) for path in shard_paths]
+                    summary['output_bytes'] = sum(path.stat().st_size for path in shard_paths)
+                elif output_format == 'zip':
+                    merger.save_as_zip(result, output_path, workers=self.workers,
+                                       fast=bool(job.get('fast')), compact=bool(job.get('compact')),
+                                       optimize_png=bool(job.get('optimize_png')))
+                    summary['output_bytes'] = output_path.stat().st_size
+                else:
+                    merger.save_json_files(result, output_path, compact=bool(job.get('compact')))
+                summary['stats'] = result['stats']
+        except Exception as e:
+            print(f"❌ 任务失败: {job.get('output')} - {e}")
+            summary['status'] = 'error'
+            summary['error'] = str(e)
+        summary['seconds'] = round(time.perf_counter() - start, 3)
+        summary['metrics'] = metrics.snapshot()
+        metrics.report()
+        return summary
+    
+    def run(self, jobs: List[Dict], concurrent: int = 1) -> Dict:
+        """执行全部任务；concurrent > 1 时并发执行，摘要仍按任务顺序排列"""
+        start = time.perf_counter()
+        if concurrent > 1 and len(jobs) > 1:
+            with ThreadPoolExecutor(max_workers=concurrent) as executor:
+                results = list(executor.map(self.run_job, jobs))
+        else:
+            results = [self.run_job(job) for job in jobs]
+        return {
+            'jobs': results,
+            'ok': sum(1 for result in results if result['status'] == 'ok'),
+            'failed': sum(1 for result in results if result['status'] != 'ok'),
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+    
+    @staticmethod
+    def load_job_file(job_file: Path) -> Tuple[List[Dict], Dict]:
+        """读取任务文件，返回 (任务列表, 全局选项)
+        
+        任务文件可以是任务列表，也可以是 {"jobs": [...], "workers": N, "concurrent": N}。
+        任务中的相对路径相对于任务文件所在目录解析。
+        """
+        data = JSONCleaner.load_json_file(job_file)
+        options = {}
+        if isinstance(data, dict):
+            options = {key: value for key, value in data.items() if key != 'jobs'}
+            data = data.get('jobs', [])
+        if not isinstance(data, list):
+            raise ValueError("任务文件格式错误: jobs 必须是列表")
+        
+        base_dir = job_file.parent
+        jobs = []
+        for job in data:
+            job = dict(job)
+            job['sources'] = [str(base_dir / source) for source in job.get('sources') or []]
+            if job.get('output'):
+                job['output'] = str(base_dir / job['output'])
+            jobs.append(job)
+        return jobs, options
+
+
+class InotifyWatcher:
+    """通过 ctypes 调用 Linux inotify 监视目录树，不可用时由调用方改用轮询"""
+    
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+                  | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self._get_errno(), "inotify_init1 失败")
+        self.paths: Dict[int, str] = {}
+    
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            import ctypes
+            import ctypes.util
+            return hasattr(ctypes.CDLL(ctypes.util.find_library('c')), 'inotify_init1')
+        except (ImportError, OSError):
+            return False
+    
+    def add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(self._get_errno(), f"无法监视: {path}")
+        self.paths[wd] = path
+    
+    def add_tree(self, root: str):
+        """监视 root 及其所有子目录"""
+        for directory, subdirs, _ in os.walk(root):
+            subdirs[:] = [name for name in subdirs if not name.startswith('.')]
+            try:
+                self.add_watch(directory)
+            except OSError:
+                continue
+    
+    def read_events(self, timeout: Optional[float]) -> Optional[List[Tuple[str, int]]]:
+        """等待并读取事件，返回 [(路径, 掩码)]；事件队列溢出时返回 None"""
+        import select
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + self.EVENT_HEADER.size <= len(data):
+                wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                name = data[pos:pos + name_length].rstrip(b'\0')
+                pos += name_length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                if mask & self.IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                directory = self.paths.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(path)
+                events.append((path, mask))
+        return events
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PackWatcher:
+    """监视源目录，皮肤包变化时增量重新生成合并包
+    
+    只重新解析发生变化的皮肤包；未变化的纹理直接从上一次的输出中复制已压缩的数据，
+    新的ZIP先写入临时文件，完成后原子替换输出文件。
+    Linux 上使用 inotify，其他平台按修改时间轮询：每次只比较 os.scandir 得到的大小和修改时间，
+    有变化的皮肤包才计算带内容哈希的指纹。未变化的几何模型沿用上一次的分析结果。
+    """
+    
+    def __init__(self, roots: List[Path], output_path: Path, package_name: str = "MergedSkinPack",
+                 display_name: str = "合并皮肤包", cache: Optional[PackCache] = None,
+                 workers: Optional[int] = None, fast: bool = False, compact: bool = False,
+                 metrics: Optional[Metrics] = None, low_memory: bool = False):
+        self.roots = [Path(root) for root in roots]
+        self.output_path = Path(output_path)
+        self.workers = workers
+        self.fast = fast
+        self.compact = compact
+        self.merger = SkinPackMerger(package_name, display_name, cache=cache, metrics=metrics,
+                                     low_memory=low_memory)
+        # 皮肤包路径 -> (指纹, SkinPackInfo)，按路径顺序合并
+        self.packs: Dict[Path, Tuple[str, SkinPackInfo]] = {}
+        # 皮肤包路径 -> 只含大小和修改时间的签名，轮询时先比较它
+        self._signatures: Dict[Path, str] = {}
+        self.merger.geometry_analysis_memo = {}
+        # 上次输出中每个纹理条目对应的来源缓存键，用于复用已压缩的数据
+        self._written_textures: Dict[str, Tuple] = {}
+    
+    def discover(self) -> List[Path]:
+        # 输出文件本身也包含 skins.json，不能当作源皮肤包
+        outputs = {self.output_path.resolve(), self.output_path.with_name(self.output_path.name + '.tmp').resolve()}
+        return [path for path in PackIndexer.expand_sources(self.roots)
+                if path.exists() and path.resolve() not in outputs]
+    
+    def find_pack(self, path: str) -> Optional[Path]:
+        """找到事件路径所属的皮肤包（路径本身或其上级目录）"""
+        candidate = Path(path)
+        for candidate in (candidate, *candidate.parents):
+            if candidate in self.packs:
+                return candidate
+            if any(candidate == root for root in self.roots):
+                break
+        return None
+    
+    def refresh(self, affected: Optional[Set[Path]] = None) -> int:
+        """更新皮肤包列表，返回变化的皮肤包数量
+        
+        affected 为 None 时重新查找并检查全部皮肤包，否则只检查 affected 中的皮肤包。
+        """
+        if affected is None:
+            pack_paths = self.discover()
+        else:
+            pack_paths = [path for path in self.packs if path.exists()]
+        changed = 0
+        reload_paths = []
+        for path in pack_paths:
+            if affected is not None and path in self.packs and path not in affected:
+                continue
+            try:
+                signature = PackCache.fingerprint(path, content=False)
+                if path in self.packs and self._signatures.get(path) == signature:
+                    continue
+                fingerprint = PackCache.fingerprint(path)
+            except OSError:
+                continue
+            if path in self.packs and self.packs[path][0] == fingerprint:
+                # 只是修改时间变了，内容没有变化
+                self._signatures[path] = signature
+                continue
+            reload_paths.append((path, signature, fingerprint))
+        
+        if reload_paths:
+            self.merger.loaded_packs = []
+            flags = self.merger.load_skin_pack_folders([path for path, _, _ in reload_paths], workers=self.workers,
+                                                       fingerprints=[fingerprint for _, _, fingerprint in reload_paths])
+            loaded = iter(self.merger.loaded_packs)
+            for (path, signature, _), ok in zip(reload_paths, flags):
+                if ok:
+                    pack_info = next(loaded)
+                    self.packs[path] = (pack_info.fingerprint, pack_info)
+                    self._signatures[path] = signature
+                    changed += 1
+                elif path in self.packs:
+                    # 可能正在编辑中，先保留上一次成功读取的版本
+                    print(f"⚠️  保留上一次的版本: {path}")
+        
+        current = set(pack_paths)
+        for path in [path for path in self.packs if path not in current]:
+            print(f"🗑️  皮肤包已移除: {path}")
+            del self.packs[path]
+            self._signatures.pop(path, None)
+            changed += 1
+        return changed
+    
+    def rebuild(self) -> Dict:
+        """合并并原子替换输出文件，返回统计信息"""
+        start = time.perf_counter()
+        self.merger.loaded_packs = [self.packs[path][1] for path in sorted(self.packs)]
+        if not self.merger.loaded_packs:
+            print("⚠️  没有可合并的皮肤包")
+            return {}
+        result = self.merger.merge_skin_packs()
+        
+        # 来源未变化的纹理直接引用上一次输出中的条目，写入时复用已压缩的数据
+        texture_keys = {}
+        textures = {}
+        reused = 0
+        for name, source in result['textures'].items():
+            try:
+                key = TextureHasher.cache_key(source)
+            except OSError:
+                key = None
+            texture_keys[name] = key
+            if key is not None and self._written_textures.get(name) == key:
+                textures[name] = ArchiveMember(self.output_path, name)
+                reused += 1
+            else:
+                textures[name] = source
+        
+        tmp_path = self.output_path.with_name(self.output_path.name + '.tmp')
+        self.merger.save_as_zip(dict(result, textures=textures), tmp_path, workers=self.workers,
+                                fast=self.fast, compact=self.compact)
+        os.replace(tmp_path, self.output_path)
+        self._written_textures = {name: key for name, key in texture_keys.items() if key is not None}
+        
+        seconds = time.perf_counter() - start
+        print(f"🔁 已更新 {self.output_path} ({len(self.merger.loaded_packs)} 个皮肤包，"
+              f"复用 {reused}/{len(textures)} 个纹理，用时 {seconds:.2f} 秒)")
+        return result['stats']
+    
+    def _wait_quiet_inotify(self, watcher: InotifyWatcher, events: List, debounce: float) -> Optional[List]:
+        """持续收集事件直到 debounce 秒内没有新事件"""
+        while True:
+            more = watcher.read_events(debounce)
+            if more is None:
+                return None
+            if not more:
+                return events
+            events.extend(more)
+    
+    def run(self, poll: bool = False, interval: float = 1.0, debounce: float = 0.5):
+        """监视直到 Ctrl+C"""
+        self.refresh()
+        self.rebuild()
+        
+        watcher = None
+        if not poll and InotifyWatcher.available():
+            try:
+                watcher = InotifyWatcher()
+                for root in self.roots:
+                    watcher.add_tree(str(root if root.is_dir() else root.parent))
+            except OSError as e:
+                print(f"⚠️  inotify 不可用，改为轮询: {e}")
+                if watcher is not None:
+                    watcher.close()
+                watcher = None
+        print(f"👀 正在监视 {len(self.roots)} 个目录 ({'inotify' if watcher else f'轮询 {interval} 秒'})，"
+              f"按 Ctrl+C 停止")
+        
+        try:
+            while True:
+                if watcher is not None:
+                    events = watcher.read_events(None)
+                    if events is not None and not events:
+                        continue
+                    if events is not None:
+                        events = self._wait_quiet_inotify(watcher, events, debounce)
+                    if events is None:
+                        # 事件队列溢出，回退为全量检查
+                        affected = None
+                    else:
+                        affected = {self.find_pack(path) for path, _ in events}
+                        # 不属于任何已知皮肤包的事件可能是新增的皮肤包，需要重新查找
+                        if None in affected:
+                            affected = None
+                else:
+                    time.sleep(interval)
+                    affected = None
+                    if not self.refresh():
+                        continue
+                    # 等待连续修改结束后再重新生成
+                    time.sleep(debounce)
+                    self.refresh()
+                    self.rebuild_safely()
+                    continue
+                
+                if self.refresh(affected):
+                    self.rebuild_safely()
+        except KeyboardInterrupt:
+            print("\n👋 已停止监视")
+        finally:
+            if watcher is not None:
+                watcher.close()
+    
+    def rebuild_safely(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"❌ 重新生成失败: {e}")
+
+
+class MergeService:
+    """本地合并服务，供网页前端把大批量合并交给本机处理
+    
+    接口（除下载结果外均为JSON）：
+      POST   /uploads            请求体为 .mcpack/.zip 文件（文件名放在 X-Filename 头），返回 {'id'}
+      DELETE /uploads/<id>       删除上传的文件
+      POST   /jobs               {'uploads': [...], 'sources': [...], 'name', 'display_name', ...}，
+                                 上传的皮肤包按顺序排在 sources 之前合并
+      GET    /jobs/<id>          任务状态：queued / running / done / failed，完成后附带摘要
+      GET    /jobs/<id>/result   以分块传输返回合并后的ZIP
+      DELETE /jobs/<id>          删除任务及其输出
+      GET    /health
+    任务排队后由固定数量的工作线程通过 BatchRunner.run_job 执行，已解析的皮肤包、纹理哈希
+    和 PackCache 在请求之间共享。sources 只能引用 roots 下的路径，未指定 roots 时只能使用上传的文件。
+    
+    每个请求都必须在 X-Merge-Token 头中带上启动时生成（或指定）的令牌，否则任意网页都能提交
+    roots 下的皮肤包并下载结果。跨域响应头只发给 allowed_origins 中的来源。
+    """
+    
+    # 请求中可以指定的合并选项（输出固定为单个ZIP）
+    JOB_OPTIONS = ('name', 'display_name', 'fast', 'compact', 'pipeline', 'optimize_png',
+                   'validate', 'strict', 'rename_strategy', 'keep_bounds')
+    # 保留的已结束任务数量，超出时删除最早的任务及其输出
+    MAX_FINISHED_JOBS = 32
+    CHUNK_SIZE = 256 * 1024
+    
+    def __init__(self, work_dir: Path, roots: Optional[List[Path]] = None, jobs: int = 1,
+                 workers: Optional[int] = None, cache: Optional[PackCache] = None,
+                 max_upload: int = 512 * 1024 * 1024, token: Optional[str] = None,
+                 allowed_origins: Optional[List[str]] = None):
+        self.work_dir = Path(work_dir)
+        self.token = token or secrets.token_urlsafe(24)
+        self.allowed_origins = set(allowed_origins or [])
+        (self.work_dir / 'uploads').mkdir(parents=True, exist_ok=True)
+        (self.work_dir / 'jobs').mkdir(parents=True, exist_ok=True)
+        self.roots = [Path(root).resolve() for root in roots or []]
+        self.max_upload = max_upload
+        self.runner = BatchRunner(workers=workers, cache=cache, metrics_mode='quiet')
+        self.executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+        # 任务ID -> 状态字典，按提交顺序排列
+        self.jobs: Dict[str, Dict] = {}
+        self.uploads: Dict[str, Path] = {}
+        self._lock = threading.Lock()
+    
+    def save_upload(self, stream, length: int, filename: str = '') -> str:
+        """把上传的压缩包写入工作目录，返回上传ID"""
+        if length > self.max_upload:
+            raise ValueError(f"上传文件过大: {length} 字节（上限 {self.max_upload}）")
+        suffix = Path(filename).suffix.lower()
+        if suffix not in ARCHIVE_EXTENSIONS:
+            suffix = '.mcpack'
+        upload_id = uuid.uuid4().hex
+        path = self.work_dir / 'uploads' / f"{upload_id}{suffix}"
+        remaining = length
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                chunk = stream.read(min(self.CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining or not PackIndexer.archive_has_skins(path):
+            path.unlink()
+            raise ValueError("上传内容不完整或不是包含 skins.json 的皮肤包")
+        with self._lock:
+            self.uploads[upload_id] = path
+        return upload_id
+    
+    def delete_upload(self, upload_id: str) -> bool:
+        with self._lock:
+            path = self.uploads.pop(upload_id, None)
+        if path is None:
+            return False
+        self.runner.forget([path])
+        with contextlib.suppress(OSError):
+            path.unlink()
+        return True
+    
+    def _resolve_sources(self, request: Dict) -> List[str]:
+        sources = []
+        with self._lock:
+            for upload_id in request.get('uploads') or []:
+                if upload_id not in self.uploads:
+                    raise ValueError(f"未知的上传ID: {upload_id}")
+                sources.append(str(self.uploads[upload_id]))
+        for source in request.get('sources') or []:
+            path = Path(source).resolve()
+            if not any(path == root or root in path.parents for root in self.roots):
+                raise ValueError(f"不允许访问的路径: {source}")
+            sources.append(str(path))
+        if not sources:
+            raise ValueError("没有指定皮肤包")
+        return sources
+    
+    def submit(self, request: Dict) -> Dict:
+        """登记并排队一个合并任务，返回任务状态"""
+        job = {key: request[key] for key in self.JOB_OPTIONS if key in request}
+        if job.get('rename_strategy') not in (None, *NameAllocator.STRATEGIES):
+            raise ValueError(f"未知的重命名策略: {job['rename_strategy']}")
+        job_id = uuid.uuid4().hex
+        job_dir = self.work_dir / 'jobs' / job_id
+        job.update(sources=self._resolve_sources(request), output=str(job_dir / 'merged.zip'),
+                   format='zip', low_memory=True)
+        state = {'id': job_id, 'status': 'queued', 'submitted': time.time()}
+        with self._lock:
+            self.jobs[job_id] = state
+        job_dir.mkdir(parents=True, exist_ok=True)
+        self.executor.submit(self._run, job_id, job)
+        return dict(state)
+    
+    def _run(self, job_id: str, job: Dict):
+        with self._lock:
+            state = self.jobs.get(job_id)
+            if state is None:
+                return
+            state['status'] = 'running'
+        summary = self.runner.run_job(job)
+        summary.pop('output', None)
+        summary.pop('metrics', None)
+        with self._lock:
+            state.update(status='done' if summary['status'] == 'ok' else 'failed', summary=summary,
+                         finished=time.time())
+            self._evict_finished()
+    
+    def _evict_finished(self):
+        finished = [job_id for job_id, state in self.jobs.items() if 'finished' in state]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+            shutil.rmtree(self.work_dir / 'jobs' / job_id, ignore_errors=True)
+    
+    def status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            state = self.jobs.get(job_id)
+            return dict(state) if state is not None else None
+    
+    def result_path(self, job_id: str) -> Optional[Path]:
+        """已完成任务的输出文件，任务不存在或未完成时返回 None"""
+        state = self.status(job_id)
+        if state is None or state['status'] != 'done':
+            return None
+        return self.work_dir / 'jobs' / job_id / 'merged.zip'
+    
+    def delete_job(self, job_id: str) -> bool:
+        with self._lock:
+            state = self.jobs.get(job_id)
+            if state is None or state['status'] in ('queued', 'running'):
+                return False
+            del self.jobs[job_id]
+        shutil.rmtree(self.work_dir / 'jobs' / job_id, ignore_errors=True)
+        return True
+    
+    def authorized(self, token: Optional[str]) -> bool:
+        return token is not None and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+    
+    def make_server(self, host: str = '127.0.0.1', port: int = 8765) -> 'ThreadingHTTPServer':
+        server = ThreadingHTTPServer((host, port), MergeRequestHandler)
+        server.service = self
+        return server
+    
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class MergeRequestHandler(BaseHTTPRequestHandler):
+    """MergeService 的HTTP请求处理"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    @property
+    def service(self) -> MergeService:
+        return self.server.service
+    
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+    
+    def _send_cors_headers(self):
+        # 只允许指定的前端来源跨域访问（从本地文件打开的页面来源为 "null"）
+        origin = self.headers.get('Origin')
+        if origin is None or origin not in self.service.allowed_origins:
+            return
+        self.send_header('Access-Control-Allow-Origin', origin)
+        self.send_header('Vary', 'Origin')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Filename, X-Merge-Token')
+    
+    def _check_token(self) -> bool:
+        """校验令牌，失败时直接返回 401"""
+        if self.service.authorized(self.headers.get('X-Merge-Token')):
+            return True
+        # 未读取的请求体不能留在连接中
+        self.close_connection = True
+        self._send_json(401, {'error': "缺少或错误的 X-Merge-Token"})
+        return False
+    
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self._send_cors_headers()
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _route(self) -> List[str]:
+        return [part for part in self.path.split('?', 1)[0].split('/') if part]
+    
+    def _content_length(self) -> Optional[int]:
+        try:
+            return int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            return None
+    
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_GET(self):
+        if not self._check_token():
+            return
+        route = self._route()
+        if route == ['health']:
+            self._send_json(200, {'status': 'ok', 'jobs': len(self.service.jobs)})
+        elif len(route) == 2 and route[0] == 'jobs':
+            state = self.service.status(route[1])
+            if state is None:
+                self._send_json(404, {'error': "任务不存在"})
+            else:
+                self._send_json(200, state)
+        elif len(route) == 3 and route[0] == 'jobs' and route[2] == 'result':
+            self._send_result(route[1])
+        else:
+            self._send_json(404, {'error': "未知的接口"})
+    
+    def _send_result(self, job_id: str):
+        path = self.service.result_path(job_id)
+        if path is None:
+            state = self.service.status(job_id)
+            self._send_json(404 if state is None else 409,
+                            {'error': "任务不存在" if state is None else f"任务状态为 {state['status']}"})
+            return
+        self.send_response(200)
+        self._send_cors_headers()
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', 'attachment; filename="merged.mcpack"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(MergeService.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.wfile.write(b'%X\r\n%s\r\n' % (len(chunk), chunk))
+        self.wfile.write(b'0\r\n\r\n')
+    
+    def do_POST(self):
+        if not self._check_token():
+            return
+        route = self._route()
+        length = self._content_length()
+        if length is None:
+            self._send_json(411, {'error': "需要 Content-Length"})
+            self.close_connection = True
+            return
+        try:
+            if route == ['uploads']:
+                upload_id = self.service.save_upload(self.rfile, length, self.headers.get('X-Filename', ''))
+                self._send_json(201, {'id': upload_id})
+            elif route == ['jobs']:
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(request, dict):
+                    raise ValueError("请求必须是JSON对象")
+                self._send_json(202, self.service.submit(request))
+            else:
+                self.rfile.read(length)
+                self._send_json(404, {'error': "未知的接口"})
+        except ValueError as e:
+            # 上传失败时请求体可能没有读完，不能继续复用连接
+            self.close_connection = True
+            self._send_json(400, {'error': str(e)})
+    
+    def do_DELETE(self):
+        if not self._check_token():
+            return
+        route = self._route()
+        if len(route) == 2 and route[0] == 'jobs':
+            deleted = self.service.delete_job(route[1])
+        elif len(route) == 2 and route[0] == 'uploads':
+            deleted = self.service.delete_upload(route[1])
+        else:
+            self._send_json(404, {'error': "未知的接口"})
+            return
+        if deleted:
+            self._send_json(200, {'deleted': route[1]})
+        else:
+            self._send_json(409 if route[0] == 'jobs' and self.service.status(route[1]) else 404,
+                            {'error': "无法删除（不存在或任务未结束）"})
+
+
+class SyntheticPackGenerator:
+    """合成皮肤包生成器，用于基准测试
+    
+    collision_rate 为皮肤名称、几何模型ID和纹理文件名与其他皮肤包冲突的比例；
+    冲突项中约一半内容与其他包相同（触发去重），其余内容不同（触发重命名）。
+    每五个皮肤包中有一个使用旧版几何模型格式，以覆盖格式转换。
+    """
+    
+    def __init__(self, skins_per_pack: int = 8, geometries_per_pack: int = 2, bones_per_geometry: int = 6,
+                 cubes_per_bone: int = 3, texture_size: int = 64, comments: bool = True,
+                 collision_rate: float = 0.3, seed: int = 0):
+        self.skins_per_pack = skins_per_pack
+        self.geometries_per_pack = max(1, geometries_per_pack)
+        self.bones_per_geometry = bones_per_geometry
+        self.cubes_per_bone = cubes_per_bone
+        self.texture_size = texture_size
+        self.comments = comments
+        self.collision_rate = collision_rate
+        self.seed = seed
+    
+    def config(self) -> Dict:
+        """生成参数，保存在基准测试结果中用于对比"""
+        return {
+            'skins_per_pack': self.skins_per_pack,
+            'geometries_per_pack': self.geometries_per_pack,
+            'bones_per_geometry': self.bones_per_geometry,
+            'cubes_per_bone': self.cubes_per_bone,
+            'texture_size': self.texture_size,
+            'comments': self.comments,
+            'collision_rate': self.collision_rate,
+            'seed': self.seed
+        }
+    
+    @staticmethod
+    def make_png(width: int, height: int, seed: int) -> bytes:
+        """生成指定尺寸的 RGBA PNG，内容由 seed 决定"""
+        rng = random.Random(seed)
+        # 少量不同的行循环使用，压缩特性接近真实皮肤贴图
+        rows = [b'\x00' + rng.randbytes(width * 4) for _ in range(8)]
+        raw = b''.join(rows[y % len(rows)] for y in range(height))
+        
+        def chunk(chunk_type: bytes, data: bytes) -> bytes:
+            return (struct.pack('>I', len(data)) + chunk_type + data
+                    + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+        
+        return (b'\x89PNG\r\n\x1a\n'
+                + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(raw, 6))
+                + chunk(b'IEND', b''))
+    
+    def _bones(self, variant: int) -> List[Dict]:
+        return [{
+            'name': f'bone_{b}',
+            'pivot': [0, b, 0],
+            'cubes': [{'origin': [c, b, -2], 'size': [4, 4, 4 + variant], 'uv': [(c * 4) % self.texture_size, b % 16]}
+                      for c in range(self.cubes_per_bone)]
+        } for b in range(self.bones_per_geometry)]
+    
+    def _add_comments(self, text: str, marker: str) -> str:
+        """加入行注释、块注释和末尾多余的逗号"""
+        if not self.comments:
+            return text
+        text = text.replace(f'"{marker}": [', f'"{marker}": [ /* {marker} */', 1)
+        return f'// generated skin pack\n{text[:-2]},\n}}'
+    
+    def _pick(self, rng: random.Random, pack_index: int) -> Tuple[bool, int]:
+        """返回 (是否与其他包冲突, 内容变体)"""
+        if rng.random() < self.collision_rate:
+            return True, rng.randrange(2)
+        return False, pack_index + 2
+    
+    def write_pack(self, pack_dir: Path, pack_index: int):
+        """生成单个皮肤包文件夹"""
+        rng = random.Random(self.seed * 1000003 + pack_index)
+        pack_dir.mkdir(parents=True, exist_ok=True)
+        legacy_format = pack_index % 5 == 4
+        
+        geometry_ids = []
+        geometries = []
+        for g in range(self.geometries_per_pack):
+            shared, variant = self._pick(rng, pack_index)
+            identifier = f"geometry.shared_{g}" if shared else f"geometry.pack{pack_index}_{g}"
+            geometry_ids.append(identifier)
+            geometries.append((identifier, self._bones(variant)))
+        
+        if legacy_format:
+            geometry_doc = {'format_version': '1.8.0'}
+            for identifier, bones in geometries:
+                geometry_doc[identifier] = {'texturewidth': self.texture_size,
+                                            'textureheight': self.texture_size, 'bones': bones}
+            geometry_text = json.dumps(geometry_doc, indent=2)
+            if self.comments:
+                geometry_text = f'// legacy geometry\n{geometry_text[:-2]},\n}}'
+        else:
+            geometry_doc = {'format_version': '1.12.0', 'minecraft:geometry': [
+                {'description': {'identifier': identifier, 'texture_width': self.texture_size,
+                                 'texture_height': self.texture_size},
+                 'bones': bones} for identifier, bones in geometries]}
+            geometry_text = self._add_comments(json.dumps(geometry_doc, indent=2), 'minecraft:geometry')
+        (pack_dir / 'geometry.json').write_text(geometry_text, encoding='utf-8')
+        
+        skins = []
+        for k in range(self.skins_per_pack):
+            shared, variant = self._pick(rng, pack_index)
+            texture_name = f"skin_{k}.png" if shared else f"pack{pack_index}_skin_{k}.png"
+            (pack_dir / texture_name).write_bytes(
+                self.make_png(self.texture_size, self.texture_size, self.seed * 7919 + k * 31 + variant))
+            skins.append({
+                'localization_name': f"Skin {k}" if shared else f"Pack{pack_index} Skin {k}",
+                'geometry': geometry_ids[k % len(geometry_ids)],
+                'texture': texture_name,
+                'type': 'free'
+            })
+        skins_doc = {
+            'skins': skins,
+            'serialize_name': f"SyntheticPack{pack_index}",
+            'localization_name': f"SyntheticPack{pack_index}",
+            # 字符串中的 // 不能被当作注释
+            'source': f"https://example.com/packs/{pack_index}"
+        }
+        (pack_dir / 'skins.json').write_text(self._add_comments(json.dumps(skins_doc, indent=2), 'skins'),
+                                             encoding='utf-8')
+        (pack_dir / 'manifest.json').write_text(json.dumps({
+            'format_version': 1,
+            'header': {'name': f"SyntheticPack{pack_index}", 'version': [1, 0, 0]}
+        }, indent=2), encoding='utf-8')
+        
+        # 本地化文件：都有 en_US，偶数编号的皮肤包还有 zh_CN
+        texts_dir = pack_dir / PackIndexer.LANG_DIR
+        texts_dir.mkdir(exist_ok=True)
+        locales = ['en_US', 'zh_CN'] if pack_index % 2 == 0 else ['en_US']
+        for locale in locales:
+            label = "皮肤" if locale == 'zh_CN' else "Skin"
+            lines = [f"## {locale}", f"skinpack.{skins_doc['serialize_name']}=Synthetic Pack {pack_index}"]
+            lines += [f"skin.{skins_doc['serialize_name']}.{skin['localization_name']}={label} {pack_index}-{k}"
+                      for k, skin in enumerate(skins)]
+            (texts_dir / f"{locale}.lang").write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        (texts_dir / 'languages.json').write_text(json.dumps(locales), encoding='utf-8')
+    
+    def generate(self, output_dir: Path, pack_count: int) -> List[Path]:
+        """在 output_dir 下生成 pack_count 个皮肤包文件夹，返回文件夹列表"""
+        output_dir = Path(output_dir)
+        pack_dirs = [output_dir / f"pack_{i:04d}" for i in range(pack_count)]
+        for i, pack_dir in enumerate(pack_dirs):
+            self.write_pack(pack_dir, i)
+        return pack_dirs
+
+
+class MergeBenchmark:
+    """合并流程基准测试：加载、合并、保存ZIP、保存JSON
+    
+    每个规模的皮肤包只生成一次。耗时取 repeat 轮中的最短值，峰值内存在额外一轮中
+    用 tracemalloc 测量（只统计主进程，并行加载的工作进程不计入）。
+    """
+    
+    STAGES = ('load', 'merge', 'save_as_zip', 'save_json_files')
+    # 低于这些差值的变化视为噪声，不算退化
+    MIN_SECONDS_DELTA = 0.005
+    MIN_BYTES_DELTA = 1024 * 1024
+    
+    def __init__(self, generator: Optional[SyntheticPackGenerator] = None, workers: Optional[int] = None,
+                 repeat: int = 1):
+        self.generator = generator or SyntheticPackGenerator()
+        self.workers = workers
+        self.repeat = max(1, repeat)
+    
+    def run_once(self, pack_dirs: List[Path], output_dir: Path, trace_memory: bool = False) -> Dict:
+        """执行一轮完整流程，返回各阶段的 (耗时, 峰值内存)"""
+        results = {}
+        
+        def measure(stage: str, func):
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                return func()
+            finally:
+                seconds = time.perf_counter() - start
+                peak = None
+                if trace_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                results[stage] = (seconds, peak)
+        
+        merger = SkinPackMerger(metrics=Metrics('quiet'))
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            measure('load', lambda: merger.load_skin_pack_folders(pack_dirs, workers=self.workers))
+            merged = measure('merge', merger.merge_skin_packs)
+            measure('save_as_zip', lambda: merger.save_as_zip(merged, output_dir / 'benchmark.zip',
+                                                              workers=self.workers))
+            measure('save_json_files', lambda: merger.save_json_files(merged, output_dir / 'benchmark_json'))
+        return results
+    
+    def run(self, pack_counts: List[int], work_dir: Optional[Path] = None) -> Dict:
+        """对每个规模执行基准测试，返回可直接保存为基准线的结果"""
+        import tempfile
+        with contextlib.ExitStack() as stack:
+            if work_dir is None:
+                work_dir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='skinpack-bench-')))
+            work_dir = Path(work_dir)
+            
+            results = {}
+            for pack_count in pack_counts:
+                print(f"🧪 生成 {pack_count} 个合成皮肤包...")
+                pack_dirs = self.generator.generate(work_dir / f"packs_{pack_count}", pack_count)
+                output_dir = work_dir / f"output_{pack_count}"
+                output_dir.mkdir(exist_ok=True)
+                
+                best = {stage: float('inf') for stage in self.STAGES}
+                for _ in range(self.repeat):
+                    for stage, (seconds, _) in self.run_once(pack_dirs, output_dir).items():
+                        best[stage] = min(best[stage], seconds)
+                peaks = self.run_once(pack_dirs, output_dir, trace_memory=True)
+                
+                results[str(pack_count)] = {
+                    stage: {'seconds': round(best[stage], 6), 'peak_bytes': peaks[stage][1]}
+                    for stage in self.STAGES
+                }
+                for stage in self.STAGES:
+                    entry = results[str(pack_count)][stage]
+                    print(f"📊 {pack_count:>5} 包 | {stage:<16} {entry['seconds'] * 1000:>10.1f} ms | "
+                          f"峰值内存 {entry['peak_bytes'] / (1024 * 1024):>8.1f} MB")
+        
+        return {
+            'config': self.generator.config(),
+            'workers': self.workers,
+            'python': sys.version.split()[0],
+            'json_backend': JSON_BACKEND[0],
+            'results': results
+        }
+    
+    @classmethod
+    def compare(cls, current: Dict, baseline: Dict, tolerance: float = 0.25) -> List[str]:
+        """与基准线对比，返回退化项说明；耗时或峰值内存超过基准线 (1 + tolerance) 倍视为退化"""
+        if current.get('config') != baseline.get('config'):
+            print("⚠️  基准线的生成参数与本次不同，对比结果仅供参考")
+        
+        regressions = []
+        for pack_count, stages in current['results'].items():
+            base_stages = baseline.get('results', {}).get(pack_count)
+            if not base_stages:
+                continue
+            for stage, entry in stages.items():
+                base = base_stages.get(stage)
+                if not base:
+                    continue
+                seconds, base_seconds = entry['seconds'], base['seconds']
+                if (seconds > base_seconds * (1 + tolerance)
+                        and seconds - base_seconds > cls.MIN_SECONDS_DELTA):
+                    regressions.append(f"{pack_count} 包 {stage}: 耗时 {base_seconds * 1000:.1f} ms -> "
+                                       f"{seconds * 1000:.1f} ms")
+                peak, base_peak = entry.get('peak_bytes'), base.get('peak_bytes')
+                if (peak is not None and base_peak is not None
+                        and peak > base_peak * (1 + tolerance) and peak - base_peak > cls.MIN_BYTES_DELTA):
+                    regressions.append(f"{pack_count} 包 {stage}: 峰值内存 {base_peak / (1024 * 1024):.1f} MB -> "
+                                       f"{peak / (1024 * 1024):.1f} MB")
+        return regressions
+
+
 class InteractiveInterface:
     """交互式界面"""
     
     def __init__(self):
-        self.merger = SkinPackMerger()
+        self.merger = SkinPackMerger(cache=PackCache(), low_memory=True)
         self.merged_result = None
+        # 预演摘要只在皮肤包、纹理哈希或重命名策略变化时重新计算
+        self._preview_key = None
+        self._preview_line = ''
     
     def show_banner(self):
         """显示程序横幅"""
@@ -391,6 +5184,7 @@ class InteractiveInterface:
         print("5. 💾 保存结果")
         print("6. 🗑️  清空已加载列表")
         print("7. 🧹 清屏")
+        print("8. 🗄️  缓存管理")
         print("0. ❌ 退出程序")
         print()
     
@@ -398,7 +5192,8 @@ class InteractiveInterface:
         """输入文件夹路径"""
         while True:
             print("\n📁 添加皮肤包文件夹")
-            print("输入皮肤包文件夹路径 (输入 'q' 返回主菜单):")
+            print("输入皮肤包文件夹或 .mcpack/.zip 文件路径 (输入 'q' 返回主菜单):")
+            print("输入不含 skins.json 的目录时会自动查找其中所有的皮肤包")
             
             folder_input = input("📂 路径: ").strip()
             
@@ -415,11 +5210,16 @@ class InteractiveInterface:
                 print("❌ 文件夹不存在")
                 continue
             
-            if not folder_path.is_dir():
-                print("❌ 路径不是文件夹")
+            is_archive = folder_path.is_file() and folder_path.suffix.lower() in ARCHIVE_EXTENSIONS
+            if not folder_path.is_dir() and not is_archive:
+                print("❌ 路径不是文件夹或 .mcpack/.zip 文件")
+                continue
+            
+            if folder_path.is_dir() and not (folder_path / 'skins.json').exists():
+                self._add_discovered_packs(folder_path)
                 continue
             
-            success = self.merger.load_skin_pack_folder(folder_path)
+            success = self.merger.load_skin_pack(folder_path)
             if success:
                 print(f"✅ 成功添加: {folder_path.name}")
                 input("\n按 Enter 继续...")
@@ -427,6 +5227,20 @@ class InteractiveInterface:
                 print("❌ 添加失败，请检查文件夹是否包含有效的皮肤包")
                 input("\n按 Enter 继续...")
     
+    def _add_discovered_packs(self, root: Path):
+        """递归查找并加载目录下的所有皮肤包"""
+        print(f"🔍 正在查找皮肤包: {root}")
+        pack_paths = PackIndexer.discover(root)
+        if not pack_paths:
+            print("❌ 目录中没有找到包含 skins.json 的皮肤包")
+            input("\n按 Enter 继续...")
+            return
+        
+        print(f"📦 找到 {len(pack_paths)} 个皮肤包")
+        results = self.merger.load_skin_pack_folders(pack_paths)
+        print(f"✅ 成功添加 {sum(results)}/{len(pack_paths)} 个皮肤包")
+        input("\n按 Enter 继续...")
+    
     def show_loaded_packs(self):
         """显示已加载的皮肤包"""
         clear_screen()
@@ -452,6 +5266,7 @@ class InteractiveInterface:
         print("-" * 40)
         print(f"当前包标识符: {self.merger.package_name}")
         print(f"当前显示名称: {self.merger.display_name}")
+        print(f"当前重命名策略: {self.merger.rename_strategy}")
         print()
         
         # 设置包标识符
@@ -466,6 +5281,15 @@ class InteractiveInterface:
             self.merger.display_name = new_display_name
             print(f"✅ 显示名称已更新: {new_display_name}")
         
+        # 设置重命名策略
+        strategies = '/'.join(NameAllocator.STRATEGIES)
+        new_strategy = input(f"🔀 名称冲突时的重命名策略 {strategies} (按 Enter 保持当前): ").strip().lower()
+        if new_strategy in NameAllocator.STRATEGIES:
+            self.merger.rename_strategy = new_strategy
+            print(f"✅ 重命名策略已更新: {new_strategy}")
+        elif new_strategy:
+            print(f"❌ 未知的重命名策略: {new_strategy}")
+        
         input("\n按 Enter 返回主菜单...")
     
     def merge_packs(self):
@@ -488,6 +5312,9 @@ class InteractiveInterface:
             print(f"几何模型: {stats['total_geometries']}")
             print(f"纹理文件: {stats['texture_count']}")
             print(f"源文件夹: {stats['folder_count']}")
+            print()
+            self.merger.validate_textures(self.merged_result)
+            self.merger.metrics.report()
             
         except Exception as e:
             print(f"❌ 合并失败: {e}")
@@ -534,10 +5361,25 @@ class InteractiveInterface:
         if not filename.endswith('.zip'):
             filename += '.zip'
         
+        fast = input("使用快速模式 (压缩率较低，速度更快)? (y/N): ").strip().lower() == 'y'
+        compact = input("使用紧凑JSON格式 (无缩进，文件更小)? (y/N): ").strip().lower() == 'y'
+        optimize_png = input("无损优化PNG纹理 (首次较慢，结果会缓存)? (y/N): ").strip().lower() == 'y'
+        max_skins = input("每个分包最多包含的皮肤数 (按 Enter 不拆分): ").strip()
+        
         try:
             output_path = Path(filename)
-            self.merger.save_as_zip(self.merged_result, output_path)
-            print(f"\n✅ 文件已保存: {output_path.absolute()}")
+            with self.merger.metrics.stage('save'):
+                if max_skins:
+                    shard_paths = self.merger.save_as_shards(self.merged_result, output_path,
+                                                             ShardPlanner(max_skins=int(max_skins)),
+                                                             fast=fast, compact=compact, optimize_png=optimize_png)
+                    for shard_path in shard_paths:
+                        print(f"✅ 文件已保存: {shard_path.absolute()}")
+                else:
+                    self.merger.save_as_zip(self.merged_result, output_path, fast=fast, compact=compact,
+                                            optimize_png=optimize_png)
+                    print(f"\n✅ 文件已保存: {output_path.absolute()}")
+            self.merger.metrics.report()
         except Exception as e:
             print(f"❌ 保存失败: {e}")
         
@@ -554,10 +5396,14 @@ class InteractiveInterface:
         if not dirname:
             dirname = default_dir
         
+        compact = input("使用紧凑JSON格式 (无缩进，文件更小)? (y/N): ").strip().lower() == 'y'
+        
         try:
             output_dir = Path(dirname)
-            self.merger.save_json_files(self.merged_result, output_dir)
+            with self.merger.metrics.stage('save'):
+                self.merger.save_json_files(self.merged_result, output_dir, compact=compact)
             print(f"\n✅ 文件已保存到: {output_dir.absolute()}")
+            self.merger.metrics.report()
         except Exception as e:
             print(f"❌ 保存失败: {e}")
         
@@ -570,11 +5416,52 @@ class InteractiveInterface:
         else:
             count = len(self.merger.loaded_packs)
             self.merger.loaded_packs.clear()
+            self.merger.metrics.reset()
             self.merged_result = None
             print(f"✅ 已清空 {count} 个皮肤包")
         
         input("\n按 Enter 返回主菜单...")
     
+    def manage_cache(self):
+        """查看和清空皮肤包缓存"""
+        clear_screen()
+        cache = self.merger.cache
+        if cache is None:
+            print("❌ 未启用缓存")
+            input("\n按 Enter 返回主菜单...")
+            return
+        
+        stats = cache.stats()
+        print("🗄️  缓存信息:")
+        print("-" * 60)
+        print(f"缓存目录: {stats['cache_dir']}")
+        print(f"条目数量: {stats['entry_count']}")
+        print(f"占用空间: {stats['total_bytes'] / (1024 * 1024):.2f} MB / {stats['max_bytes'] / (1024 * 1024):.0f} MB")
+        print(f"PNG优化缓存: {stats['png_count']} 个文件, {stats['png_bytes'] / (1024 * 1024):.2f} MB")
+        for entry in stats['entries'][:10]:
+            print(f"   {entry['source_path']} ({entry['size'] / 1024:.1f} KB)")
+        if stats['entry_count'] > 10:
+            print(f"   ... 以及另外 {stats['entry_count'] - 10} 个条目")
+        
+        if (stats['entry_count'] or stats['png_count']) and input("\n清空缓存? (y/N): ").strip().lower() == 'y':
+            count = cache.clear()
+            print(f"✅ 已清除 {count} 个缓存条目")
+        
+        input("\n按 Enter 返回主菜单...")
+    
+    def preview_line(self) -> str:
+        """状态栏中的合并预演摘要"""
+        packs = self.merger.loaded_packs
+        key = (tuple((id(pack), pack.fingerprint, len(pack.texture_hashes)) for pack in packs),
+               self.merger.rename_strategy)
+        if key != self._preview_key:
+            self._preview_key = key
+            try:
+                self._preview_line = MergePlanner.describe(self.merger.dry_run()) if packs else ''
+            except Exception as e:
+                self._preview_line = f"预演失败: {e}"
+        return self._preview_line
+    
     def run(self):
         """运行交互式界面"""
         while True:
@@ -585,10 +5472,12 @@ class InteractiveInterface:
             pack_count = len(self.merger.loaded_packs)
             merge_status = "✅ 已合并" if self.merged_result else "❌ 未合并"
             print(f"📊 状态: 已加载 {pack_count} 个皮肤包 | {merge_status}")
+            if pack_count:
+                print(f"🔮 预计: {self.preview_line()}")
             
             self.show_main_menu()
             
-            choice = input("请选择操作 (0-7): ").strip()
+            choice = input("请选择操作 (0-8): ").strip()
             
             if choice == '1':
                 self.input_folder_path()
@@ -604,16 +5493,281 @@ class InteractiveInterface:
                 self.clear_loaded_packs()
             elif choice == '7':
                 clear_screen()
+            elif choice == '8':
+                self.manage_cache()
             elif choice == '0':
                 print("\n👋 感谢使用 Minecraft 皮肤包合并工具!")
                 break
             else:
-                print("❌ 无效选择，请输入 0-7")
+                print("❌ 无效选择，请输入 0-8")
                 input("\n按 Enter 继续...")
 
 
+def build_arg_parser() -> argparse.ArgumentParser:
+    """命令行参数；不带任何参数时进入交互式界面"""
+    parser = argparse.ArgumentParser(
+        description="Minecraft 皮肤包合并工具。不带参数运行时进入交互式界面。")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    def add_common_options(sub, metrics: bool = True):
+        sub.add_argument('-w', '--workers', type=int, help="解析和压缩使用的并行数量")
+        sub.add_argument('--cache-dir', type=Path, help="皮肤包缓存目录")
+        sub.add_argument('--no-cache', action='store_true', help="不使用皮肤包缓存")
+        if not metrics:
+            return
+        sub.add_argument('--metrics', choices=Metrics.MODES, default='human',
+                         help="阶段耗时统计输出：quiet 不输出，human 可读汇总，jsonl 每行一个JSON事件"
+                              "（quiet/jsonl 模式下不输出进度信息）")
+        sub.add_argument('--metrics-file', type=Path, help="统计输出追加写入的文件（默认 stderr）")
+        sub.add_argument('--profile', action='store_true', help="使用 cProfile 分析并输出耗时最多的函数")
+        sub.add_argument('--trace-memory', action='store_true', help="使用 tracemalloc 统计内存峰值")
+    
+    merge_parser = subparsers.add_parser('merge', help="合并皮肤包（无交互）")
+    merge_parser.add_argument('sources', nargs='+', type=Path,
+                              help="皮肤包文件夹或 .mcpack/.zip 文件；不含 skins.json 的目录会递归查找其中的皮肤包")
+    merge_parser.add_argument('-o', '--output', required=True, type=Path, help="输出ZIP文件（--format json 时为目录）")
+    merge_parser.add_argument('--name', help="包标识符 (serialize_name)")
+    merge_parser.add_argument('--display-name', help="显示名称 (localization_name)")
+    merge_parser.add_argument('--format', choices=['zip', 'json'], default='zip', help="输出格式")
+    merge_parser.add_argument('--fast', action='store_true', help="快速压缩模式")
+    merge_parser.add_argument('--compact', action='store_true', help="输出紧凑JSON")
+    merge_parser.add_argument('--pipeline', action='store_true',
+                              help="流水线模式：边解析边合并边压缩，内存占用与皮肤包数量无关"
+                                   "（不能与 --optimize-png、--validate、--strict 或分包选项同时使用）")
+    merge_parser.add_argument('--optimize-png', action='store_true',
+                              help="无损重新压缩PNG纹理（结果按内容缓存）")
+    merge_parser.add_argument('--validate', action='store_true', help="写入前检查纹理文件头和尺寸")
+    merge_parser.add_argument('--strict', action='store_true', help="纹理缺失或损坏时不生成输出（包含 --validate）")
+    merge_parser.add_argument('--max-skins', type=int, help="按皮肤数量拆分为多个ZIP分包")
+    merge_parser.add_argument('--max-bytes', type=int, help="按大小（未压缩字节数）拆分为多个ZIP分包")
+    merge_parser.add_argument('--max-geometries', type=int, help="按几何模型数量拆分为多个ZIP分包")
+    merge_parser.add_argument('--rename-strategy', choices=NameAllocator.STRATEGIES, default='suffix',
+                              help="名称冲突时的重命名方式：suffix 数字后缀，pack 加皮肤包名，hash 加内容哈希")
+    merge_parser.add_argument('--keep-bounds', action='store_true',
+                              help="不修正几何模型的可见范围（仍会检查并报告）")
+    merge_parser.add_argument('--low-memory', action='store_true',
+                              help="加载后只保留皮肤包摘要，合并时逐个重新读取完整数据")
+    merge_parser.add_argument('--split-json', type=int, default=1, metavar='N',
+                              help="只有标准库JSON后端时，把超大几何模型文件拆分到 N 个进程并行解码"
+                                   "（0 为CPU数量；默认 1 不拆分）")
+    merge_parser.add_argument('--dry-run', action='store_true',
+                              help="只预演：报告重命名、重复项、缺失引用和估算的输出大小，不合并也不写入文件")
+    add_common_options(merge_parser)
+    
+    batch_parser = subparsers.add_parser('batch', help="按任务文件执行多个合并任务")
+    batch_parser.add_argument('job_file', type=Path, help="JSON任务文件")
+    batch_parser.add_argument('-c', '--concurrent', type=int, help="同时执行的任务数量")
+    add_common_options(batch_parser)
+    
+    watch_parser = subparsers.add_parser('watch', help="监视源目录，皮肤包变化时自动重新生成合并包")
+    watch_parser.add_argument('sources', nargs='+', type=Path, help="皮肤包文件夹、压缩包或包含皮肤包的目录")
+    watch_parser.add_argument('-o', '--output', required=True, type=Path, help="输出ZIP文件")
+    watch_parser.add_argument('--name', help="包标识符 (serialize_name)")
+    watch_parser.add_argument('--display-name', help="显示名称 (localization_name)")
+    watch_parser.add_argument('--fast', action='store_true', help="快速压缩模式")
+    watch_parser.add_argument('--compact', action='store_true', help="输出紧凑JSON")
+    watch_parser.add_argument('--poll', action='store_true', help="不使用 inotify，按修改时间轮询")
+    watch_parser.add_argument('--interval', type=float, default=1.0, help="轮询间隔（秒）")
+    watch_parser.add_argument('--debounce', type=float, default=0.5, help="最后一次修改后等待的时间（秒）")
+    watch_parser.add_argument('--rename-strategy', choices=NameAllocator.STRATEGIES, default='suffix',
+                              help="名称冲突时的重命名方式：suffix 数字后缀，pack 加皮肤包名，hash 加内容哈希")
+    watch_parser.add_argument('--low-memory', action='store_true',
+                              help="两次重建之间只保留皮肤包摘要，重建时从缓存或源文件重新读取")
+    add_common_options(watch_parser, metrics=False)
+    
+    serve_parser = subparsers.add_parser('serve', help="启动本地HTTP合并服务，供网页前端调用")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    serve_parser.add_argument('--port', type=int, default=8765, help="监听端口")
+    serve_parser.add_argument('--root', type=Path, action='append', default=[],
+                              help="允许任务通过路径引用的目录（可重复）；不指定时只能使用上传的皮肤包")
+    serve_parser.add_argument('--jobs', type=int, default=1, help="同时执行的合并任务数量")
+    serve_parser.add_argument('--work-dir', type=Path, help="上传文件和输出的目录（默认使用临时目录）")
+    serve_parser.add_argument('--max-upload', type=int, default=512, help="单个上传文件的大小上限 (MB)")
+    serve_parser.add_argument('--allow-origin', action='append', default=[],
+                              help="允许跨域访问的前端来源，如 http://localhost:8000；本地文件打开的页面为 null（可重复）")
+    serve_parser.add_argument('--token', help="访问令牌（默认每次启动随机生成）")
+    add_common_options(serve_parser, metrics=False)
+    
+    bench_parser = subparsers.add_parser('bench-json', help="JSON解析基准测试")
+    bench_parser.add_argument('files', nargs='*', type=Path, help="参与测试的JSON文件（默认使用生成的数据）")
+    bench_parser.add_argument('--decode', action='store_true',
+                              help="测试大型几何模型文件的解码路径（各后端 × 字符串/字节/拆分并行）")
+    bench_parser.add_argument('--size-mb', type=int, default=32, help="--decode 时生成的文件大小")
+    bench_parser.add_argument('-w', '--workers', type=int, help="--decode 时拆分并行解码的进程数")
+    
+    def add_generator_options(sub):
+        sub.add_argument('--skins', type=int, default=8, help="每个皮肤包的皮肤数量")
+        sub.add_argument('--geometries', type=int, default=2, help="每个皮肤包的几何模型数量")
+        sub.add_argument('--bones', type=int, default=6, help="每个几何模型的骨骼数量")
+        sub.add_argument('--cubes', type=int, default=3, help="每个骨骼的方块数量")
+        sub.add_argument('--texture-size', type=int, default=64, help="纹理边长（像素）")
+        sub.add_argument('--collision-rate', type=float, default=0.3, help="名称冲突比例 (0-1)")
+        sub.add_argument('--no-comments', action='store_true', help="生成不带注释的标准JSON")
+        sub.add_argument('--seed', type=int, default=0, help="随机种子")
+    
+    generate_parser = subparsers.add_parser('generate', help="生成合成皮肤包")
+    generate_parser.add_argument('output_dir', type=Path, help="输出目录")
+    generate_parser.add_argument('-n', '--count', type=int, default=10, help="皮肤包数量")
+    add_generator_options(generate_parser)
+    
+    suite_parser = subparsers.add_parser('bench', help="合并流程基准测试（使用合成皮肤包）")
+    suite_parser.add_argument('--packs', type=int, nargs='+', default=[10, 100, 1000], help="测试的皮肤包数量")
+    suite_parser.add_argument('--repeat', type=int, default=1, help="每个规模重复次数，取最短耗时")
+    suite_parser.add_argument('-w', '--workers', type=int, help="解析和压缩使用的并行数量")
+    suite_parser.add_argument('--work-dir', type=Path, help="生成数据的目录（默认使用临时目录）")
+    suite_parser.add_argument('--baseline', type=Path, help="基准线文件，结果退化时返回非零退出码")
+    suite_parser.add_argument('--update-baseline', action='store_true', help="将本次结果写入基准线文件")
+    suite_parser.add_argument('--tolerance', type=float, default=0.25, help="允许的退化比例")
+    add_generator_options(suite_parser)
+    
+    return parser
+
+
+def run_cli(args: argparse.Namespace) -> int:
+    """执行命令行模式，返回退出码"""
+    if args.command == 'bench-json':
+        if args.decode:
+            benchmark_json_decoding(args.files, size_mb=args.size_mb, workers=args.workers)
+        else:
+            benchmark_json_loading(args.files)
+        return 0
+    if args.command in ('generate', 'bench'):
+        return _run_benchmark_command(args)
+    if args.command == 'watch':
+        watcher = PackWatcher(args.sources, args.output,
+                              args.name or "MergedSkinPack", args.display_name or "合并皮肤包",
+                              cache=None if args.no_cache else PackCache(args.cache_dir),
+                              workers=args.workers, fast=args.fast, compact=args.compact,
+                              metrics=Metrics('quiet'), low_memory=args.low_memory)
+        watcher.merger.rename_strategy = args.rename_strategy
+        watcher.run(poll=args.poll, interval=args.interval, debounce=args.debounce)
+        return 0
+    if args.command == 'serve':
+        return _run_serve_command(args)
+    
+    # 进度信息输出到 stderr（quiet/jsonl 模式下丢弃），stdout 只输出JSON摘要
+    with contextlib.ExitStack() as stack:
+        metrics_stream = sys.stderr
+        if args.metrics_file:
+            metrics_stream = stack.enter_context(open(args.metrics_file, 'a', encoding='utf-8'))
+        progress_stream = sys.stderr
+        if args.metrics != 'human':
+            progress_stream = stack.enter_context(open(os.devnull, 'w', encoding='utf-8'))
+        profile_metrics = Metrics(args.metrics, stream=metrics_stream, labels={'command': args.command})
+        
+        with contextlib.redirect_stdout(progress_stream), \
+                profile_metrics.profile(args.profile, args.trace_memory):
+            try:
+                summary = _run_merge_command(args, metrics_stream)
+            except (OSError, ValueError) as e:
+                print(f"❌ 任务文件读取失败: {e}", file=sys.stderr)
+                return 2
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary['failed'] == 0 else 1
+
+
+def _run_serve_command(args: argparse.Namespace) -> int:
+    """启动本地合并服务，直到 Ctrl+C"""
+    import tempfile
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='skinpack-serve-')))
+        # 服务长期运行且多线程并发解码，暂停垃圾回收会影响所有请求线程
+        JSONCleaner.pause_gc = False
+        service = MergeService(work_dir, roots=args.root, jobs=args.jobs, workers=args.workers,
+                               cache=None if args.no_cache else PackCache(args.cache_dir),
+                               max_upload=args.max_upload * 1024 * 1024, token=args.token,
+                               allowed_origins=args.allow_origin)
+        stack.callback(service.close)
+        server = service.make_server(args.host, args.port)
+        stack.callback(server.server_close)
+        print(f"🌐 合并服务已启动: http://{args.host}:{server.server_port} (工作目录 {work_dir})")
+        print(f"🔑 访问令牌 (X-Merge-Token): {service.token}")
+        if not service.allowed_origins:
+            print("   ℹ️  未指定 --allow-origin，浏览器页面无法跨域访问")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 合并服务已停止")
+    return 0
+
+
+def _run_benchmark_command(args: argparse.Namespace) -> int:
+    """执行 generate / bench 子命令"""
+    generator = SyntheticPackGenerator(
+        skins_per_pack=args.skins, geometries_per_pack=args.geometries, bones_per_geometry=args.bones,
+        cubes_per_bone=args.cubes, texture_size=args.texture_size, comments=not args.no_comments,
+        collision_rate=args.collision_rate, seed=args.seed)
+    if args.command == 'generate':
+        pack_dirs = generator.generate(args.output_dir, args.count)
+        print(f"✅ 已生成 {len(pack_dirs)} 个皮肤包: {args.output_dir}")
+        return 0
+    
+    benchmark = MergeBenchmark(generator, workers=args.workers, repeat=args.repeat)
+    current = benchmark.run(args.packs, args.work_dir)
+    
+    if args.baseline and args.update_baseline:
+        args.baseline.write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"💾 基准线已保存: {args.baseline}")
+        return 0
+    if args.baseline:
+        baseline = JSONCleaner.load_json_file(args.baseline)
+        regressions = MergeBenchmark.compare(current, baseline, args.tolerance)
+        if regressions:
+            print("❌ 性能退化:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("✅ 未发现性能退化")
+    return 0
+
+
+def _run_merge_command(args: argparse.Namespace, metrics_stream=None) -> Dict:
+    """执行 merge / batch 子命令，返回摘要"""
+    cache = None if args.no_cache else PackCache(args.cache_dir)
+    if args.command == 'merge':
+        JSONCleaner.split_workers = args.split_json
+        jobs = [{
+            'sources': [str(source) for source in args.sources],
+            'output': str(args.output),
+            'name': args.name,
+            'display_name': args.display_name,
+            'format': args.format,
+            'fast': args.fast,
+            'compact': args.compact,
+            'pipeline': args.pipeline,
+            'optimize_png': args.optimize_png,
+            'validate': args.validate,
+            'strict': args.strict,
+            'max_skins': args.max_skins,
+            'max_bytes': args.max_bytes,
+            'max_geometries': args.max_geometries,
+            'low_memory': args.low_memory,
+            'keep_bounds': args.keep_bounds,
+            'rename_strategy': args.rename_strategy,
+            'dry_run': args.dry_run,
+        }]
+        options = {}
+    else:
+        jobs, options = BatchRunner.load_job_file(args.job_file)
+    
+    workers = args.workers or options.get('workers')
+    concurrent = getattr(args, 'concurrent', None) or options.get('concurrent') or 1
+    
+    runner = BatchRunner(workers=workers, cache=cache,
+                         metrics_mode=args.metrics, metrics_stream=metrics_stream)
+    return runner.run(jobs, concurrent=concurrent)
+
+
 def main():
     """主函数"""
+    if len(sys.argv) > 1:
+        parser = build_arg_parser()
+        args = parser.parse_args()
+        if args.command is None:
+            parser.print_help()
+            sys.exit(2)
+        sys.exit(run_cli(args))
+    
     try:
         interface = InteractiveInterface()
         interface.run()
@@ -0,0 +1,27 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'skinpack-merger.py'
+
+
+@pytest.fixture(scope='session')
+def spm():
+    """以模块形式加载 skinpack-merger.py（文件名含连字符，不能直接 import）"""
+    module = sys.modules.get('skinpack_merger')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('skinpack_merger', SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['skinpack_merger'] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def packs(spm, tmp_path):
+    """生成几个相互冲突的合成皮肤包"""
+    generator = spm.SyntheticPackGenerator(skins_per_pack=4, geometries_per_pack=2, bones_per_geometry=2,
+                                           cubes_per_bone=2, texture_size=16)
+    return generator.generate(tmp_path / 'packs', 4)
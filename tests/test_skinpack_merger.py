@@ -0,0 +1,757 @@
+import http.client
+import importlib.util
+import json
+import math
+import random
+import threading
+import time
+
+import pytest
+
+
+def test_low_memory_job_does_not_release_shared_packs(spm, packs, tmp_path):
+    runner = spm.BatchRunner(workers=1)
+    sources = [str(path) for path in packs]
+    summary = runner.run([
+        {'sources': sources, 'output': str(tmp_path / 'low.zip'), 'low_memory': True},
+        {'sources': sources, 'output': str(tmp_path / 'full.zip')},
+    ])
+    assert [job['status'] for job in summary['jobs']] == ['ok', 'ok'], summary['jobs']
+    assert summary['jobs'][0]['stats'] == summary['jobs'][1]['stats']
+
+
+def test_full_job_then_low_memory_job(spm, packs, tmp_path):
+    runner = spm.BatchRunner(workers=1)
+    sources = [str(path) for path in packs]
+    summary = runner.run([
+        {'sources': sources, 'output': str(tmp_path / 'full.zip')},
+        {'sources': sources, 'output': str(tmp_path / 'low.zip'), 'low_memory': True},
+        {'sources': sources, 'output': str(tmp_path / 'again.zip')},
+    ])
+    assert all(job['status'] == 'ok' for job in summary['jobs']), summary['jobs']
+    packs_loaded, _ = runner.load_packs([path for path in packs])
+    assert all(pack.loaded for pack in packs_loaded)
+
+
+def test_concurrent_low_memory_jobs(spm, packs, tmp_path):
+    runner = spm.BatchRunner(workers=1)
+    sources = [str(path) for path in packs]
+    jobs = [{'sources': sources, 'output': str(tmp_path / f'out_{i}.zip'), 'low_memory': i % 2 == 0}
+            for i in range(6)]
+    summary = runner.run(jobs, concurrent=3)
+    assert summary['failed'] == 0, summary['jobs']
+
+
+def test_inherited_geometries_with_different_parents_are_not_merged(spm):
+    bones = [{'name': 'hat', 'pivot': [0, 24, 0], 'cubes': [{'origin': [-4, 24, -4], 'size': [8, 8, 8], 'uv': [32, 0]}]}]
+    geometry_data = [{'file_name': 'geometry.json', 'data': {'format_version': '1.12.0', 'minecraft:geometry': [
+        {'description': {'identifier': 'geometry.a:geometry.humanoid.custom'}, 'bones': bones},
+        {'description': {'identifier': 'geometry.b:geometry.humanoid.customSlim'}, 'bones': bones},
+    ]}}]
+    skin_data = {'serialize_name': 'p', 'localization_name': 'p', 'skins': [
+        {'localization_name': 's0', 'geometry': 'geometry.a', 'texture': 's.png', 'type': 'free'},
+        {'localization_name': 's1', 'geometry': 'geometry.b', 'texture': 's.png', 'type': 'free'},
+    ]}
+    pack = spm.SkinPackInfo('p', skin_data, geometry_data, [], [])
+    state = spm.MergeState('Merged', 'Merged')
+    state.add_pack(pack, 0, 1)
+    result = state.result()
+    assert [(skin['localization_name'], skin['geometry']) for skin in result['skins']['skins']] == \
+        [('s0', 'geometry.a'), ('s1', 'geometry.b')]
+    assert len(result['geometry']['minecraft:geometry']) == 2
+
+
+def test_structural_digest_ignores_only_the_geometry_name(spm):
+    bones = [{'name': 'body', 'cubes': []}]
+    digest = spm.GeometryConverter.structural_hash
+    assert digest({'description': {'identifier': 'geometry.a:geometry.p'}, 'bones': bones}) == \
+        digest({'description': {'identifier': 'geometry.b:geometry.p'}, 'bones': bones})
+    assert digest({'description': {'identifier': 'geometry.a:geometry.p'}, 'bones': bones}) != \
+        digest({'description': {'identifier': 'geometry.a:geometry.q'}, 'bones': bones})
+    assert digest({'description': {'identifier': 'geometry.a'}, 'bones': bones}) == \
+        digest({'description': {'identifier': 'geometry.b'}, 'bones': bones})
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"uv": [0, 0], // uv [x, y]\n "size": [8, 8, 8]}', {'uv': [0, 0], 'size': [8, 8, 8]}),
+    ('{"a": 1, // closes } here\n "b": 2}', {'a': 1, 'b': 2}),
+    ('{"a": [1, 2, // last ]\n]}', {'a': [1, 2]}),
+    ('{"a": 1, /* } */ "b": 2,}', {'a': 1, 'b': 2}),
+    ('{"a": 1, // trailing\n}', {'a': 1}),
+    ('{"url": "http://example.com/a,]", "b": [1,], // x\n}', {'url': 'http://example.com/a,]', 'b': [1]}),
+    ('{"s": "a // b, /* c */", "t": "\\", //"}', {'s': 'a // b, /* c */', 't': '", //'}),
+])
+def test_clean_json_comments(spm, text, expected):
+    assert json.loads(spm.JSONCleaner.clean_json_comments(text)) == expected
+
+
+def test_clean_json_comments_random_round_trip(spm):
+    rng = random.Random(7)
+    words = ['x', '[y]', '{z}', ']', '}', '"q"', '//', '/*', ',', 'a, b]']
+    for _ in range(300):
+        value = {f'k{i}': [rng.randint(0, 9) for _ in range(rng.randint(0, 3))] for i in range(rng.randint(1, 5))}
+        parts = ['{']
+        for i, (key, items) in enumerate(value.items()):
+            parts.append(f'"{key}": [{", ".join(map(str, items))}{"," if items and rng.random() < 0.3 else ""}]')
+            if i < len(value) - 1 or rng.random() < 0.3:
+                parts.append(',')
+            if rng.random() < 0.5:
+                parts.append(f' // {" ".join(rng.choice(words) for _ in range(3)).replace("/*", "")}\n')
+            elif rng.random() < 0.5:
+                parts.append(f' /* {" ".join(rng.choice(words) for _ in range(3)).replace("/*", "")} */ ')
+        parts.append('}')
+        text = ''.join(parts)
+        assert json.loads(spm.JSONCleaner.clean_json_comments(text)) == value, text
+
+
+def test_visible_bounds_of_inherited_geometry_are_left_alone(spm):
+    hat = [{'name': 'hat', 'pivot': [0, 24, 0], 'cubes': [{'origin': [-4, 24, -4], 'size': [8, 8, 8], 'uv': [32, 0]}]}]
+    geometries = [
+        {'description': {'identifier': 'geometry.x:geometry.humanoid.custom'}, 'bones': hat},
+        {'description': {'identifier': 'geometry.y'}, 'bones': hat},
+    ]
+    report = spm.GeometryAnalyzer.analyze(geometries, fix_bounds=True)
+    assert 'visible_bounds_width' not in geometries[0]['description']
+    assert [item['geometry'] for item in report['bounds_fixed']] == ['geometry.y']
+    assert geometries[1]['description']['visible_bounds_width'] > 0
+
+
+def _request(server, method, path, headers=None, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def service_server(spm, tmp_path, packs):
+    service = spm.MergeService(tmp_path / 'work', roots=[packs[0].parent], jobs=2, workers=1,
+                               token='secret', allowed_origins=['http://localhost:8000'])
+    server = service.make_server('127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def test_service_requires_token(service_server, packs):
+    body = json.dumps({'sources': [str(path) for path in packs]})
+    status, _, _ = _request(service_server, 'POST', '/jobs', {'Content-Type': 'application/json'}, body)
+    assert status == 401
+    status, _, _ = _request(service_server, 'GET', '/health', {'X-Merge-Token': 'wrong'})
+    assert status == 401
+    status, _, _ = _request(service_server, 'GET', '/health', {'X-Merge-Token': 'secret'})
+    assert status == 200
+
+
+def test_service_cors_only_for_allowed_origin(service_server):
+    _, headers, _ = _request(service_server, 'OPTIONS', '/jobs', {'Origin': 'http://evil.example'})
+    assert 'Access-Control-Allow-Origin' not in headers
+    _, headers, _ = _request(service_server, 'OPTIONS', '/jobs', {'Origin': 'http://localhost:8000'})
+    assert headers['Access-Control-Allow-Origin'] == 'http://localhost:8000'
+    assert 'X-Merge-Token' in headers['Access-Control-Allow-Headers']
+
+
+def test_service_concurrent_jobs_share_packs(service_server, packs):
+    body = json.dumps({'sources': [str(path) for path in packs]})
+    headers = {'X-Merge-Token': 'secret', 'Content-Type': 'application/json'}
+    job_ids = [json.loads(_request(service_server, 'POST', '/jobs', headers, body)[2])['id'] for _ in range(4)]
+    deadline = time.time() + 60
+    states = {}
+    while time.time() < deadline:
+        states = {job_id: json.loads(_request(service_server, 'GET', f'/jobs/{job_id}', headers)[2])['status']
+                  for job_id in job_ids}
+        if all(state in ('done', 'failed') for state in states.values()):
+            break
+        time.sleep(0.05)
+    assert set(states.values()) == {'done'}, states
+
+
+def test_shard_numbers_stay_stable_when_a_shard_becomes_empty(spm, packs, tmp_path):
+    runner = spm.BatchRunner(workers=1)
+    output = tmp_path / 'merged.zip'
+    first = runner.run([{'sources': [str(path) for path in packs], 'output': str(output), 'max_skins': 4}])
+    assert [spm.Path(path).name for path in first['jobs'][0]['shards']] == \
+        ['merged_1.zip', 'merged_2.zip', 'merged_3.zip', 'merged_4.zip']
+    assignment = spm.ShardPlanner.load_assignment(output)
+
+    second = runner.run([{'sources': [str(path) for path in packs[1:]], 'output': str(output), 'max_skins': 4}])
+    assert [spm.Path(path).name for path in second['jobs'][0]['shards']] == \
+        ['merged_2.zip', 'merged_3.zip', 'merged_4.zip']
+    assert not (tmp_path / 'merged_1.zip').exists()
+    remaining = spm.ShardPlanner.load_assignment(output)
+    assert remaining == {name: shard for name, shard in assignment.items() if shard != 0}
+
+
+def test_png_cache_is_bounded_and_cleared_with_pack_cache(spm, tmp_path):
+    cache = spm.PackCache(tmp_path / 'cache')
+    optimizer = spm.PNGOptimizer(cache.png_dir, workers=1, max_bytes=4 * spm.PNGOptimizer.ENTRY_OVERHEAD)
+    sources = []
+    for seed in range(8):
+        path = tmp_path / f'texture_{seed}.png'
+        path.write_bytes(spm.SyntheticPackGenerator.make_png(16, 16, seed))
+        sources.append(path)
+    optimizer.optimize_sources(sources)
+    assert len(spm.PNGOptimizer.disk_entries(cache.png_dir)) <= 4
+
+    stats = cache.stats()
+    assert stats['png_count'] == len(spm.PNGOptimizer.disk_entries(cache.png_dir)) > 0
+    assert cache.clear() == stats['png_count']
+    assert cache.stats()['png_count'] == 0
+
+
+def test_png_memory_cache_is_bounded(spm, monkeypatch):
+    monkeypatch.setattr(spm.PNGOptimizer, 'MEMORY_MAX_BYTES', 10 * 1024)
+    optimizer = spm.PNGOptimizer(persistent=False)
+    for i in range(100):
+        optimizer._store(f'{i:064x}', bytes(1024))
+    assert optimizer._memory_bytes <= spm.PNGOptimizer.MEMORY_MAX_BYTES
+    assert len(optimizer._cache) < 10
+    assert optimizer._lookup(f'{99:064x}') == (True, bytes(1024))
+    assert optimizer._lookup(f'{0:064x}') == (False, None)
+
+
+@pytest.mark.parametrize('archive', [False, True])
+def test_cache_notices_same_size_edit_with_restored_mtime(spm, packs, tmp_path, archive):
+    pack_path = packs[0]
+    skins_path = pack_path / 'skins.json'
+    if archive:
+        archive_path = tmp_path / 'pack.mcpack'
+        with spm.zipfile.ZipFile(archive_path, 'w') as zf:
+            for path in sorted(pack_path.rglob('*')):
+                if path.is_file():
+                    zf.writestr(path.relative_to(pack_path).as_posix(), path.read_bytes())
+    cache = spm.PackCache(tmp_path / 'cache')
+    merger = spm.SkinPackMerger(cache=cache)
+    assert merger.load_skin_pack(archive_path if archive else pack_path)
+
+    text = skins_path.read_text(encoding='utf-8')
+    edited = text.replace('Pack0 Skin 0', 'Pack0 Skin X')
+    assert len(edited) == len(text)
+    if archive:
+        stat = archive_path.stat()
+        with spm.zipfile.ZipFile(archive_path) as zf:
+            members = {name: zf.read(name) for name in zf.namelist()}
+        members['skins.json'] = edited.encode('utf-8')
+        with spm.zipfile.ZipFile(archive_path, 'w') as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        assert archive_path.stat().st_size == stat.st_size
+        spm.os.utime(archive_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    else:
+        stat = skins_path.stat()
+        skins_path.write_text(edited, encoding='utf-8')
+        spm.os.utime(skins_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    merger = spm.SkinPackMerger(cache=cache)
+    assert merger.load_skin_pack(archive_path if archive else pack_path)
+    names = [skin['localization_name'] for skin in merger.loaded_packs[0].skin_data['skins']]
+    assert 'Pack0 Skin X' in names
+
+
+@pytest.mark.parametrize('raw_write', [True, False])
+def test_zip_writer_reuses_archive_members(spm, monkeypatch, tmp_path, raw_write):
+    if not raw_write:
+        # 模拟内部实现不同的 zipfile，只能解压后重新写入
+        monkeypatch.setattr(spm, 'ZIPFILE_RAW_WRITE_ATTRS', spm.ZIPFILE_RAW_WRITE_ATTRS + ('_missing',))
+    source = tmp_path / 'source.zip'
+    members = {'skins.json': json.dumps({'skins': list(range(500))}).encode('utf-8'),
+               'skin.png': spm.SyntheticPackGenerator.make_png(16, 16, 1)}
+    with spm.zipfile.ZipFile(source, 'w', spm.zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+    output = tmp_path / 'out.zip'
+    with spm.ParallelZipWriter(output, workers=2) as writer:
+        for name in members:
+            writer.add(f'copied/{name}', spm.ArchiveMember(source, name))
+        writer.add('extra.txt', 'extra')
+    with spm.zipfile.ZipFile(output) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == dict(
+            {f'copied/{name}': data for name, data in members.items()}, **{'extra.txt': b'extra'})
+
+
+def test_json_split_is_opt_in(spm, monkeypatch):
+    calls = []
+    monkeypatch.setattr(spm.JSONCleaner, 'SPLIT_THRESHOLD', 0)
+    monkeypatch.setattr(spm.JSONCleaner, 'load_geometry_split', staticmethod(lambda data: calls.append(data)))
+    monkeypatch.setattr(spm, 'JSON_BACKEND', spm.JSON_BACKENDS[-1])
+    assert spm.JSON_BACKEND[1] is spm._stdlib_json_loads
+    assert spm.JSONCleaner.split_workers == 1
+    assert spm.JSONCleaner.load_json_bytes(b'{"minecraft:geometry": []}', 'a.json') == {'minecraft:geometry': []}
+    assert calls == []
+
+    monkeypatch.setattr(spm.JSONCleaner, 'split_workers', 4)
+    spm.JSONCleaner.load_json_bytes(b'{"minecraft:geometry": []}', 'a.json')
+    assert len(calls) == 1
+
+
+def test_gc_pause_can_be_turned_off(spm, monkeypatch):
+    assert spm.gc.isenabled()
+    with spm.JSONCleaner.gc_paused():
+        assert not spm.gc.isenabled()
+    assert spm.gc.isenabled()
+    monkeypatch.setattr(spm.JSONCleaner, 'pause_gc', False)
+    with spm.JSONCleaner.gc_paused():
+        assert spm.gc.isenabled()
+
+
+def test_duplicate_skin_names_keep_their_translation(spm, packs, tmp_path):
+    # 第一个包内两个皮肤同名，第二个包也有一个同名皮肤
+    for i, pack_path in enumerate(packs[:2]):
+        skins_doc = spm.JSONCleaner.load_json_file(pack_path / 'skins.json')
+        for k, skin in enumerate(skins_doc['skins']):
+            skin['localization_name'] = 'Dup' if k < 2 - i else f'Other {i}-{k}'
+        (pack_path / 'skins.json').write_text(json.dumps(skins_doc), encoding='utf-8')
+        (pack_path / 'texts' / 'en_US.lang').write_text(
+            f"skin.{skins_doc['serialize_name']}.Dup=Duplicate {i}\n", encoding='utf-8')
+    merger = spm.SkinPackMerger()
+    for pack_path in packs[:2]:
+        assert merger.load_skin_pack(pack_path)
+    result = merger.merge_skin_packs()
+    merged_names = [skin['localization_name'] for skin in result['skins']['skins']]
+    assert len(set(merged_names)) == len(merged_names) == 8
+
+    output = tmp_path / 'merged.zip'
+    merger.save_as_zip(result, output)
+    with spm.zipfile.ZipFile(output) as zf:
+        lines = zf.read('texts/en_US.lang').decode('utf-8').splitlines()
+    translations = dict(line.split('=', 1) for line in lines)
+    serialize_name = result['skins']['serialize_name']
+    expected = ['Duplicate 0', 'Duplicate 0', 'Duplicate 1']
+    assert [translations[f'skin.{serialize_name}.{name}'] for name in merged_names
+            if translations[f'skin.{serialize_name}.{name}'].startswith('Duplicate')] == expected
+    assert merged_names[:2] == ['Dup', 'Dup_2'] and merged_names[4] == 'Dup_3'
+
+
+def _inheritance_pack(spm, name, base_bones, child_first=False):
+    child_bones = [{'name': 'hat', 'parent': 'head', 'cubes': [{'origin': [-4, 24, -4], 'size': [8, 8, 8],
+                                                               'uv': [32, 0]}]}]
+    geometries = [{'description': {'identifier': 'geometry.base'}, 'bones': base_bones},
+                  {'description': {'identifier': 'geometry.child:geometry.base'}, 'bones': child_bones}]
+    if child_first:
+        geometries.reverse()
+    geometry_data = [{'file_name': 'geometry.json',
+                      'data': {'format_version': '1.12.0', 'minecraft:geometry': geometries}}]
+    skin_data = {'serialize_name': name, 'localization_name': name, 'skins': [
+        {'localization_name': f'{name} base', 'geometry': 'geometry.base', 'texture': 's.png', 'type': 'free'},
+        {'localization_name': f'{name} child', 'geometry': 'geometry.child', 'texture': 's.png', 'type': 'free'},
+    ]}
+    return spm.SkinPackInfo(name, skin_data, geometry_data, [], [])
+
+
+def test_inherited_geometry_follows_its_renamed_parent(spm):
+    packs = [_inheritance_pack(spm, 'a', [{'name': 'head', 'pivot': [0, 24, 0]}]),
+             _inheritance_pack(spm, 'b', [{'name': 'head', 'pivot': [0, 28, 0]}], child_first=True)]
+    state = spm.MergeState('Merged', 'Merged')
+    for i, pack in enumerate(packs):
+        state.add_pack(pack, i, len(packs))
+    result = state.result()
+    identifiers = [geometry['description']['identifier'] for geometry in result['geometry']['minecraft:geometry']]
+    assert identifiers == ['geometry.base', 'geometry.child:geometry.base',
+                           'geometry.base_2', 'geometry.child_2:geometry.base_2']
+    assert [skin['geometry'] for skin in result['skins']['skins']] == \
+        ['geometry.base', 'geometry.child', 'geometry.base_2', 'geometry.child_2']
+
+    report = spm.MergePlanner().plan(packs)
+    assert report['renames']['geometries'] == result['renames']['geometries']
+    assert report['geometries'] == len(identifiers)
+
+
+def test_inherited_geometry_of_identical_parent_is_merged(spm):
+    bones = [{'name': 'head', 'pivot': [0, 24, 0]}]
+    packs = [_inheritance_pack(spm, 'a', bones), _inheritance_pack(spm, 'b', bones, child_first=True)]
+    state = spm.MergeState('Merged', 'Merged')
+    for i, pack in enumerate(packs):
+        state.add_pack(pack, i, len(packs))
+    result = state.result()
+    assert len(result['geometry']['minecraft:geometry']) == 2
+    assert result['stats']['geometry_dedup_count'] == 2
+
+
+def test_watcher_poll_hashes_only_changed_packs(spm, packs, tmp_path, monkeypatch):
+    watcher = spm.PackWatcher([packs[0].parent], tmp_path / 'out.zip', metrics=spm.Metrics('quiet'))
+    assert watcher.refresh() == len(packs)
+    watcher.rebuild()
+
+    hashed = []
+    original = spm.PackIndexer.fingerprint_entry
+
+    def counting(name, path, stat, content=True):
+        if content:
+            hashed.append(spm.Path(path))
+        return original(name, path, stat, content)
+
+    monkeypatch.setattr(spm.PackIndexer, 'fingerprint_entry', staticmethod(counting))
+    assert watcher.refresh() == 0
+    assert hashed == []
+
+    skins_path = packs[2] / 'skins.json'
+    skins_path.write_text(skins_path.read_text(encoding='utf-8').replace('"free"', '"paid"', 1), encoding='utf-8')
+    assert watcher.refresh() == 1
+    assert hashed and {path.parent for path in hashed} == {packs[2]}
+
+
+def test_geometry_analysis_memo_gives_the_same_report(spm, packs, monkeypatch):
+    merger = spm.SkinPackMerger()
+    merger.load_skin_pack_folders(packs, workers=1)
+    geometries = merger.merge_skin_packs()['geometry']['minecraft:geometry']
+    expected = spm.GeometryAnalyzer.analyze(list(geometries))
+
+    memo = {}
+    first = spm.GeometryAnalyzer.analyze(list(geometries), memo=memo)
+    flattened = []
+    original = spm.GeometryAnalyzer.flatten
+    monkeypatch.setattr(spm.GeometryAnalyzer, 'flatten',
+                        staticmethod(lambda subset: flattened.append(len(subset)) or original(subset)))
+    second = spm.GeometryAnalyzer.analyze(list(geometries), memo=memo)
+    assert first == second == expected
+    assert flattened == [0]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_runner_hashes_each_pack_once_and_warm_cache_does_not_parse(spm, packs, tmp_path, monkeypatch, workers):
+    cache = spm.PackCache(tmp_path / 'cache')
+    hashed = []
+    original = spm.PackIndexer.fingerprint_entry
+
+    def counting(name, path, stat, content=True):
+        if content and spm.PackIndexer.classify(spm.os.path.basename(name)) in ('skins', 'geometry'):
+            hashed.append(spm.Path(path))
+        return original(name, path, stat, content)
+
+    monkeypatch.setattr(spm.PackIndexer, 'fingerprint_entry', staticmethod(counting))
+    loaded, failed = spm.BatchRunner(workers=workers, cache=cache).load_packs(packs)
+    assert len(loaded) == len(packs) and failed == []
+    assert len(hashed) == len(set(hashed)) == 2 * len(packs)
+
+    # 新的 BatchRunner 只有磁盘缓存可用：既不重新解析，也不重复计算指纹
+    hashed.clear()
+    parsed = []
+    original_load = spm.JSONCleaner.load_json_file
+    monkeypatch.setattr(spm.JSONCleaner, 'load_json_file',
+                        staticmethod(lambda path: parsed.append(path) or original_load(path)))
+    loaded, failed = spm.BatchRunner(workers=workers, cache=cache).load_packs(packs)
+    assert len(loaded) == len(packs) and failed == []
+    assert parsed == []
+    assert len(hashed) == len(set(hashed)) == 2 * len(packs)
+
+
+def _texture_pack(spm, tmp_path, name, textures):
+    """textures: 纹理名 -> 内容，内容为 None 表示无法读取（没有哈希）"""
+    folder = tmp_path / name
+    folder.mkdir()
+    texture_files = []
+    for texture_name, data in textures.items():
+        path = folder / texture_name
+        if data is not None:
+            path.write_bytes(data)
+        texture_files.append(path)
+    skin_data = {'serialize_name': name, 'localization_name': name, 'skins': [
+        {'localization_name': f'{name} {texture_name}', 'geometry': 'geometry.humanoid.custom',
+         'texture': texture_name, 'type': 'free'} for texture_name in textures]}
+    pack = spm.SkinPackInfo(name, skin_data, [], texture_files, [])
+    pack.texture_hashes = {texture_name: spm.TextureHasher.hash_bytes(data)
+                           for texture_name, data in textures.items() if data is not None}
+    return pack
+
+
+def test_texture_dedup_rename_and_skin_rewrite(spm, tmp_path):
+    same = spm.SyntheticPackGenerator.make_png(8, 8, 1)
+    other = spm.SyntheticPackGenerator.make_png(8, 8, 2)
+    packs = [_texture_pack(spm, tmp_path, 'a', {'skin.png': same, 'cape.png': None}),
+             _texture_pack(spm, tmp_path, 'b', {'copy.png': same, 'skin.png': other, 'cape.png': None})]
+    state = spm.MergeState('Merged', 'Merged')
+    for i, pack in enumerate(packs):
+        state.add_pack(pack, i, len(packs))
+    result = state.result()
+
+    # 内容相同的纹理只保留一份；同名不同内容的纹理重命名；无法读取的同名纹理各自保留
+    assert sorted(state.texture_files) == ['cape.png', 'cape_2.png', 'skin.png', 'skin_2.png']
+    assert state.texture_files['skin_2.png'] == packs[1].texture_files[1]
+    assert state.texture_files['cape_2.png'] == packs[1].texture_files[2]
+    assert result['stats']['texture_dedup_count'] == 1
+    assert [skin['texture'] for skin in result['skins']['skins']] == \
+        ['skin.png', 'cape.png', 'skin.png', 'skin_2.png', 'cape_2.png']
+
+    report = spm.MergePlanner().plan(packs)
+    assert report['renames']['textures'] == result['renames']['textures']
+
+
+def _run_merge_cli(spm, capsys, *argv):
+    args = spm.build_arg_parser().parse_args(['merge', *map(str, argv), '--no-cache', '--metrics', 'quiet'])
+    code = spm.run_cli(args)
+    return code, json.loads(capsys.readouterr().out)
+
+
+def test_pipeline_output_matches_normal_merge(spm, packs, tmp_path, capsys):
+    outputs = {}
+    for mode in ('normal', 'pipeline'):
+        output = tmp_path / f'{mode}.zip'
+        extra = ['--pipeline'] if mode == 'pipeline' else []
+        code, summary = _run_merge_cli(spm, capsys, *packs, '-o', output, '-w', '2', *extra)
+        assert code == 0 and summary['jobs'][0]['status'] == 'ok'
+        with spm.zipfile.ZipFile(output) as zf:
+            outputs[mode] = [(name, zf.read(name)) for name in zf.namelist()]
+    assert [name for name, _ in outputs['pipeline']] == [name for name, _ in outputs['normal']]
+    assert outputs['pipeline'] == outputs['normal']
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+@pytest.mark.parametrize('option', ['--optimize-png', '--validate', '--strict', '--max-skins=4'])
+def test_pipeline_rejects_unsupported_options(spm, packs, tmp_path, capsys, option):
+    output = tmp_path / 'out.zip'
+    code, summary = _run_merge_cli(spm, capsys, *packs, '-o', output, '--pipeline', option)
+    assert code == 1
+    assert summary['jobs'][0]['status'] == 'error'
+    assert option.lstrip('-').split('=')[0].replace('-', '_') in summary['jobs'][0]['error']
+    assert not output.exists()
+
+
+@pytest.mark.parametrize('use_processes', [True, False])
+def test_parallel_load_keeps_input_order(spm, packs, tmp_path, capsys, use_processes):
+    missing = tmp_path / 'missing_pack'
+    missing.mkdir()
+    (missing / 'geometry.json').write_text('{}', encoding='utf-8')
+    paths = [packs[3], missing, packs[0], packs[2], packs[1]]
+    merger = spm.SkinPackMerger()
+    flags = merger.load_skin_pack_folders(paths, workers=2, use_processes=use_processes)
+    assert flags == [True, False, True, True, True]
+    assert [pack.folder_name for pack in merger.loaded_packs] == \
+        [path.name for path in paths if path != missing]
+    assert f"❌ 加载失败: {missing.name} - " in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('fast_backend', [True, False])
+def test_stream_encoder_matches_json_dumps(spm, packs, monkeypatch, compact, fast_backend):
+    if not fast_backend:
+        monkeypatch.setattr(spm, 'orjson', None)
+    merger = spm.SkinPackMerger()
+    merger.load_skin_pack_folders(packs, workers=1)
+    result = merger.merge_skin_packs()
+    skins = dict(result['skins'], localization_name='合并皮肤包 ✨')
+    skins['skins'] = skins['skins'] + [{'localization_name': '皮肤 "引号"\n', 'geometry': 'geometry.é',
+                                        'texture': 'ä.png', 'type': 'free', 'tags': []}]
+    geometry = dict(result['geometry'], extra=[], empty={}, scale=0.5)
+    documents = [skins, geometry, {'format_version': '1.12.0', 'minecraft:geometry': []}, {}]
+
+    encoder = spm.JSONStreamEncoder(indent=None if compact else 2)
+    for document in documents:
+        if compact:
+            expected = json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+        else:
+            expected = json.dumps(document, indent=2, ensure_ascii=False)
+        stream = spm.io.BytesIO()
+        written = encoder.write(document, stream)
+        assert stream.getvalue().decode('utf-8') == expected
+        assert written == len(stream.getvalue())
+
+
+def _linear_suffix_names(names):
+    """旧实现：每次冲突都从 _2 开始逐个探测"""
+    used, result = set(), []
+    for name in names:
+        new_name = name
+        counter = 2
+        while new_name in used:
+            new_name = f"{name}_{counter}"
+            counter += 1
+        used.add(new_name)
+        result.append(new_name)
+    return result
+
+
+def test_name_allocator_suffix_matches_linear_probing(spm):
+    names = ['X', 'X_2', 'X', 'X', 'X_3', 'X_2', 'Y', 'X', 'Y_2_2', 'Y', 'Y_2', 'Y_2']
+    rng = random.Random(7)
+    names += [rng.choice(['A', 'A_2', 'A_3', 'A_2_2', 'B', 'B_4']) for _ in range(200)]
+    allocator = spm.NameAllocator()
+    assert [allocator.allocate(name) for name in names] == _linear_suffix_names(names)
+    assert allocator.allocate('skin.png', 'skin', '.png') == 'skin.png'
+    assert allocator.allocate('skin.png', 'skin', '.png') == 'skin_2.png'
+
+
+def test_name_allocator_pack_and_hash_strategies(spm):
+    allocator = spm.NameAllocator('pack')
+    assert allocator.allocate('Skin', pack='My Pack!') == 'Skin'
+    assert allocator.allocate('Skin', pack='My Pack!') == 'Skin_My_Pack'
+    assert allocator.allocate('Skin', pack='My Pack!') == 'Skin_My_Pack_2'
+    assert allocator.allocate('Skin') == 'Skin_2'
+    assert allocator.allocate('cape.png', 'cape', '.png', pack='Other') == 'cape.png'
+    assert allocator.allocate('cape.png', 'cape', '.png', pack='Other') == 'cape_Other.png'
+    assert [(entry['pack'], entry['merged']) for entry in allocator.mapping] == \
+        [('My Pack!', 'Skin_My_Pack'), ('My Pack!', 'Skin_My_Pack_2'), (None, 'Skin_2'), ('Other', 'cape_Other.png')]
+
+    allocator = spm.NameAllocator('hash')
+    digest = '0123456789abcdef'
+    assert allocator.allocate('geometry.a', digest=digest) == 'geometry.a'
+    assert allocator.allocate('geometry.a', digest=digest) == 'geometry.a_01234567'
+    assert allocator.allocate('geometry.a', digest=digest) == 'geometry.a_01234567_2'
+    assert allocator.allocate('geometry.a') == 'geometry.a_2'
+
+    with pytest.raises(ValueError):
+        spm.NameAllocator('random')
+
+
+@pytest.mark.parametrize('strategy', ['suffix', 'pack', 'hash'])
+def test_planner_matches_real_merge(spm, tmp_path, strategy):
+    generator = spm.SyntheticPackGenerator(skins_per_pack=6, geometries_per_pack=3, bones_per_geometry=2,
+                                           cubes_per_bone=1, texture_size=16, collision_rate=0.6, seed=3)
+    packs = generator.generate(tmp_path / 'packs', 6)
+    merger = spm.SkinPackMerger()
+    merger.rename_strategy = strategy
+    merger.load_skin_pack_folders(packs, workers=1)
+    report = merger.dry_run()
+    result = merger.merge_skin_packs()
+    stats = result['stats']
+
+    # 合并前纹理哈希未知，预演给出的是近似结果；合并后哈希已补全，结果应完全一致
+    exact = merger.dry_run()
+    # hash 策略的皮肤哈希需要完整皮肤数据，预演时皮肤重命名退回数字后缀，只有皮肤部分是近似的
+    assert exact['exact'] == (strategy != 'hash')
+    kinds = ('geometries', 'textures') if strategy == 'hash' else ('skins', 'geometries', 'textures')
+    assert {kind: exact['renames'][kind] for kind in kinds} == {kind: result['renames'][kind] for kind in kinds}
+    assert exact['skins'] == stats['total_skins']
+    assert exact['geometries'] == len(result['geometry']['minecraft:geometry'])
+    assert len(exact['duplicates']['geometries']) == stats['geometry_dedup_count'] > 0
+    assert exact['textures'] == stats['texture_count']
+    assert len(exact['duplicates']['textures']) == stats['texture_dedup_count'] > 0
+    assert len(exact['renames']['geometries']) == stats['geometry_renamed_count'] > 0
+    assert len(exact['renames']['textures']) == stats['texture_renamed_count'] > 0
+    assert exact['renames']['skins']
+    if strategy != 'hash':
+        assert report['renames']['skins'] == result['renames']['skins']
+
+
+def test_cli_prints_json_summary_and_exit_code(spm, packs, tmp_path, capsys, monkeypatch):
+    output = tmp_path / 'out.zip'
+    monkeypatch.setattr(spm.sys, 'argv', ['skinpack-merger.py', 'merge', *map(str, packs), '-o', str(output),
+                                          '--no-cache', '--metrics', 'quiet'])
+    with pytest.raises(SystemExit) as exit_info:
+        spm.main()
+    assert exit_info.value.code == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert (summary['ok'], summary['failed']) == (1, 0)
+    job = summary['jobs'][0]
+    assert job['status'] == 'ok' and job['output'] == str(output)
+    assert job['output_bytes'] == output.stat().st_size
+    assert job['stats']['folder_count'] == len(packs)
+
+    code, summary = _run_merge_cli(spm, capsys, tmp_path / 'no_such_pack', '-o', tmp_path / 'bad.zip')
+    assert code == 1
+    assert (summary['ok'], summary['failed']) == (0, 1) and summary['jobs'][0]['status'] == 'error'
+
+    args = spm.build_arg_parser().parse_args(['batch', str(tmp_path / 'missing.json'), '--metrics', 'quiet'])
+    assert spm.run_cli(args) == 2
+    assert capsys.readouterr().out == ''
+
+
+def test_benchmark_compare_reports_only_real_regressions(spm, capsys):
+    mb = 1024 * 1024
+    baseline = {'config': {'seed': 0}, 'results': {'10': {
+        'load': {'seconds': 0.100, 'peak_bytes': 10 * mb},
+        'merge': {'seconds': 0.002, 'peak_bytes': 2 * mb},
+        'save_as_zip': {'seconds': 0.200, 'peak_bytes': None},
+    }}}
+    current = {'config': {'seed': 0}, 'results': {
+        '10': {
+            'load': {'seconds': 0.150, 'peak_bytes': 14 * mb},  # 耗时和内存都超过容差
+            'merge': {'seconds': 0.004, 'peak_bytes': 2 * mb + 1000},  # 超过比例但差值只是噪声
+            'save_as_zip': {'seconds': 0.240, 'peak_bytes': 50 * mb},  # 容差以内，基准线没有内存数据
+            'save_json_files': {'seconds': 9.0, 'peak_bytes': 1},  # 基准线没有这一阶段
+        },
+        '100': {'load': {'seconds': 9.0, 'peak_bytes': 1}},  # 基准线没有这一规模
+    }}
+    regressions = spm.MergeBenchmark.compare(current, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('10 包 load: 耗时 100.0 ms -> 150.0 ms')
+    assert regressions[1].startswith('10 包 load: 峰值内存 10.0 MB -> 14.0 MB')
+    assert capsys.readouterr().out == ''
+
+    assert spm.MergeBenchmark.compare(current, baseline, tolerance=1.0) == []
+    spm.MergeBenchmark.compare(current, dict(baseline, config={'seed': 1}))
+    assert '生成参数与本次不同' in capsys.readouterr().out
+
+
+def test_discover_finds_nested_packs_and_archives(spm, tmp_path):
+    root = tmp_path / 'root'
+    (root / 'a' / 'pack1' / 'nested').mkdir(parents=True)
+    (root / 'a' / 'pack1' / 'skins.json').write_text('{}', encoding='utf-8')
+    # 皮肤包内部的子目录不再查找
+    (root / 'a' / 'pack1' / 'nested' / 'skins.json').write_text('{}', encoding='utf-8')
+    (root / 'b' / 'c' / 'pack2').mkdir(parents=True)
+    (root / 'b' / 'c' / 'pack2' / 'skins.json').write_text('{}', encoding='utf-8')
+    (root / '.hidden' / 'pack3').mkdir(parents=True)
+    (root / '.hidden' / 'pack3' / 'skins.json').write_text('{}', encoding='utf-8')
+    (root / 'empty').mkdir()
+    with spm.zipfile.ZipFile(root / 'b' / 'packed.MCPACK', 'w') as zf:
+        zf.writestr('inner/skins.json', '{}')
+    with spm.zipfile.ZipFile(root / 'b' / 'other.zip', 'w') as zf:
+        zf.writestr('readme.txt', 'not a skin pack')
+    (root / 'link').symlink_to(root / 'b', target_is_directory=True)
+
+    expected = [root / 'a' / 'pack1', root / 'b' / 'c' / 'pack2', root / 'b' / 'packed.MCPACK']
+    assert spm.PackIndexer.discover(root) == sorted(expected)
+    assert spm.PackIndexer.discover(root, include_archives=False) == sorted(expected[:2])
+    assert spm.PackIndexer.expand_sources([root, root / 'a' / 'pack1']) == sorted(expected) + [root / 'a' / 'pack1']
+
+
+def test_texture_inspector_parses_png_and_jpeg_headers(spm, tmp_path):
+    parse = spm.TextureInspector.parse_header
+    png = spm.SyntheticPackGenerator.make_png(8, 4, 0)
+    assert parse(png) == {'format': 'png', 'width': 8, 'height': 4, 'bit_depth': 8, 'color_type': 6}
+    assert parse(png[:20], complete=False) is None
+    assert parse(png[:20]) == {'error': "PNG文件头不完整"}
+    bad_crc = png[:29] + bytes([png[29] ^ 0xFF]) + png[30:]
+    assert parse(bad_crc) == {'error': "PNG IHDR校验失败"}
+
+    app0 = b'\xff\xe0' + (16).to_bytes(2, 'big') + b'JFIF\x00' + bytes(9)
+    sof0 = b'\xff\xc0' + (11).to_bytes(2, 'big') + b'\x08' + (24).to_bytes(2, 'big') + (32).to_bytes(2, 'big') + bytes(4)
+    jpeg = b'\xff\xd8' + app0 + sof0 + b'\xff\xd9'
+    assert parse(jpeg) == {'format': 'jpeg', 'width': 32, 'height': 24}
+    truncated = b'\xff\xd8' + app0 + sof0[:6]
+    assert parse(truncated, complete=False) is None
+    assert parse(truncated) == {'error': "JPEG文件头不完整"}
+    assert parse(b'\xff\xd8' + app0 + b'\xff\xda\x00\x08') == {'error': "JPEG缺少SOF段"}
+    assert parse(b'GIF89a') == {'error': "不是PNG或JPEG文件"}
+    assert parse(png[:4], complete=False) is None and parse(b'\xff', complete=False) is None
+
+    # 分块读取时跨块的文件头也能解析；磁盘上被截断的PNG通过结尾的 IEND 发现
+    inspector = spm.TextureInspector(workers=1)
+    inspector.READ_CHUNK = 5
+    (tmp_path / 'a.jpg').write_bytes(jpeg)
+    (tmp_path / 'b.png').write_bytes(png)
+    (tmp_path / 'c.png').write_bytes(png[:-6])
+    results = inspector.inspect_files([tmp_path / 'a.jpg', tmp_path / 'b.png', tmp_path / 'c.png'])
+    assert results[tmp_path / 'a.jpg'] == {'format': 'jpeg', 'width': 32, 'height': 24}
+    assert (results[tmp_path / 'b.png']['width'], results[tmp_path / 'b.png']['height']) == (8, 4)
+    assert results[tmp_path / 'c.png'] == {'error': "PNG缺少IEND（文件可能被截断）"}
+
+
+@pytest.mark.skipif(importlib.util.find_spec('orjson') is None, reason="需要 orjson")
+def test_fast_backend_failure_goes_straight_to_comment_cleaning(spm, monkeypatch):
+    monkeypatch.setattr(spm, 'JSON_BACKEND', spm.JSON_BACKENDS[0])
+    stdlib_calls = []
+    original = spm._stdlib_json_loads
+    monkeypatch.setattr(spm, '_stdlib_json_loads', lambda content: stdlib_calls.append(1) or original(content))
+
+    commented = '{"a": 1, // 注释\n "b": [1, 2,], /* x */ "url": "http://x"}'
+    expected = {'a': 1, 'b': [1, 2], 'url': 'http://x'}
+    assert spm.JSONCleaner.load_json_bytes(commented.encode('utf-8'), 'x.json') == expected
+    assert spm.JSONCleaner.load_json_text(commented, 'x.json') == expected
+    assert stdlib_calls == []
+
+    # NaN 和超出范围的数字只有标准库能解析，没有注释时不需要清理
+    value = spm.JSONCleaner.load_json_bytes(b'{"a": NaN, "b": -Infinity, "c": 1e400}', 'x.json')
+    assert math.isnan(value['a']) and value['b'] == -math.inf and value['c'] == math.inf
+    assert len(stdlib_calls) == 1
+
+    value = spm.JSONCleaner.load_json_text('{"a": NaN, // 注释\n "b": 2}', 'x.json')
+    assert math.isnan(value['a']) and value['b'] == 2